@@ -0,0 +1,133 @@
+import asyncio
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.enums import ChatAction
+from aiogram.fsm.context import FSMContext
+
+from bot.common.config import settings
+from bot.common.services.broadcast import (
+    BroadcastFilters, parse_broadcast_args, count_audience,
+    start_broadcast, broadcast_progress, cancel_broadcast
+)
+from bot.admin.handlers.helpers import IsAdminGroup
+
+router = Router()
+router.message.filter(IsAdminGroup())
+router.callback_query.filter(F.message.chat.id == settings.ADMIN_GROUP_ID)
+
+BROADCAST_USAGE = (
+    "Usage: <code>/broadcast [STATE] [seen=6] [stale] [min=4] [max=4.5]</code>\n"
+    "and the message on the next lines."
+)
+# Leaves room for the localized header within Telegram's 4096 chars
+MAX_TEXT = 3800
+PROGRESS_INTERVAL = 3
+# Stop refreshing if nothing moves for this long (e.g. the driver bot is down)
+PROGRESS_IDLE_STOP = 600
+
+# Running progress updaters (keeps the tasks referenced)
+_progress_tasks = set()
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, state: FSMContext):
+    # First line: command and audience filters; the rest (with formatting) is the message
+    args = message.text.partition("\n")[0].split()[1:]
+    body = message.html_text.partition("\n")[2].strip()
+    try:
+        filters = parse_broadcast_args(args)
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n{BROADCAST_USAGE}", parse_mode="HTML")
+        return
+    if not body:
+        await message.answer(BROADCAST_USAGE, parse_mode="HTML")
+        return
+    if len(body) > MAX_TEXT:
+        await message.answer(f"❌ Message too long ({len(body)} > {MAX_TEXT} characters).")
+        return
+
+    await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
+    audience = await count_audience(filters)
+    if not audience:
+        await message.answer(f"📢 No drivers match: {filters.describe()}.")
+        return
+
+    await state.update_data(broadcast_filters=filters.to_dict(), broadcast_text=body)
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"✅ Send to {audience} drivers", callback_data="bc_send")],
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="bc_abort")]
+    ])
+    await message.answer(
+        f"📢 <b>Broadcast preview</b>\n"
+        f"Audience: {filters.describe()} — <b>{audience}</b> drivers\n\n{body}",
+        reply_markup=kb, parse_mode="HTML", disable_web_page_preview=True
+    )
+
+@router.callback_query(F.data == "bc_abort")
+async def cb_broadcast_abort(callback: CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("✅ Broadcast cancelled.")
+
+@router.callback_query(F.data == "bc_send")
+async def cb_broadcast_send(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    if not data.get("broadcast_text"):
+        await callback.answer("Nothing to send (already sent or expired).", show_alert=True)
+        return
+
+    filters = BroadcastFilters(**data["broadcast_filters"])
+    await callback.answer()
+    await callback.message.edit_text("⏳ Queuing broadcast...")
+    broadcast_id, total = await start_broadcast(filters, data["broadcast_text"])
+
+    task = asyncio.create_task(track_progress(callback.message, broadcast_id, filters.describe()))
+    _progress_tasks.add(task)
+    task.add_done_callback(_progress_tasks.discard)
+
+@router.callback_query(F.data.startswith("bc_cancel_"))
+async def cb_broadcast_cancel(callback: CallbackQuery):
+    await cancel_broadcast(callback.data.removeprefix("bc_cancel_"))
+    await callback.answer("Cancelling: messages not sent yet are dropped.")
+
+def render_progress(broadcast_id: str, audience: str, progress: dict, stalled: bool = False):
+    if progress["done"]:
+        status = "🛑 Cancelled" if progress["cancelled"] else "✅ Done"
+    elif stalled:
+        status = "⚠️ No progress for a while — is the driver bot running?"
+    else:
+        status = "⏳ Sending..."
+    text = (
+        f"📢 <b>Broadcast</b> to {audience}\n\n"
+        f"Sent: <b>{progress['sent']}</b> / {progress['total']}\n"
+        f"Failed: {progress['failed']} | Cancelled: {progress['cancelled']}\n\n"
+        f"{status}"
+    )
+    kb = None
+    if not progress["done"]:
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🛑 Stop broadcast", callback_data=f"bc_cancel_{broadcast_id}")]
+        ])
+    return text, kb
+
+async def track_progress(message: Message, broadcast_id: str, audience: str):
+    """
+    Live counter in the admin group, edited every PROGRESS_INTERVAL s while it changes.
+    """
+    last, idle = None, 0.0
+    while True:
+        progress = await broadcast_progress(broadcast_id)
+        stalled = idle >= PROGRESS_IDLE_STOP
+        if progress != last or stalled:
+            text, kb = render_progress(broadcast_id, audience, progress, stalled)
+            try:
+                await message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+            except TelegramBadRequest as e:
+                print(f"Broadcast progress update failed: {e}")
+            last, idle = progress, 0.0
+        else:
+            idle += PROGRESS_INTERVAL
+        if progress["done"] or stalled:
+            return
+        await asyncio.sleep(PROGRESS_INTERVAL)
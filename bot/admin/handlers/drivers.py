@@ -1,3 +1,5 @@
+import hashlib
+import html
 from datetime import datetime, timezone
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -9,13 +11,21 @@ from sqlalchemy.orm import selectinload
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User, Location
 from bot.common.services.rating import get_star_rating
+from bot.common.services.geocoding import get_location_by_query
+from bot.common.services.driver_index import driver_index, DriverEntry
+from bot.common.services.driver_search import FindFilters, parse_find_args, search_drivers_db
+from bot.common.services.driver_list import ListFilters, parse_list_args, get_drivers_page, alias_page
 from bot.common.config import settings
-from bot.common.data.locations import US_STATES, US_CITIES
+from bot.common.data.locations import US_STATES, US_CITIES, FIPS_STATES, find_city
+from bot.common.services.location_history import get_track
+from bot.common.services.live_location import distance_m
+from bot.common.services.user_search import search_users
+from bot.common.services.gazetteer import places
 
 from .helpers import (
     IsAdminGroup, 
     get_all_active_users, 
-    generate_active_drivers_text
+    render_drivers_page
 )
 
 router = Router()
@@ -23,64 +33,106 @@ router.message.filter(IsAdminGroup())
 router.callback_query.filter(F.message.chat.id == settings.ADMIN_GROUP_ID)
 
 # --- /drivers ---
+DRIVERS_USAGE = "Usage: <code>/drivers [STATE] [stale] [min=4] [max=4.5]</code>"
+
 @router.message(Command("drivers"))
 async def cmd_drivers(message: Message):
     await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
-    users = await get_all_active_users()
-    
-    if not users:
-        await message.answer("⚠️ No active drivers found.")
+    try:
+        filters = parse_list_args(message.text.split()[1:])
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n{DRIVERS_USAGE}", parse_mode="HTML")
         return
+    text, kb, _ = await build_drivers_page(filters)
+    await message.answer(text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
 
-    text = await generate_active_drivers_text(users)
-    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔄 Refresh List", callback_data="refresh_drivers")]])
-    
+async def build_drivers_page(filters: ListFilters, cursor: int = 0, direction: str = "a", page: int = 0):
+    """
+    One /drivers page with prev/refresh/next buttons. Callback data:
+    drv_{direction}_{cursor user_id}_{page}_{text digest}_{packed filters}.
+    Returns (text, keyboard, digest).
+    """
+    cached = await get_drivers_page(filters, cursor, direction)
+    if not cached.rows and cursor:
+        # Cursor driver gone (deleted/deactivated) or list shrank: back to the start
+        direction, page = "a", 0
+        cached = await get_drivers_page(filters)
+    rows, more = cached.rows, cached.more
+
+    packed = filters.pack()
+    if not rows:
+        suffix = f" ({html.escape(filters.describe())})" if filters else ""
+        text = f"⚠️ No active drivers found{suffix}."
+        kb = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="🔄 Refresh", callback_data=f"drv_a_0_0_0_{packed}")
+        ]])
+        return text, kb, page_digest(text)
+
+    text, shown = render_drivers_page(rows, page, filters, cached.cards, backward=direction == "b")
+    digest = page_digest(text)
+    if direction == "b":
+        # Cards dropped for length sit before shown[0]: the next ⬅️ starts there
+        has_prev, has_next = more or len(shown) < len(rows), True
+        if not has_prev:
+            page = 0
+    else:
+        has_prev, has_next = page > 0, more or len(shown) < len(rows)
+        if direction == "a":
+            alias_page(cached, filters, shown[0].user_id)
+
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"drv_b_{shown[0].user_id}_{page - 1}_0_{packed}"))
+    nav.append(InlineKeyboardButton(text="🔄", callback_data=f"drv_r_{shown[0].user_id}_{page}_{digest}_{packed}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"drv_a_{shown[-1].user_id}_{page + 1}_0_{packed}"))
+    return text, InlineKeyboardMarkup(inline_keyboard=[nav]), digest
+
+def page_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=4).hexdigest()
+
+@router.callback_query(F.data.startswith("drv_"))
+async def cb_drivers_page(callback: CallbackQuery):
+    _, direction, cursor, page, digest, packed = callback.data.split("_", 5)
+    text, kb, new_digest = await build_drivers_page(ListFilters.unpack(packed), int(cursor), direction, max(int(page), 0))
+    if new_digest == digest:
+        # Refresh of an unchanged page: no edit round-trip (and usually no query either)
+        await callback.answer("List is up to date.")
+        return
     try:
-        if len(text) > 4000:
-            for x in range(0, len(text), 4000):
-                await message.answer(text[x:x+4000], parse_mode="HTML")
-            # Send button in separate message if split
-            await message.answer("🔄", reply_markup=kb)
-        else:
-             if isinstance(message, Message):
-                await message.answer(text, parse_mode="HTML", reply_markup=kb)
-             else:
-                try: 
-                    await message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-                except Exception:
-                    await message.answer(text, parse_mode="HTML", reply_markup=kb)
-                    
-    except Exception as e:
-        print(f"Error sending drivers list: {e}")
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
+    except Exception:
+        # Same text: Telegram refuses the edit
+        await callback.answer("List is up to date.")
+        return
+    await callback.answer()
 
 @router.callback_query(F.data == "refresh_drivers")
 async def cb_refresh_drivers(callback: CallbackQuery):
-    users = await get_all_active_users()
-    
-    if not users:
-        await callback.message.edit_text("⚠️ No active drivers found.")
-        return
-
-    text = await generate_active_drivers_text(users)
-    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="🔄 Refresh List", callback_data="refresh_drivers")]])
-    
+    # Button of lists sent before pagination
+    text, kb, _ = await build_drivers_page(ListFilters())
     try:
-        if callback.message.text != text or callback.message.caption != text:
-             await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
-        else:
-             await callback.answer("List is up to date.")
+        await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb, disable_web_page_preview=True)
     except Exception:
-         await callback.answer("List is up to date.")
+        await callback.answer("List is up to date.")
 
 # --- /find ---
 @router.message(Command("find"))
 async def cmd_find(message: Message):
     await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
-    args = message.text.split()[1:]
+    try:
+        args, filters = parse_find_args(message.text.split()[1:])
+    except ValueError as e:
+        await message.answer(f"❌ {e}\nUsage: <code>/find TX Dallas r=50 min=4 seen=12</code>", parse_mode="HTML")
+        return
+
     if args:
         state_query = args[0].upper()
         city_query = " ".join(args[1:]) if len(args) > 1 else ""
-        await execute_find(message, state_query, city_query)
+        await execute_find(message, state_query, city_query, filters)
+        return
+    if filters:
+        await message.answer("❌ Filters need a location.\nUsage: <code>/find TX Dallas r=50 min=4 seen=12</code>", parse_mode="HTML")
         return
 
     await show_find_states(message)
@@ -110,7 +162,7 @@ async def cb_find_state(callback: CallbackQuery):
     buttons = []
     row = []
     for city in cities:
-        cb_data = f"find_city_{city}"[:64]
+        cb_data = f"find_city_{state_code}_{city}"[:64]
         row.append(InlineKeyboardButton(text=city, callback_data=cb_data))
         if len(row) == 2:
             buttons.append(row)
@@ -128,11 +180,63 @@ async def cb_find_back(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("find_city_"))
 async def cb_find_city(callback: CallbackQuery):
-    city_name = callback.data.replace("find_city_", "")
-    await execute_find(callback.message, None, city_name)
+    payload = callback.data.replace("find_city_", "")
+    # find_city_{STATE}_{City}; older menus sent only the city
+    state_code, sep, city_name = payload.partition("_")
+    if not sep or state_code not in US_STATES:
+        state_code, city_name = None, payload
+    await execute_find(callback.message, state_code, city_name)
     await callback.answer()
 
-async def execute_find(message: Message, state_query, city_query):
+def find_nearest_indexed(target_lat: float, target_lon: float, filters: FindFilters, k: int = 10):
+    predicate = filters.predicate()
+    if filters.radius_miles is not None:
+        return driver_index.within(target_lat, target_lon, filters.radius_miles, predicate)[:k]
+
+    results = driver_index.knn(target_lat, target_lon, k=k, predicate=predicate)
+    if len(results) < k:
+        # Same as the DB path: drivers without location fill up the page
+        rest = [e for e in driver_index.without_position() if predicate is None or predicate(e)]
+        rest.sort(key=lambda e: e.full_name or "")
+        results += [(e, float('inf')) for e in rest[:k - len(results)]]
+    return results
+
+def driver_card(d: DriverEntry, dist: float = -1, dist_error: bool = False, note: str = "") -> str:
+    """
+    Driver card of /find and /search results. dist in miles, -1 = not applicable.
+    """
+    stars = get_star_rating(d.rating_score)
+    
+    now = datetime.now(timezone.utc)
+    last_active = d.last_active_at
+    if last_active.tzinfo is None: last_active = last_active.replace(tzinfo=timezone.utc)
+    
+    diff = now - last_active
+    if diff.total_seconds() < 3600:
+        seen = f"{int(diff.total_seconds()/60)}m ago"
+    else:
+        seen = f"{int(diff.total_seconds()/3600)}h ago"
+    
+    username_link = f"<a href='tg://user?id={d.user_id}'>{html.escape(d.full_name or 'Driver')}</a>"
+    
+    loc_str = html.escape(f"{d.city}, {d.state}") if d.city or d.state else "Unknown"
+    
+    dist_str = ""
+    if dist != float('inf') and dist != -1:
+        dist_str = f"\n📏 <b>{dist:.1f} miles away</b>"
+    elif dist == float('inf') and dist_error:
+        dist_str = "\n⚠️ <i>Dist calc error</i>"
+    
+    return (
+        f"👤 {username_link}{note}\n"
+        f"📍 {loc_str} | 🕒 {seen}"
+        f"{dist_str}\n"
+        f"⭐️ {stars} ({d.rating_score:.1f}) | 🆔 <code>{d.user_id}</code>\n"
+        f"👉 /rate_{d.user_id}\n\n"
+    )
+
+async def execute_find(message: Message, state_query, city_query, filters: FindFilters = None):
+    filters = filters or FindFilters()
     # 1. Resolve Target Location (Lat/Lon)
     target_lat, target_lon = None, None
     search_term = ""
@@ -144,61 +248,58 @@ async def execute_find(message: Message, state_query, city_query):
     elif city_query:
         search_term = city_query
         
-    if search_term:
-        from bot.common.services.geocoding import get_location_by_query, calculate_distance
-        loc_res = get_location_by_query(search_term)
+    # Known cities resolve from the bundled catalog/gazetteer, Nominatim otherwise
+    catalog_res = find_city(city_query, state_query) if city_query else None
+    place_id = places.lookup(city_query, state_query) if city_query and not catalog_res else None
+    if catalog_res:
+        _, _, target_lat, target_lon = catalog_res
+    elif place_id is not None:
+        target_lat, target_lon = places.lats[place_id], places.lons[place_id]
+    elif search_term:
+        loc_res = await get_location_by_query(search_term)
         if loc_res:
              _, _, target_lat, target_lon = loc_res
     
-    # 2. Fetch Users
-    users = await get_all_active_users()
-    
-    if not users:
-        await message.answer("⚠️ No active drivers found in database.")
-        return
+    # 2. Drivers come from the in-memory index; Postgres if configured or until it is loaded
+    use_index = settings.FIND_BACKEND == "index" and driver_index.ready
+    filter_note = f"\n<i>Filters: {filters.describe()}</i>" if filters else ""
 
     # 3. Filter/Sort Logic
-    results = [] # List of tuples (User, Distance)
+    results = [] # List of tuples (DriverEntry, Distance)
     
     if target_lat is not None and target_lon is not None:
-        # Distance-based sort
-        for u in users:
-            if u.location and u.location.latitude is not None and u.location.longitude is not None:
-                try:
-                    # Enforce float
-                    u_lat = float(u.location.latitude)
-                    u_lon = float(u.location.longitude)
-                    t_lat = float(target_lat)
-                    t_lon = float(target_lon)
-                    
-                    dist = calculate_distance(t_lat, t_lon, u_lat, u_lon)
-                    results.append((u, dist))
-                except Exception as e:
-                    print(f"Driver {u.user_id} loc error: {e}")
-                    results.append((u, float('inf')))
-            else:
-                # Users without location go to bottom
-                results.append((u, float('inf')))
-        
-        # Sort by distance (asc)
-        results.sort(key=lambda x: x[1])
-        
-        # Take Top 10
-        results = results[:10]
-        match_type = f"📍 <b>Nearest to {search_term}:</b>"
+        if use_index:
+            results = find_nearest_indexed(float(target_lat), float(target_lon), filters)
+        else:
+            results = await search_drivers_db(float(target_lat), float(target_lon), k=10, filters=filters)
+        if not results:
+            await message.answer(f"⚠️ No active drivers found near {search_term}.{filter_note}", parse_mode="HTML")
+            return
+        match_type = f"📍 <b>Nearest to {search_term}:</b>{filter_note}"
         
     else:
         # Fallback to Text Match (Old Logic) if Geocoding Fails
         # Or if we just want to match text strictly.
         # But user requested "proximity", so if geocoding fails, we might just warn.
         # Let's keep a basic text filter as backup.
-        match_type = f"🔍 <b>Text Matches for '{search_term}':</b>"
-        for u in users:
-            u_loc_str = f"{u.location.city} {u.location.state}" if u.location else ""
-            if city_query and city_query.lower() in u_loc_str.lower():
-                results.append((u, -1))
-            elif state_query and state_query.lower() in u_loc_str.lower():
-                results.append((u, -1))
+        if use_index:
+            drivers = list(driver_index.entries.values())
+        else:
+            drivers = [DriverEntry.from_user(u) for u in await get_all_active_users()]
+        if not drivers:
+            await message.answer("⚠️ No active drivers found in database.")
+            return
+        predicate = filters.predicate()
+        if predicate is not None:
+            drivers = [d for d in drivers if predicate(d)]
+
+        match_type = f"🔍 <b>Text Matches for '{search_term}':</b>{filter_note}"
+        for d in sorted(drivers, key=lambda e: e.full_name or ""):
+            d_loc_str = f"{d.city} {d.state}" if d.city or d.state else ""
+            if city_query and city_query.lower() in d_loc_str.lower():
+                results.append((d, -1))
+            elif state_query and state_query.lower() in d_loc_str.lower():
+                results.append((d, -1))
         
         if not results and search_term:
              await message.answer(f"❌ Location '{search_term}' not found (Geocoding failed) and no text matches.")
@@ -210,38 +311,83 @@ async def execute_find(message: Message, state_query, city_query):
     if target_lat is None and search_term and "Nearest" not in match_type and "Text Matches" in match_type:
          text = f"⚠️ <b>Geocoding Service Unavailable/Timed Out.</b>\nShowing exact text matches only.\n\n" + text
 
-    for u, dist in results:
-        stars = get_star_rating(u.rating_score)
-        
-        now = datetime.now(timezone.utc)
-        last_active = u.last_active_at
-        if last_active.tzinfo is None: last_active = last_active.replace(tzinfo=timezone.utc)
-        
-        diff = now - last_active
-        if diff.total_seconds() < 3600:
-            seen = f"{int(diff.total_seconds()/60)}m ago"
-        else:
-            seen = f"{int(diff.total_seconds()/3600)}h ago"
-        
-        username_link = f"<a href='tg://user?id={u.user_id}'>{u.full_name or 'Driver'}</a>"
-        
-        loc_str = f"{u.location.city}, {u.location.state}" if u.location else "Unknown"
-        
-        dist_str = ""
-        if dist != float('inf') and dist != -1:
-            dist_str = f"\n📏 <b>{dist:.1f} miles away</b>"
-        elif dist == float('inf') and match_type.startswith("📍"):
-            dist_str = "\n⚠️ <i>Dist calc error</i>"
-        
-        text += (
-            f"👤 {username_link}\n"
-            f"📍 {loc_str} | 🕒 {seen}"
-            f"{dist_str}\n"
-            f"⭐️ {stars} ({u.rating_score:.1f}) | 🆔 <code>{u.user_id}</code>\n"
-            f"👉 /rate_{u.user_id}\n\n"
-        )
+    for d, dist in results:
+        text += driver_card(d, dist, dist_error=match_type.startswith("📍"))
     
     if isinstance(message, Message):
         await message.answer(text, parse_mode="HTML", disable_web_page_preview=True)
     else:
         await message.edit_text(text, parse_mode="HTML", disable_web_page_preview=True)
+
+# --- /track ---
+@router.message(Command("track"))
+async def cmd_track(message: Message):
+    # /track 123 [hours]
+    args = message.text.split()[1:]
+    usage = "Usage: <code>/track USER_ID [hours]</code>"
+    try:
+        user_id = int(args[0])
+        hours = float(args[1]) if len(args) > 1 else 24
+    except (IndexError, ValueError):
+        await message.answer(f"❌ {usage}", parse_mode="HTML")
+        return
+    hours = min(max(hours, 1), settings.LOCATION_HISTORY_DAYS * 24)
+
+    await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
+    async with async_session_factory() as session:
+        user = await session.get(User, user_id)
+    track = await get_track(user_id, hours)
+
+    # Typed by the driver at registration: escape for HTML mode
+    name = html.escape(user.full_name) if user and user.full_name else f"User {user_id}"
+    if not track:
+        await message.answer(f"🛰 No positions for <b>{name}</b> in the last {hours:g}h.", parse_mode="HTML")
+        return
+
+    miles = sum(
+        distance_m(a.lat, a.lon, b.lat, b.lon) for a, b in zip(track, track[1:])
+    ) / 1609.344
+
+    # Consecutive duplicates collapsed: NY → NJ → PA
+    states = []
+    for p in track:
+        code = FIPS_STATES.get(p.state_id, "?")
+        if not states or states[-1] != code:
+            states.append(code)
+
+    first, last = track[0], track[-1]
+    text = (
+        f"🛰 <b>Track: {name}</b> (<code>{user_id}</code>), last {hours:g}h\n\n"
+        f"📌 {len(track)} points, {first.recorded_at:%m-%d %H:%M} → {last.recorded_at:%m-%d %H:%M} UTC\n"
+        f"📏 ~{miles:.0f} miles\n"
+        f"🗺 {' → '.join(states)}\n"
+        f"📍 Last: <a href='https://maps.google.com/?q={last.lat:.5f},{last.lon:.5f}'>{last.lat:.5f}, {last.lon:.5f}</a>"
+    )
+    await message.answer(text, parse_mode="HTML", disable_web_page_preview=True)
+
+# --- /search ---
+STATUS_NOTES = {"pending": " ⏳ <i>pending</i>", "banned": " 🚫 <i>banned</i>"}
+
+@router.message(Command("search"))
+async def cmd_search(message: Message):
+    # /search akmal 347
+    query = message.text.partition(" ")[2].strip()
+    if not query:
+        await message.answer("❌ Usage: <code>/search name, phone or Zelle</code>", parse_mode="HTML")
+        return
+
+    await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
+    try:
+        matches, _ = await search_users(query, limit=10)
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        return
+
+    if not matches:
+        await message.answer(f"🔍 No drivers match '{html.escape(query)}'.", parse_mode="HTML")
+        return
+
+    text = f"🔍 <b>Search results for '{html.escape(query)}':</b>\n\n"
+    for user, _ in matches:
+        text += driver_card(DriverEntry.from_user(user), note=STATUS_NOTES.get(user.status, ""))
+    await message.answer(text, parse_mode="HTML", disable_web_page_preview=True)
@@ -1,48 +1,60 @@
-import csv
-import io
-from datetime import datetime
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, BufferedInputFile
+from aiogram.types import Message, InputFile
 from aiogram.enums import ChatAction
 
-from bot.common.config import settings
-from bot.admin.handlers.helpers import IsAdminGroup, get_all_active_users
+from bot.common.services.export import parse_export_args, export_to_file
+from bot.admin.handlers.helpers import IsAdminGroup
 
 router = Router()
 router.message.filter(IsAdminGroup())
 
+# Telegram Bot API upload limit
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+EXPORT_USAGE = (
+    "Usage: <code>/export [drivers|orders|history] [csv|xlsx|parquet] [gz] "
+    "[status=all] [state=TX] [driver=ID] [from=2026-01-01] [to=2026-01-31]</code>"
+)
+
+class SpooledInputFile(InputFile):
+    """
+    Uploads from an open file object chunk by chunk (BufferedInputFile needs it all as bytes).
+    """
+    def __init__(self, fileobj, filename: str):
+        super().__init__(filename=filename)
+        self.fileobj = fileobj
+
+    async def read(self, bot):
+        while chunk := self.fileobj.read(self.chunk_size):
+            yield chunk
+
 @router.message(Command("export"))
 async def cmd_export(message: Message):
+    try:
+        req = parse_export_args(message.text.split()[1:])
+    except ValueError as e:
+        await message.answer(f"❌ {e}\n{EXPORT_USAGE}", parse_mode="HTML")
+        return
+
     await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.UPLOAD_DOCUMENT)
-    
-    users = await get_all_active_users()
-    if not users:
-        await message.answer("⚠️ No active drivers to export.")
+    try:
+        file, rows, size = await export_to_file(req)
+    except ValueError as e: # Optional dependency for the format is missing
+        await message.answer(f"❌ {e}")
         return
 
-    # Generate CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    # Header
-    writer.writerow(["User ID", "Name", "Phone", "Zelle", "Status", "City", "State", "Rating", "Joined At"])
-    
-    for u in users:
-        city = u.location.city if u.location else "N/A"
-        state = u.location.state if u.location else "N/A"
-        writer.writerow([
-            u.user_id,
-            u.full_name,
-            u.phone,
-            u.zelle,
-            u.status,
-            city,
-            state,
-            u.rating_score,
-            u.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        ])
-    
-    output.seek(0)
-    document = BufferedInputFile(output.getvalue().encode(), filename=f"drivers_export_{datetime.now().strftime('%Y%m%d')}.csv")
-    
-    await message.answer_document(document, caption="📊 <b>Drivers Export</b>", parse_mode="HTML")
+    with file:
+        if not rows:
+            await message.answer(f"⚠️ Nothing to export ({req.describe() or req.dataset}).")
+            return
+        if size > MAX_UPLOAD_BYTES:
+            await message.answer(
+                f"⚠️ Export is {size / 1024 / 1024:.0f} MB, over Telegram's 50 MB limit. "
+                "Narrow it with filters or use <code>gz</code>.", parse_mode="HTML"
+            )
+            return
+
+        caption = f"📊 <b>{req.dataset.capitalize()} Export</b>: {rows} rows"
+        if req.describe():
+            caption += f"\n🔎 {req.describe()}"
+        await message.answer_document(SpooledInputFile(file, req.filename()), caption=caption, parse_mode="HTML")
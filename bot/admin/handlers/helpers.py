@@ -1,3 +1,4 @@
+import html
 import math
 from datetime import datetime, timezone
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
@@ -9,7 +10,9 @@ from sqlalchemy.orm import selectinload
 from bot.common.config import settings
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User
-from bot.common.services.rating import get_star_rating
+from bot.common.services.rating import get_star_rating, current_score
+from bot.common.services.driver_index import driver_index, DriverEntry
+from bot.common.services.driver_list import ListFilters, NAME_MAX
 
 class IsAdminGroup(Filter):
     async def __call__(self, message: Message) -> bool:
@@ -27,12 +30,45 @@ async def get_all_active_users():
         )
         return result.scalars().all()
 
-def build_pagination_kb(items, page, prefix, columns=1, back_btn=True):
+async def load_driver_index():
+    """
+    (Re)builds the in-memory driver index from Postgres.
+    Events applied while the query runs are journaled and replayed on top of the snapshot.
+    """
+    driver_index.begin_rebuild()
+    try:
+        users = await get_all_active_users()
+    except BaseException:
+        driver_index.abort_rebuild()
+        raise
+    driver_index.rebuild([DriverEntry.from_user(u) for u in users])
+    print(f"Driver index loaded: {len(driver_index)} active drivers")
+
+async def refresh_indexed_driver(user_id: int):
+    """
+    Re-reads one driver after a profile change; drops them unless still active.
+    """
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(User).options(selectinload(User.location)).where(User.user_id == user_id)
+        )
+        user = result.scalar_one_or_none()
+
+    if user is None or user.status != 'active':
+        driver_index.remove(user_id)
+    else:
+        driver_index.upsert(DriverEntry.from_user(user))
+
+def build_pagination_kb(items, page, prefix, columns=1, back_btn=True, total_pages=None):
+    # With total_pages given, items is already just this page
     ITEMS_PER_PAGE = 10
-    total_pages = math.ceil(len(items) / ITEMS_PER_PAGE)
-    start = page * ITEMS_PER_PAGE
-    end = start + ITEMS_PER_PAGE
-    page_items = items[start:end]
+    if total_pages is None:
+        total_pages = math.ceil(len(items) / ITEMS_PER_PAGE)
+        start = page * ITEMS_PER_PAGE
+        end = start + ITEMS_PER_PAGE
+        page_items = items[start:end]
+    else:
+        page_items = items
     
     buttons = []
     row = []
@@ -59,26 +95,50 @@ def build_pagination_kb(items, page, prefix, columns=1, back_btn=True):
          
     return InlineKeyboardMarkup(inline_keyboard=buttons), total_pages
 
-async def generate_active_drivers_text(users):
-    text = "🚙 <b>Active Drivers List</b>\n\n"
-    for u in users:
-        loc = f"{u.location.city}, {u.location.state}" if u.location else "Unknown"
+def _card_parts(u, loc):
+    # Everything but the "seen" age, which changes with the clock
+    place = f"{loc.city}, {loc.state}" if loc else "Unknown"
+    name = html.escape((u.full_name or "Driver")[:NAME_MAX])
+    score = current_score(u)
+    head = f"👤 <a href='tg://user?id={u.user_id}'>{name}</a>\n📍 {html.escape(place)} | 🕒 "
+    tail = f"\n⭐️ {get_star_rating(score)} ({score:.1f}) | 🆔 <code>{u.user_id}</code>\n-----------------\n"
+    return head, tail
+
+def render_drivers_page(rows, page: int, filters: ListFilters, cards: dict = None, limit: int = 4000,
+                        backward: bool = False):
+    """
+    Renders (User, Location) rows as driver cards. Stops before the text would
+    exceed `limit`; returns (text, users actually shown). A `backward` page
+    drops cards from the start, so the ones next to the cursor stay.
+    `cards` caches the static part of each card by user_id across renders.
+    """
+    cards = {} if cards is None else cards
+    header = f"🚙 <b>Active Drivers</b> (page {page + 1})\n"
+    if filters:
+        header += f"🔎 {html.escape(filters.describe())}\n"
+    size = len(header) + 1
+    picked = []
+    now = datetime.now(timezone.utc)
+    for u, loc in (reversed(rows) if backward else rows):
         last_active = u.last_active_at
         if last_active.tzinfo is None:
              last_active = last_active.replace(tzinfo=timezone.utc)
              
-        time_diff = datetime.now(timezone.utc) - last_active
+        time_diff = now - last_active
         if time_diff.total_seconds() < 3600:
              last_seen = f"{int(time_diff.total_seconds()/60)}m ago"
         else:
              last_seen = f"{int(time_diff.total_seconds()/3600)}h ago"
 
-        username_link = f"<a href='tg://user?id={u.user_id}'>{u.full_name}</a>"
-        
-        text += (
-            f"👤 {username_link}\n"
-            f"📍 {loc} | 🕒 {last_seen}\n"
-            f"⭐️ {get_star_rating(u.rating_score)} ({u.rating_score:.1f}) | 🆔 <code>{u.user_id}</code>\n"
-            f"-----------------\n"
-        )
-    return text
+        parts = cards.get(u.user_id)
+        if parts is None:
+            parts = cards[u.user_id] = _card_parts(u, loc)
+        card = parts[0] + last_seen + parts[1]
+        if picked and size + len(card) > limit:
+            break
+        size += len(card)
+        picked.append((u, card))
+    if backward:
+        picked.reverse()
+    text = header + "\n" + "".join(card for _, card in picked)
+    return text, [u for u, _ in picked]
@@ -1,3 +1,4 @@
+import math
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
@@ -7,12 +8,16 @@ from sqlalchemy import delete
 
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User, Location, Order
-from bot.common.services.rating import recalculate_rating
+from bot.common.services.rating import apply_order_rating, recompute_all_ratings
+from bot.common.services.picker import (
+    PICKER_PAGE_SIZE, load_picker_items, save_snapshot, load_snapshot,
+    fetch_picker_page, count_picker_items
+)
 from bot.common.config import settings
 
 from .helpers import (
     IsAdminGroup, AdminStates, 
-    get_all_active_users, build_pagination_kb
+    build_pagination_kb
 )
 
 router = Router()
@@ -23,6 +28,50 @@ router.callback_query.filter(F.message.chat.id == settings.ADMIN_GROUP_ID)
 async def cb_close(callback: CallbackQuery):
     await callback.message.delete()
 
+# --- Driver picker (/delete, /rate) ---
+async def show_picker(message, prefix: str, title: str, empty_text: str, page=0):
+    """
+    A new picker snapshots the driver list (names and ids) in Redis under its
+    message id, so page flips don't reload it. Once the snapshot expires, a flip
+    reads just the next page from the database, keyset from the buttons shown.
+    """
+    if isinstance(message, Message):
+        items = await load_picker_items()
+        if not items:
+            await message.answer(empty_text)
+            return
+        kb, total = build_pagination_kb(items, 0, prefix, columns=2)
+        sent = await message.answer(f"{title} (Page 1/{total})", reply_markup=kb, parse_mode="HTML")
+        await save_snapshot(sent.chat.id, sent.message_id, items)
+        return
+
+    picker = message.message
+    items = await load_snapshot(picker.chat.id, picker.message_id)
+    if items is not None:
+        kb, total = build_pagination_kb(items, page, prefix, columns=2)
+    else:
+        page, kb, total = await picker_page_from_db(picker.reply_markup, prefix, page)
+    await picker.edit_text(f"{title} (Page {page+1}/{total})", reply_markup=kb, parse_mode="HTML")
+
+async def picker_page_from_db(markup: InlineKeyboardMarkup, prefix: str, page: int):
+    buttons = [b for row in markup.inline_keyboard for b in row if b.callback_data]
+    shown = [int(b.callback_data.rsplit("_", 1)[1]) for b in buttons if b.callback_data.startswith(f"{prefix}_select_")]
+    backwards = any(b.callback_data == f"{prefix}_page_{page}" and b.text == "⬅️" for b in buttons)
+
+    if page == 0 or not shown:
+        items = await fetch_picker_page()
+    elif backwards:
+        items = await fetch_picker_page(shown[0], "b")
+    else:
+        items = await fetch_picker_page(shown[-1], "a")
+    if not items:
+        # Anchor driver deleted meanwhile: start over
+        page, items = 0, await fetch_picker_page()
+
+    total = max(1, math.ceil(await count_picker_items() / PICKER_PAGE_SIZE))
+    kb, total = build_pagination_kb(items, page, prefix, columns=2, total_pages=total)
+    return page, kb, total
+
 # --- /delete ---
 @router.message(Command("delete"))
 async def cmd_delete(message: Message, state: FSMContext):
@@ -37,19 +86,7 @@ async def cmd_delete(message: Message, state: FSMContext):
     await show_delete_list(message, page=0)
 
 async def show_delete_list(message: Message, page=0):
-    users = await get_all_active_users()
-    if not users:
-        await message.answer("No drivers to delete.")
-        return
-
-    items = [(u.full_name, u.user_id) for u in users]
-    kb, total = build_pagination_kb(items, page, "del", columns=2)
-    
-    text = f"🗑 <b>Select Driver to REMOVE</b> (Page {page+1}/{total})"
-    if isinstance(message, CallbackQuery):
-        await message.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
-    else:
-        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    await show_picker(message, "del", "🗑 <b>Select Driver to REMOVE</b>", "No drivers to delete.", page)
 
 @router.callback_query(F.data.startswith("del_page_"))
 async def cb_del_page(callback: CallbackQuery):
@@ -114,19 +151,7 @@ async def cmd_rate(message: Message):
     await show_rate_list(message, page=0)
 
 async def show_rate_list(message: Message, page=0):
-    users = await get_all_active_users()
-    if not users:
-        await message.answer("No active drivers to rate.")
-        return
-
-    items = [(u.full_name, u.user_id) for u in users]
-    kb, total = build_pagination_kb(items, page, "rate", columns=2)
-    
-    text = f"⭐️ <b>Select Driver to Rate</b> (Page {page+1}/{total})"
-    if isinstance(message, CallbackQuery):
-        await message.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
-    else:
-        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    await show_picker(message, "rate", "⭐️ <b>Select Driver to Rate</b>", "No active drivers to rate.", page)
 
 @router.callback_query(F.data.startswith("rate_page_"))
 async def cb_rate_page(callback: CallbackQuery):
@@ -185,5 +210,22 @@ async def save_rating(admin_id, driver_id, is_good, route_from, route_to):
             route_to=route_to,
             is_good=is_good
         ))
+        # O(1) incremental update, committed together with the order
+        await apply_order_rating(session, driver_id, is_good)
         await session.commit()
-    await recalculate_rating(driver_id)
+
+# --- /recompute_ratings ---
+@router.message(Command("recompute_ratings"))
+async def cmd_recompute_ratings(message: Message):
+    dry_run = "dry" in message.text.split()[1:]
+    await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.TYPING)
+    result = await recompute_all_ratings(dry_run=dry_run)
+
+    verb = "would change" if dry_run else "updated"
+    await message.answer(
+        f"⭐️ <b>Rating Recompute{' (dry run)' if dry_run else ''}</b>\n\n"
+        f"Rated drivers: {result['drivers']}\n"
+        f"Scores {verb}: {result['changed']}\n"
+        f"Time: {result['elapsed_ms']:.0f} ms",
+        parse_mode="HTML"
+    )
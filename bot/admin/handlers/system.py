@@ -1,7 +1,17 @@
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
+from sqlalchemy import text
 from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+from bot.common.services.geocoding import geocode_cache_stats
+from bot.common.services.profiles import read_cache_stats
+from bot.common.services.driver_list import page_cache
+from bot.common.services.outbox import driver_outbox
+from bot.common.services.lease import read_job_stats
+from bot.common.services.listener import listener_stats
+
+from .helpers import IsAdminGroup
 
 # This currently replaces the 'public_router'
 router = Router()
@@ -16,12 +26,88 @@ async def cmd_help(message: Message):
         "🛠 <b>Admin Commands</b>\n\n"
         "<b>Drivers:</b>\n"
         "• <code>/drivers</code> - List all active drivers\n"
+        "• <code>/drivers TX stale min=4 max=4.5</code> - Filter by state, not seen 12h+, rating\n"
         "• <code>/find</code> - Find driver (Menu)\n"
         "• <code>/find NY</code> - Find by State shortcut\n"
+        "• <code>/find TX Dallas r=50 min=4 seen=12</code> - Within 50 mi, rating ≥ 4, seen in 12h\n"
+        "• <code>/search [text]</code> - Fuzzy search by name, phone or Zelle\n"
+        "• <code>/track [ID] [hours]</code> - Driver's route (default 24h)\n"
         "• <code>/rate</code> - Rate driver (Menu)\n"
+        "• <code>/recompute_ratings [dry]</code> - Recompute all ratings\n"
         "• <code>/delete</code> - Delete driver (Menu)\n"
-        "• <code>/approve [ID]</code> - Quick approve\n\n"
+        "• <code>/approve [ID]</code> - Quick approve\n"
+        "• <code>/broadcast TX seen=6</code> + message on the next line - Message a group of drivers\n\n"
         "<b>System:</b>\n"
         "• <code>/export</code> - Download CSV\n"
+        "• <code>/export orders xlsx from=2026-01-01</code> - drivers|orders|history, csv|xlsx|parquet, gz, filters\n"
+        "• <code>/cache [flush]</code> - Cache hit ratios / flush driver profiles\n"
     )
     await message.answer(text, parse_mode="HTML")
+
+def _format_cache(name: str, stats: dict) -> str:
+    line = (
+        f"• <b>{name}</b>: {stats['hit_ratio']:.0%} hits "
+        f"({stats['hits']}/{stats['hits'] + stats['misses']}), {stats['size']}/{stats['maxsize']} entries"
+    )
+    if "l2_hits" in stats:
+        line += f", Redis {stats['l2_hits']} hits / {stats['l2_misses']} misses"
+    return line + "\n"
+
+def _format_listener(name: str, stats: dict) -> str:
+    state = "connected" if stats["connected"] else "⚠️ disconnected"
+    return (
+        f"• <b>DB events ({name})</b>: {state}, {stats['handled']}/{stats['received']} handled in {stats['batches']} batches, "
+        f"lag avg {stats['lag_avg_ms']:.0f} / max {stats['lag_max_ms']:.0f} ms, "
+        f"{stats['dropped']} dropped, {stats['failed']} failed, {stats['reconnects']} reconnects\n"
+    )
+
+@router.message(Command("cache"), IsAdminGroup())
+async def cmd_cache(message: Message):
+    args = message.text.split()[1:]
+    if args and args[0] == "flush":
+        # The driver bot listens on user_profile; "*" drops the whole profile cache
+        async with async_session_factory() as session:
+            await session.execute(text("SELECT pg_notify('user_profile', '*')"))
+            await session.commit()
+        await message.answer("🧹 Driver profile cache flush requested.")
+        return
+
+    text_out = "🗄 <b>Caches</b>\n\n<b>Driver bot</b> (updated every minute):\n"
+    driver_stats = await read_cache_stats()
+    if driver_stats:
+        text_out += _format_cache("Profiles", driver_stats["profiles"])
+        for name, stats in driver_stats.get("geocoding", {}).items():
+            text_out += _format_cache(f"Geocode {name}", stats)
+        for name, stats in driver_stats.get("listeners", {}).items():
+            text_out += _format_listener(name, stats)
+        live = driver_stats.get("live_location")
+        if live:
+            text_out += f"• <b>Live location</b>: {live['tracked']} drivers, {live['accepted']} updates kept / {live['dropped']} dropped\n"
+    else:
+        text_out += "<i>No stats published yet.</i>\n"
+
+    outbox = await driver_outbox.stats()
+    text_out += (
+        f"• <b>Outbox</b>: {outbox.get('sent', 0)} sent, {outbox['ready']} queued, {outbox['delayed']} retrying, "
+        f"{outbox.get('retry_after', 0)} flood waits, {outbox['dead_letters']} dead letters\n"
+    )
+
+    jobs = await read_job_stats()
+    if jobs:
+        text_out += "\n<b>Scheduled jobs</b> (all replicas):\n"
+        for name, job in sorted(jobs.items()):
+            runs = job.get("runs", 0)
+            avg = job.get("total_ms", 0) / runs if runs else 0
+            text_out += (
+                f"• <b>{name}</b>: {runs} runs, avg {avg:.0f} ms, last {job.get('last_ms', 0)} ms, "
+                f"{job.get('skipped', 0)} skipped, {job.get('failed', 0)} failed"
+                + (f", {job['lost']} lease lost" if job.get("lost") else "") + "\n"
+            )
+
+    text_out += "\n<b>Admin bot:</b>\n"
+    for name, stats in geocode_cache_stats().items():
+        text_out += _format_cache(f"Geocode {name}", stats)
+    text_out += _format_cache("Driver list pages", page_cache.stats())
+    for name, stats in listener_stats().items():
+        text_out += _format_listener(name, stats)
+    await message.answer(text_out, parse_mode="HTML")
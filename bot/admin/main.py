@@ -1,19 +1,53 @@
 import asyncio
 import logging
+from typing import List
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
-from redis.asyncio import Redis
 
 from bot.common.config import settings
+from bot.common.database.redis import redis
 from bot.common.services.listener import DBListener
+from bot.common.services.events import DriverLocation, DriverProfile, latest_per_user
+from bot.common.services.geocoding import geocoder
+from bot.common.services.driver_index import driver_index
+from bot.common.services.fleet import fleet_version, LOCATION, PROFILE
 
 # Routers
-from bot.admin.handlers import system, drivers, management, export
+from bot.admin.handlers import system, drivers, management, export, broadcast
+from bot.admin.handlers.helpers import load_driver_index, refresh_indexed_driver
+
+# Incremental driver index updates from the DB triggers, a burst at a time
+
+async def on_driver_locations(events: List[DriverLocation]):
+    for event in latest_per_user(events):
+        try:
+            fleet_version.bump(event.user_id, LOCATION)
+            moved = driver_index.move(event.user_id, event.lat, event.lon, event.city, event.state, event.seen_at)
+            if not moved and driver_index.ready:
+                # Not indexed yet (e.g. approved while we were starting up)
+                await refresh_indexed_driver(event.user_id)
+        except Exception as e:
+            logging.error(f"Failed to apply {event}: {e}")
+
+async def on_driver_profiles(events: List[DriverProfile]):
+    for event in latest_per_user(events):
+        try:
+            fleet_version.bump(event.user_id, PROFILE)
+            if event.status == "active":
+                await refresh_indexed_driver(event.user_id)
+            else:
+                driver_index.remove(event.user_id)
+        except Exception as e:
+            logging.error(f"Failed to apply {event}: {e}")
+
+async def on_listener_connect():
+    # Changes may have been missed while disconnected: drop cached views, reload the index
+    fleet_version.reset()
+    await load_driver_index()
 
 async def main():
     logging.basicConfig(level=logging.INFO)
     
-    redis = Redis(host='redis')
     storage = RedisStorage(redis=redis)
     
     bot = Bot(token=settings.ADMIN_BOT_TOKEN.get_secret_value())
@@ -24,20 +58,22 @@ async def main():
     dp.include_router(drivers.router)
     dp.include_router(management.router)
     dp.include_router(export.router)
+    dp.include_router(broadcast.router)
 
     # Start DB Listener
     # Removed 'new_driver' as Driver Bot handles notifications now.
-    # Passing no-op for now since we don't handle any notifications here
-    listener = DBListener(
-        settings.database_url, 
-        [], # No channels for now
-        lambda c, p: logging.info(f"Received DB Event: {c} {p}")
-    )
+    # The driver index is (re)loaded on every connect, after LISTEN is active,
+    # so every change committed before the snapshot is either in it or delivered as an event.
+    listener = DBListener(settings.database_url, name="admin", on_connect=on_listener_connect)
+    listener.on("driver_location", on_driver_locations, parse=DriverLocation.parse, batch=True)
+    listener.on("driver_profile", on_driver_profiles, parse=DriverProfile.parse, batch=True)
     asyncio.create_task(listener.start())
 
     try:
         await dp.start_polling(bot)
     finally:
+        await listener.close()
+        await geocoder.close()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -10,6 +10,84 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "teamhub"
     POSTGRES_HOST: str = "postgres"
     POSTGRES_PORT: int = 5432
+
+    REDIS_HOST: str = "redis"
+    REDIS_PORT: int = 6379
+
+    # Nominatim client: requests/second shared by both bots, per-call deadline (s),
+    # max queued requests before new ones are rejected
+    NOMINATIM_URL: str = "https://nominatim.openstreetmap.org"
+    NOMINATIM_RATE: float = 1.0
+    GEOCODE_TIMEOUT: float = 8.0
+    GEOCODE_QUEUE_SIZE: int = 20
+    GEOCODE_WORKERS: int = 2
+
+    # Geocoding cache (seconds)
+    GEOCODE_CACHE_SIZE: int = 5000
+    GEOCODE_CACHE_TTL: int = 7 * 24 * 3600
+    GEOCODE_NEGATIVE_TTL: int = 3600
+    # Reverse lookups are keyed by coordinates rounded to this many decimals (3 ~ 110m)
+    GEOCODE_REVERSE_PRECISION: int = 3
+    # Offline reverse geocoding: points farther than this from any bundled place
+    # are considered outside coverage and (optionally) sent to Nominatim
+    GEOCODE_OFFLINE_MAX_KM: float = 150.0
+    GEOCODE_REVERSE_ONLINE: bool = True
+
+    # User profile cache in front of I18nMiddleware (seconds); Redis tier optional
+    PROFILE_CACHE_SIZE: int = 10000
+    PROFILE_CACHE_TTL: int = 600
+    PROFILE_CACHE_REDIS: bool = True
+
+    # Driver rating: an order's weight halves every N days
+    RATING_HALF_LIFE_DAYS: float = 45.0
+    # Hour (server time) of the nightly bulk rating recompute
+    RATING_RECOMPUTE_HOUR: int = 3
+
+    # Driver location writes: buffer and flush every N ms as one multi-row upsert
+    # (coalesced per driver) instead of one statement per update
+    LOCATION_WRITE_BEHIND: bool = False
+    LOCATION_FLUSH_MS: int = 300
+    # Live location: accept an update only after moving N meters and N seconds since
+    # the last one (stationary drivers every heartbeat s); reverse geocode per cell crossing
+    LIVE_LOCATION_MIN_METERS: float = 150.0
+    LIVE_LOCATION_MIN_INTERVAL: float = 30.0
+    LIVE_LOCATION_HEARTBEAT: float = 600.0
+    LIVE_LOCATION_CELL_DEG: float = 0.05
+    # location_history: days of daily partitions kept, and created ahead
+    LOCATION_HISTORY_DAYS: int = 30
+    LOCATION_HISTORY_PREMAKE_DAYS: int = 3
+
+    # Inactivity reminder: due N hours after a driver's last location; unanswered ones
+    # repeat after RETRY hours, doubling up to RETRY_MAX, at most MAX_SENT in a row
+    REMINDER_AFTER_HOURS: float = 12.0
+    REMINDER_RETRY_HOURS: float = 1.0
+    REMINDER_RETRY_MAX_HOURS: float = 24.0
+    REMINDER_MAX_SENT: int = 6
+
+    # Bot-initiated messages go through a Redis queue drained by N workers,
+    # at most GLOBAL_RATE msg/s overall (Telegram allows ~30); failed sends retried N times
+    OUTBOX_WORKERS: int = 4
+    OUTBOX_GLOBAL_RATE: float = 25.0
+    OUTBOX_MAX_ATTEMPTS: int = 5
+
+    # Scheduler jobs take a Redis lease (renewed while running) so one replica runs each tick
+    JOB_LEASE_TTL_SECONDS: int = 60
+
+    # Incremental mirror of drivers/orders (e.g. for dispatchers' Google Sheet):
+    # "csv:/dir", "sqlite:/path.db" or "sheets:<spreadsheet key>"; empty = off
+    SYNC_SINK: str = ""
+    SYNC_INTERVAL_MINUTES: int = 5
+    SYNC_BATCH_ROWS: int = 500
+    # Rows newer than this are left to the next run (transactions still in flight)
+    SYNC_LAG_SECONDS: int = 30
+    GOOGLE_CREDENTIALS_FILE: str = "credentials.json"
+
+    # /delete and /rate pickers: the driver list is snapshotted per picker message
+    # for N seconds; later page flips read the database one page at a time
+    PICKER_SNAPSHOT_TTL: int = 900
+
+    # /find nearest search: "index" (in-memory driver index, Postgres until it is loaded) or "db"
+    FIND_BACKEND: str = "index"
     
     # Only Group ID is used for auth
     ADMIN_GROUP_ID: int
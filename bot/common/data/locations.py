@@ -1,3 +1,7 @@
+import csv
+from pathlib import Path
+from typing import Optional, Tuple
+
 US_STATES = {
     "NY": "New York",
     "CA": "California",
@@ -23,3 +27,75 @@ US_CITIES = {
     "NC": ["Charlotte", "Raleigh", "Greensboro", "Durham", "Winston-Salem"],
     "MI": ["Detroit", "Grand Rapids", "Warren", "Sterling Heights", "Ann Arbor"]
 }
+
+
+# Full code -> name table (50 states + DC), used to map gazetteer results
+US_STATE_NAMES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas",
+    "CA": "California", "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware",
+    "DC": "District of Columbia", "FL": "Florida", "GA": "Georgia", "HI": "Hawaii",
+    "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine",
+    "MD": "Maryland", "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota",
+    "MS": "Mississippi", "MO": "Missouri", "MT": "Montana", "NE": "Nebraska",
+    "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey", "NM": "New Mexico",
+    "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island",
+    "SC": "South Carolina", "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas",
+    "UT": "Utah", "VT": "Vermont", "VA": "Virginia", "WA": "Washington",
+    "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming"
+}
+
+# Stable small ids for compact storage (location_history.state_id): FIPS state codes, 0 = unknown
+STATE_FIPS = {
+    "AL": 1, "AK": 2, "AZ": 4, "AR": 5, "CA": 6, "CO": 8, "CT": 9, "DE": 10,
+    "DC": 11, "FL": 12, "GA": 13, "HI": 15, "ID": 16, "IL": 17, "IN": 18, "IA": 19,
+    "KS": 20, "KY": 21, "LA": 22, "ME": 23, "MD": 24, "MA": 25, "MI": 26, "MN": 27,
+    "MS": 28, "MO": 29, "MT": 30, "NE": 31, "NV": 32, "NH": 33, "NJ": 34, "NM": 35,
+    "NY": 36, "NC": 37, "ND": 38, "OH": 39, "OK": 40, "OR": 41, "PA": 42, "RI": 44,
+    "SC": 45, "SD": 46, "TN": 47, "TX": 48, "UT": 49, "VT": 50, "VA": 51, "WA": 53,
+    "WV": 54, "WI": 55, "WY": 56
+}
+FIPS_STATES = {fips: code for code, fips in STATE_FIPS.items()}
+_STATE_CODES_BY_NAME = {name.lower(): code for code, name in US_STATE_NAMES.items()}
+
+def state_id(state: str) -> int:
+    """
+    FIPS id for a state code or full name (as stored in locations.state), 0 if unknown.
+    """
+    if not state:
+        return 0
+    code = state.upper() if state.upper() in STATE_FIPS else _STATE_CODES_BY_NAME.get(state.lower())
+    return STATE_FIPS.get(code, 0)
+
+# Precomputed menu city coordinates, generated by scripts/build_city_catalog.py
+CATALOG_PATH = Path(__file__).parent / "us_cities.tsv"
+
+def _load_city_catalog(path: Path = CATALOG_PATH) -> dict:
+    catalog = {}
+    if not path.exists():
+        return catalog
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter="\t")
+        next(reader) # Header
+        for state_code, city, lat, lon in reader:
+            catalog[(state_code, city.lower())] = (state_code, city, float(lat), float(lon))
+    return catalog
+
+# (State Code, lowercase City) -> (State Code, City, Lat, Lon)
+CITY_CATALOG = _load_city_catalog()
+
+_CITIES_BY_NAME = {}
+for _key, _row in CITY_CATALOG.items():
+    _CITIES_BY_NAME.setdefault(_key[1], []).append(_row)
+
+def find_city(city: str, state_code: Optional[str] = None) -> Optional[Tuple[str, str, float, float]]:
+    """
+    Catalog lookup, no network. Returns (State Code, City, Lat, Lon) or None.
+    Without a state the name must be unambiguous (e.g. Columbus is in OH and GA).
+    """
+    name = city.strip().lower()
+    if state_code:
+        return CITY_CATALOG.get((state_code.upper(), name))
+    matches = _CITIES_BY_NAME.get(name, [])
+    return matches[0] if len(matches) == 1 else None
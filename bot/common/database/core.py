@@ -2,6 +2,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import text
 from bot.common.config import settings
+from bot.common.database.migrations import run_migrations
 
 engine = create_async_engine(settings.database_url, echo=True)
 
@@ -19,6 +20,9 @@ async def get_session() -> AsyncSession:
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+        # Columns/indexes added after the tables were first created
+        await run_migrations(conn)
         
         # Create Triggers explicitly using raw SQL
         # 1. Notify on New Driver
@@ -58,3 +62,126 @@ async def init_db():
             FOR EACH ROW
             EXECUTE FUNCTION notify_user_status();
         """))
+
+        # 3. Notify on Driver Position (keeps the admin bot's driver index in sync)
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION notify_driver_location() RETURNS TRIGGER AS $$
+            BEGIN
+                PERFORM pg_notify('driver_location', json_build_object(
+                    'user_id', NEW.user_id,
+                    'city', NEW.city,
+                    'state', NEW.state,
+                    'lat', NEW.latitude,
+                    'lon', NEW.longitude,
+                    'ts', extract(epoch FROM now())
+                )::text);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_driver_location ON locations;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_driver_location
+            AFTER INSERT OR UPDATE ON locations
+            FOR EACH ROW
+            EXECUTE FUNCTION notify_driver_location();
+        """))
+
+        # 4. Notify on Driver Profile changes the index cares about (status, name, rating, delete)
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION notify_driver_profile() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('driver_profile', json_build_object('user_id', OLD.user_id, 'status', 'deleted')::text);
+                    RETURN OLD;
+                END IF;
+                IF NEW.status IS DISTINCT FROM OLD.status
+                   OR NEW.full_name IS DISTINCT FROM OLD.full_name
+                   OR NEW.rating_score IS DISTINCT FROM OLD.rating_score THEN
+                    PERFORM pg_notify('driver_profile', json_build_object('user_id', NEW.user_id, 'status', NEW.status)::text);
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_driver_profile ON users;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_driver_profile
+            AFTER UPDATE OR DELETE ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION notify_driver_profile();
+        """))
+
+        # 5. Notify on profile fields cached by the driver bot (language, status, name)
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION notify_user_profile() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM pg_notify('user_profile', OLD.user_id::text);
+                    RETURN OLD;
+                END IF;
+                IF TG_OP = 'INSERT'
+                   OR NEW.language IS DISTINCT FROM OLD.language
+                   OR NEW.status IS DISTINCT FROM OLD.status
+                   OR NEW.full_name IS DISTINCT FROM OLD.full_name THEN
+                    PERFORM pg_notify('user_profile', NEW.user_id::text);
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_user_profile ON users;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_user_profile
+            AFTER INSERT OR UPDATE OR DELETE ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION notify_user_profile();
+        """))
+
+        # 6. users.updated_at on every change, whoever writes (ORM or raw SQL)
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+            BEGIN
+                NEW.updated_at = now();
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_touch_updated_at ON users;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_touch_updated_at
+            BEFORE UPDATE ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION touch_updated_at();
+        """))
+
+        # 7. Tombstones for the spreadsheet sync: record_deletion(stream, key column)
+        await conn.execute(text("""
+            CREATE OR REPLACE FUNCTION record_deletion() RETURNS TRIGGER AS $$
+            BEGIN
+                INSERT INTO sync_deletions (stream, key)
+                VALUES (TG_ARGV[0], (to_jsonb(OLD) ->> TG_ARGV[1])::bigint);
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql;
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_record_user_deletion ON users;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_record_user_deletion
+            AFTER DELETE ON users
+            FOR EACH ROW
+            EXECUTE FUNCTION record_deletion('drivers', 'user_id');
+        """))
+
+        await conn.execute(text("DROP TRIGGER IF EXISTS trigger_record_order_deletion ON orders;"))
+        await conn.execute(text("""
+            CREATE TRIGGER trigger_record_order_deletion
+            AFTER DELETE ON orders
+            FOR EACH ROW
+            EXECUTE FUNCTION record_deletion('orders', 'id');
+        """))
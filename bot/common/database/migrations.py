@@ -0,0 +1,100 @@
+from sqlalchemy import text
+from bot.common.config import settings
+
+# create_all only creates missing tables; columns/indexes added to existing
+# tables go here. Every statement must be idempotent (runs on each start).
+SCHEMA_UPGRADES = [
+    # Bounding-box prefilter for the DB-side /find search
+    "CREATE INDEX IF NOT EXISTS ix_locations_lat_lon ON locations (latitude, longitude);",
+
+    # Incremental rating accumulators
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS rating_good_acc DOUBLE PRECISION NOT NULL DEFAULT 0;",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS rating_total_acc DOUBLE PRECISION NOT NULL DEFAULT 0;",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0;",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS rating_updated_at TIMESTAMP WITH TIME ZONE;",
+
+    # Keyset pagination of /drivers on (full_name, user_id)
+    "CREATE INDEX IF NOT EXISTS ix_users_active_name ON users ((coalesce(full_name, '')), user_id) WHERE status = 'active';",
+
+    # Sync high-water mark on users (maintained by the touch_updated_at trigger)
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now();",
+    "CREATE INDEX IF NOT EXISTS ix_users_updated_at ON users (updated_at, user_id);",
+
+    # /broadcast audience filters
+    "CREATE INDEX IF NOT EXISTS ix_locations_state ON locations (state);",
+    "CREATE INDEX IF NOT EXISTS ix_users_active_last_active ON users (last_active_at) WHERE status = 'active';",
+
+    # Catches location_history rows outside the pre-created daily partitions
+    "CREATE TABLE IF NOT EXISTS location_history_default PARTITION OF location_history DEFAULT;",
+]
+
+# /search: trigram GIN indexes (phone on its digits, same expression as services/user_search.py)
+TRIGRAM_UPGRADES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+    "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (full_name gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS ix_users_zelle_trgm ON users USING gin (zelle gin_trgm_ops);",
+    "CREATE INDEX IF NOT EXISTS ix_users_phone_trgm ON users USING gin ((regexp_replace(coalesce(phone, ''), '[^0-9]', '', 'g')) gin_trgm_ops);",
+]
+
+async def run_migrations(conn):
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+    await seed_rating_accumulators(conn)
+    await enable_trigram_search(conn)
+
+async def enable_trigram_search(conn):
+    """
+    Optional: creating pg_trgm needs privileges the DB user may not have.
+    Runs in a savepoint so a failure leaves the rest of init_db intact;
+    /search then falls back to an in-memory index.
+    """
+    try:
+        async with conn.begin_nested():
+            for statement in TRIGRAM_UPGRADES:
+                await conn.execute(text(statement))
+    except Exception as e:
+        print(f"pg_trgm unavailable, /search will use the in-memory index: {e}")
+
+async def seed_rating_accumulators(conn):
+    """
+    One-off seed of the rating accumulators from existing orders, for drivers
+    rated before the incremental model (rating_updated_at still NULL).
+    """
+    # Imported here: services import the database package
+    from bot.common.services.rating import PRIOR_GOOD, PRIOR_TOTAL, PRIOR_SCORE, CONFIDENCE_ORDERS
+
+    result = await conn.execute(text("""
+        UPDATE users u SET
+            rating_good_acc = s.good,
+            rating_total_acc = s.total,
+            rating_count = s.cnt,
+            rating_updated_at = now(),
+            rating_score = (s.good + CAST(:prior_good AS DOUBLE PRECISION)) / (s.total + CAST(:prior_total AS DOUBLE PRECISION)),
+            rating_confidence = 1 - exp(-s.cnt / CAST(:confidence_orders AS DOUBLE PRECISION))
+        FROM (
+            SELECT driver_id,
+                   sum(CASE WHEN is_good THEN w ELSE 0 END) AS good,
+                   sum(w) AS total,
+                   count(*) AS cnt
+            FROM (
+                SELECT driver_id, is_good,
+                       power(0.5, greatest(extract(epoch FROM now() - created_at), 0) / CAST(:half_life_s AS DOUBLE PRECISION)) AS w
+                FROM orders
+            ) o
+            GROUP BY driver_id
+        ) s
+        WHERE u.user_id = s.driver_id AND u.rating_updated_at IS NULL;
+    """), {
+        "half_life_s": settings.RATING_HALF_LIFE_DAYS * 86400,
+        "prior_good": PRIOR_GOOD,
+        "prior_total": PRIOR_TOTAL,
+        "confidence_orders": CONFIDENCE_ORDERS,
+    })
+    if result.rowcount:
+        print(f"Seeded rating accumulators for {result.rowcount} drivers")
+
+    # Unrated drivers created with the old 4.0 default (stars, not a 0..1 score)
+    await conn.execute(
+        text("UPDATE users SET rating_score = CAST(:prior AS DOUBLE PRECISION) WHERE rating_count = 0 AND rating_score > 1;"),
+        {"prior": PRIOR_SCORE}
+    )
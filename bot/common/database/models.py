@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import BigInteger, Integer, SmallInteger, String, Float, Boolean, ForeignKey, DateTime
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 from bot.common.database.core import Base
@@ -15,12 +15,19 @@ class User(Base):
     status: Mapped[str] = mapped_column(String, default="pending") # active, banned, pending
     language: Mapped[str] = mapped_column(String, default="en")
     
-    # Rating fields
-    rating_score: Mapped[float] = mapped_column(Float, default=4.0)
+    # Rating fields (score is 0..1; 0.75 is the prior, shown as 4.0 stars)
+    rating_score: Mapped[float] = mapped_column(Float, default=0.75)
     rating_confidence: Mapped[float] = mapped_column(Float, default=0.0)
+    # Decayed good/total order weights as of rating_updated_at (see services/rating.py)
+    rating_good_acc: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+    rating_total_acc: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    rating_updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     last_active_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Any change to the row; set by the touch_updated_at trigger (sync high-water mark)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     location: Mapped["Location"] = relationship("Location", back_populates="user", uselist=False)
     orders: Mapped[list["Order"]] = relationship("Order", back_populates="driver")
@@ -38,6 +45,21 @@ class Location(Base):
 
     user: Mapped["User"] = relationship("User", back_populates="location")
 
+class LocationHistory(Base):
+    """
+    Append-only position log, range-partitioned by day (UTC) on recorded_at.
+    Partitions are created ahead and dropped after retention by
+    services/location_history.py. No FK: history outlives deleted users.
+    """
+    __tablename__ = "location_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (recorded_at)"}
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    lat_e6: Mapped[int] = mapped_column(Integer) # microdegrees
+    lon_e6: Mapped[int] = mapped_column(Integer)
+    state_id: Mapped[int] = mapped_column(SmallInteger, default=0) # FIPS, see data/locations.py
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -50,3 +72,24 @@ class Order(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     driver: Mapped["User"] = relationship("User", back_populates="orders")
+
+class SyncWatermark(Base):
+    """
+    Per-stream high-water mark of the spreadsheet sync (services/sync.py), as JSON.
+    """
+    __tablename__ = "sync_watermarks"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[str] = mapped_column(String)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class SyncDeletion(Base):
+    """
+    Tombstones written by the record_deletion trigger, so the sync can delete mirrored rows.
+    """
+    __tablename__ = "sync_deletions"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    stream: Mapped[str] = mapped_column(String)
+    key: Mapped[int] = mapped_column(BigInteger)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,5 @@
+from redis.asyncio import Redis
+from bot.common.config import settings
+
+# Shared async client (FSM storage, caches, rate limiters)
+redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
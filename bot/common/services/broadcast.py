@@ -0,0 +1,145 @@
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, func, or_
+
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User, Location
+from bot.common.data.locations import US_STATE_NAMES
+from bot.common.services.rating import sql_current_score, stars_to_score
+from bot.common.services.driver_list import STALE_HOURS
+from bot.common.services.i18n import MESSAGES, t, get_lang, set_lang
+from bot.common.services.outbox import driver_outbox, message_job
+
+ENQUEUE_BATCH = 1000
+
+@dataclass
+class BroadcastFilters:
+    """
+    /broadcast audience; every filter is optional, none = all active drivers.
+    """
+    state: Optional[str] = None # state code
+    seen_within_hours: Optional[float] = None
+    stale: bool = False
+    min_rating: Optional[float] = None # stars
+    max_rating: Optional[float] = None
+
+    def describe(self) -> str:
+        parts = []
+        if self.state:
+            parts.append(US_STATE_NAMES.get(self.state, self.state))
+        if self.seen_within_hours is not None:
+            parts.append(f"seen in {self.seen_within_hours:g}h")
+        if self.stale:
+            parts.append(f"not seen > {STALE_HOURS}h")
+        if self.min_rating is not None:
+            parts.append(f"⭐️ ≥ {self.min_rating:g}")
+        if self.max_rating is not None:
+            parts.append(f"⭐️ ≤ {self.max_rating:g}")
+        return ", ".join(parts) or "all active drivers"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+def parse_broadcast_args(args: List[str]) -> BroadcastFilters:
+    """
+    [STATE] [seen=6 | 6h] [stale] [min=4] [max=4.5]. Raises ValueError on bad input.
+    """
+    filters = BroadcastFilters()
+    for arg in args:
+        low = arg.lower()
+        key, sep, value = low.partition("=")
+        if sep:
+            try:
+                number = float(value.removesuffix("h") if key == "seen" else value)
+            except ValueError:
+                raise ValueError(f"Bad value for '{key}': {value}")
+            if key == "seen":
+                if number <= 0:
+                    raise ValueError("seen= must be a positive number of hours")
+                filters.seen_within_hours = number
+            elif key in ("min", "max"):
+                if not 1 <= number <= 5:
+                    raise ValueError("Ratings are between 1 and 5")
+                setattr(filters, f"{key}_rating", number)
+            else:
+                raise ValueError(f"Unknown filter '{key}'")
+        elif low.endswith("h") and low[:-1].replace(".", "", 1).isdigit() and float(low[:-1]) > 0:
+            filters.seen_within_hours = float(low[:-1])
+        elif low == "stale":
+            filters.stale = True
+        elif arg.upper() in US_STATE_NAMES:
+            filters.state = arg.upper()
+        else:
+            raise ValueError(f"Unknown state or filter '{arg}'")
+    if filters.stale and filters.seen_within_hours is not None:
+        raise ValueError("'stale' and 'seen' exclude each other")
+    return filters
+
+def audience_query(filters: BroadcastFilters):
+    """
+    (user_id, language) of the matching active drivers, in one query
+    (ix_users_active_last_active, ix_locations_state).
+    """
+    stmt = select(User.user_id, User.language).where(User.status == "active")
+    if filters.state:
+        stmt = stmt.join(Location, Location.user_id == User.user_id).where(
+            or_(Location.state == filters.state, Location.state == US_STATE_NAMES[filters.state])
+        )
+    now = datetime.now(timezone.utc)
+    if filters.seen_within_hours is not None:
+        stmt = stmt.where(User.last_active_at >= now - timedelta(hours=filters.seen_within_hours))
+    if filters.stale:
+        stmt = stmt.where(User.last_active_at < now - timedelta(hours=STALE_HOURS))
+    if filters.min_rating is not None:
+        stmt = stmt.where(sql_current_score() >= stars_to_score(filters.min_rating))
+    if filters.max_rating is not None:
+        stmt = stmt.where(sql_current_score() <= stars_to_score(filters.max_rating))
+    return stmt
+
+async def count_audience(filters: BroadcastFilters) -> int:
+    async with async_session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(audience_query(filters).subquery()))
+
+def _localized_headers() -> dict:
+    previous = get_lang()
+    headers = {}
+    for lang in MESSAGES:
+        set_lang(lang)
+        headers[lang] = t("broadcast_header")
+    set_lang(previous)
+    return headers
+
+async def start_broadcast(filters: BroadcastFilters, html_text: str) -> Tuple[str, int]:
+    """
+    Streams the audience into driver_outbox as tracked bulk jobs, each with the
+    header in the driver's language. Returns (broadcast id, recipients);
+    progress via broadcast_progress, sending happens in the driver bot.
+    """
+    broadcast_id = uuid.uuid4().hex[:12]
+    tag = f"broadcast:{broadcast_id}"
+    headers = _localized_headers()
+
+    total = 0
+    async with async_session_factory() as session:
+        result = await session.stream(audience_query(filters).execution_options(yield_per=ENQUEUE_BATCH))
+        async for rows in result.partitions(ENQUEUE_BATCH):
+            jobs = [
+                message_job(user_id, f"{headers.get(lang, headers['en'])}\n\n{html_text}", tag=tag, tracked=True)
+                for user_id, lang in rows
+            ]
+            total += await driver_outbox.enqueue_many(jobs, bulk=True)
+    await driver_outbox.set_tag_total(tag, total)
+    return broadcast_id, total
+
+async def broadcast_progress(broadcast_id: str) -> dict:
+    stats = await driver_outbox.tag_stats(f"broadcast:{broadcast_id}")
+    progress = {k: stats.get(k, 0) for k in ("total", "sent", "failed", "cancelled")}
+    # No total yet: start_broadcast is still queueing
+    progress["done"] = "total" in stats and progress["sent"] + progress["failed"] + progress["cancelled"] >= progress["total"]
+    return progress
+
+async def cancel_broadcast(broadcast_id: str):
+    await driver_outbox.cancel(f"broadcast:{broadcast_id}")
@@ -0,0 +1,160 @@
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+# Sentinel for "key not cached" (None is a valid cached value: negative entry)
+MISSING = object()
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL.
+    Oldest entries are evicted once maxsize is reached.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = Lock() # Also safe to share with executor threads
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = item
+            if expires_at <= self._timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (self._timer() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+class TieredCache:
+    """
+    Two-tier cache: in-process TTLCache (L1) in front of a shared Redis (L2).
+    Values are stored as JSON. None is cached as a negative ("not found") entry
+    with its own, shorter TTL.
+    Redis failures are treated as misses so the cache never breaks the caller.
+    """
+    def __init__(self, prefix: str, redis, maxsize: int, ttl: int, negative_ttl: int):
+        self.prefix = prefix
+        self.redis = redis
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.l2_hits = 0
+        self.l2_misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _ttl_for(self, value) -> int:
+        return self.negative_ttl if value is None else self.ttl
+
+    async def get(self, key: str):
+        """
+        Returns the cached value, None for a negative entry or MISSING.
+        """
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+
+        if self.redis is None:
+            return MISSING
+
+        try:
+            raw = await self.redis.get(self._key(key))
+        except Exception as e:
+            print(f"Cache read error ({self.prefix}): {e}")
+            return MISSING
+
+        if raw is None:
+            self.l2_misses += 1
+            return MISSING
+
+        self.l2_hits += 1
+        value = json.loads(raw)
+        # Promote to L1 (JSON turns tuples into lists, keep callers' shape)
+        if isinstance(value, list):
+            value = tuple(value)
+        self.local.set(key, value, ttl=self._ttl_for(value))
+        return value
+
+    async def set(self, key: str, value):
+        ttl = self._ttl_for(value)
+        self.local.set(key, value, ttl=ttl)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._key(key), json.dumps(value), ex=ttl)
+        except Exception as e:
+            print(f"Cache write error ({self.prefix}): {e}")
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(self._key(key))
+        except Exception as e:
+            print(f"Cache delete error ({self.prefix}): {e}")
+
+    async def clear(self):
+        """
+        Drops every entry of this cache, in-process and in Redis.
+        """
+        self.local.clear()
+        if self.redis is None:
+            return
+        try:
+            keys = [key async for key in self.redis.scan_iter(match=f"{self.prefix}:*", count=500)]
+            for i in range(0, len(keys), 500):
+                await self.redis.delete(*keys[i:i + 500])
+        except Exception as e:
+            print(f"Cache clear error ({self.prefix}): {e}")
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        stats["l2_hits"] = self.l2_hits
+        stats["l2_misses"] = self.l2_misses
+        return stats
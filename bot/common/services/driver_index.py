@@ -0,0 +1,222 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List, Tuple
+
+import numpy as np
+
+from bot.common.services.geocoding import haversine_miles
+from bot.common.services.rating import current_score
+
+MILES_PER_DEG_LAT = 69.05
+
+@dataclass
+class DriverEntry:
+    """
+    Slim, render-ready copy of an active driver and their last position.
+    """
+    user_id: int
+    full_name: Optional[str]
+    rating_score: float
+    last_active_at: datetime
+    city: Optional[str] = None
+    state: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @property
+    def has_position(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+    @classmethod
+    def from_user(cls, user) -> "DriverEntry":
+        loc = user.location
+        return cls(
+            user_id=user.user_id,
+            full_name=user.full_name,
+            rating_score=current_score(user),
+            last_active_at=user.last_active_at,
+            city=loc.city if loc else None,
+            state=loc.state if loc else None,
+            latitude=loc.latitude if loc else None,
+            longitude=loc.longitude if loc else None
+        )
+
+class DriverIndex:
+    """
+    In-memory grid index of active drivers.
+    Positions are bucketed into cell_deg x cell_deg cells; k-nearest and radius
+    queries only look at the cells around the target, growing ring by ring.
+    Kept up to date incrementally from pg_notify events (see bot/admin/main.py).
+    """
+    def __init__(self, cell_deg: float = 0.5):
+        self.cell_deg = cell_deg
+        self.entries = {} # user_id -> DriverEntry (incl. drivers without position)
+        self._cells = {} # (row, col) -> set(user_id)
+        self._cell_of = {} # user_id -> (row, col)
+        self._bounds = None # (min_row, max_row, min_col, max_col); only grows, a safe superset
+        self._journal = None # [(method, args)] applied while a snapshot is being loaded
+        self.ready = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def begin_rebuild(self):
+        """
+        Starts journaling changes; rebuild() replays them on top of the snapshot,
+        so events applied while the snapshot query runs are not lost.
+        """
+        self._journal = []
+
+    def abort_rebuild(self):
+        self._journal = None
+
+    def rebuild(self, entries: List[DriverEntry]):
+        journal, self._journal = self._journal or [], None
+        self.entries = {}
+        self._cells = {}
+        self._cell_of = {}
+        self._bounds = None
+        for entry in entries:
+            self._put(entry)
+        for method, args in journal:
+            method(*args)
+        self.ready = True
+
+    def upsert(self, entry: DriverEntry):
+        if self._journal is not None:
+            self._journal.append((self.upsert, (entry,)))
+        self._put(entry)
+
+    def _put(self, entry: DriverEntry):
+        self._drop(entry.user_id)
+        self.entries[entry.user_id] = entry
+        if entry.has_position:
+            cell = self._cell(entry.latitude, entry.longitude)
+            self._cells.setdefault(cell, set()).add(entry.user_id)
+            self._cell_of[entry.user_id] = cell
+            if self._bounds is None:
+                self._bounds = (cell[0], cell[0], cell[1], cell[1])
+            else:
+                min_r, max_r, min_c, max_c = self._bounds
+                self._bounds = (min(min_r, cell[0]), max(max_r, cell[0]), min(min_c, cell[1]), max(max_c, cell[1]))
+
+    def move(self, user_id: int, lat: float, lon: float, city: str, state: str, seen_at: datetime) -> bool:
+        """
+        Applies a new position. Returns False if the driver is not indexed (not active).
+        """
+        if self._journal is not None:
+            self._journal.append((self.move, (user_id, lat, lon, city, state, seen_at)))
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return False
+        entry.latitude, entry.longitude = lat, lon
+        entry.city, entry.state = city, state
+        entry.last_active_at = seen_at
+        self._put(entry)
+        return True
+
+    def remove(self, user_id: int):
+        if self._journal is not None:
+            self._journal.append((self.remove, (user_id,)))
+        self._drop(user_id)
+
+    def _drop(self, user_id: int):
+        self.entries.pop(user_id, None)
+        cell = self._cell_of.pop(user_id, None)
+        if cell is not None:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._cells[cell]
+
+    def _ring(self, center: Tuple[int, int], r: int):
+        row0, col0 = center
+        if r == 0:
+            yield center
+            return
+        for col in range(col0 - r, col0 + r + 1):
+            yield row0 - r, col
+            yield row0 + r, col
+        for row in range(row0 - r + 1, row0 + r):
+            yield row, col0 - r
+            yield row, col0 + r
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        # Chebyshev distance to the farthest corner of the occupied area
+        if not self._cells:
+            return -1
+        min_r, max_r, min_c, max_c = self._bounds
+        return max(abs(min_r - center[0]), abs(max_r - center[0]), abs(min_c - center[1]), abs(max_c - center[1]))
+
+    def _ring_clearance_miles(self, lat: float, r: int) -> float:
+        """
+        Lower bound on the distance from the target to any cell outside ring r.
+        Longitude cells shrink with latitude, so use the narrowest latitude reached.
+        """
+        extreme_lat = min(89.9, abs(lat) + (r + 1) * self.cell_deg)
+        return r * self.cell_deg * MILES_PER_DEG_LAT * math.cos(math.radians(extreme_lat))
+
+    def _distances(self, lat: float, lon: float, ids: List[int]) -> np.ndarray:
+        lats = np.array([self.entries[i].latitude for i in ids], dtype=float)
+        lons = np.array([self.entries[i].longitude for i in ids], dtype=float)
+        return haversine_miles(lat, lon, lats, lons)
+
+    def knn(self, lat: float, lon: float, k: int = 10, predicate=None) -> List[Tuple[DriverEntry, float]]:
+        """
+        k nearest positioned drivers, nearest first, as (entry, miles).
+        predicate(entry) -> bool optionally filters candidates.
+        """
+        center = self._cell(lat, lon)
+        max_ring = self._max_ring(center)
+        found = [] # (miles, user_id)
+        r = 0
+        while r <= max_ring:
+            ids = [
+                uid for cell in self._ring(center, r)
+                for uid in self._cells.get(cell, ())
+                if predicate is None or predicate(self.entries[uid])
+            ]
+            if ids:
+                found.extend(zip(self._distances(lat, lon, ids).tolist(), ids))
+                found.sort()
+                found = found[:k]
+            # Done once the k-th match is closer than anything in the next ring
+            if len(found) >= k and found[-1][0] <= self._ring_clearance_miles(lat, r):
+                break
+            r += 1
+        return [(self.entries[uid], miles) for miles, uid in found]
+
+    def within(self, lat: float, lon: float, radius_miles: float, predicate=None) -> List[Tuple[DriverEntry, float]]:
+        """
+        All positioned drivers within radius_miles, nearest first.
+        """
+        center = self._cell(lat, lon)
+        # Rings needed so that the clearance covers the radius
+        r = 0
+        max_ring = self._max_ring(center)
+        ids = []
+        while r <= max_ring:
+            ids.extend(
+                uid for cell in self._ring(center, r)
+                for uid in self._cells.get(cell, ())
+                if predicate is None or predicate(self.entries[uid])
+            )
+            if self._ring_clearance_miles(lat, r) >= radius_miles:
+                break
+            r += 1
+        if not ids:
+            return []
+        dists = self._distances(lat, lon, ids)
+        hits = sorted((d, uid) for d, uid in zip(dists.tolist(), ids) if d <= radius_miles)
+        return [(self.entries[uid], miles) for miles, uid in hits]
+
+    def without_position(self) -> List[DriverEntry]:
+        return [e for e in self.entries.values() if not e.has_position]
+
+# One per admin process
+driver_index = DriverIndex()
@@ -0,0 +1,206 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+
+from sqlalchemy import select, func, tuple_, or_
+from sqlalchemy.orm import aliased
+
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User, Location
+from bot.common.data.locations import US_STATE_NAMES
+from bot.common.services.rating import sql_current_score, stars_to_score
+from bot.common.services.cache import TTLCache, MISSING
+from bot.common.services.fleet import fleet_version, LOCATION
+
+# Sized so a page of cards (names capped at NAME_MAX) stays under Telegram's 4096 chars
+PAGE_SIZE = 12
+NAME_MAX = 48
+# Same threshold as the inactivity reminder
+STALE_HOURS = 12
+# Cached pages: the TTL bounds drift of "seen Xm ago" and of the stale filter
+PAGE_CACHE_TTL = 60
+
+@dataclass
+class ListFilters:
+    """
+    /drivers filters, applied in SQL. Packed into callback data by pack().
+    """
+    state: Optional[str] = None # state code
+    stale: bool = False
+    min_rating: Optional[float] = None # stars
+    max_rating: Optional[float] = None
+
+    def __bool__(self):
+        return bool(self.state or self.stale or self.min_rating is not None or self.max_rating is not None)
+
+    def pack(self) -> str:
+        # "," not ".": ratings like 4.5 contain dots
+        return ",".join([
+            self.state or "",
+            "1" if self.stale else "",
+            f"{self.min_rating:g}" if self.min_rating is not None else "",
+            f"{self.max_rating:g}" if self.max_rating is not None else "",
+        ])
+
+    @classmethod
+    def unpack(cls, packed: str) -> "ListFilters":
+        state, stale, min_rating, max_rating = packed.split(",")
+        return cls(
+            state=state or None,
+            stale=stale == "1",
+            min_rating=float(min_rating) if min_rating else None,
+            max_rating=float(max_rating) if max_rating else None,
+        )
+
+    def describe(self) -> str:
+        parts = []
+        if self.state:
+            parts.append(US_STATE_NAMES.get(self.state, self.state))
+        if self.stale:
+            parts.append(f"not seen > {STALE_HOURS}h")
+        if self.min_rating is not None:
+            parts.append(f"⭐️ ≥ {self.min_rating:g}")
+        if self.max_rating is not None:
+            parts.append(f"⭐️ ≤ {self.max_rating:g}")
+        return ", ".join(parts)
+
+def parse_list_args(args: List[str]) -> ListFilters:
+    """
+    /drivers [STATE] [stale] [min=4] [max=4.5]. Raises ValueError on bad input.
+    """
+    filters = ListFilters()
+    for arg in args:
+        low = arg.lower()
+        key, sep, value = low.partition("=")
+        if sep:
+            if key not in ("min", "max"):
+                raise ValueError(f"Unknown filter '{key}'")
+            try:
+                stars = float(value)
+            except ValueError:
+                raise ValueError(f"Bad value for '{key}': {value}")
+            if not 1 <= stars <= 5:
+                raise ValueError("Ratings are between 1 and 5")
+            setattr(filters, f"{key}_rating", stars)
+        elif low == "stale":
+            filters.stale = True
+        elif arg.upper() in US_STATE_NAMES:
+            filters.state = arg.upper()
+        else:
+            raise ValueError(f"Unknown state or filter '{arg}'")
+    return filters
+
+def _sort_key():
+    # Matches ix_users_active_name
+    return tuple_(func.coalesce(User.full_name, ""), User.user_id)
+
+async def fetch_drivers_page(
+    filters: ListFilters, cursor: int = 0, direction: str = "a"
+) -> Tuple[List[Tuple[User, Optional[Location]]], bool]:
+    """
+    One page of active drivers ordered by (full_name, user_id), keyset-paginated:
+    direction "a" = after the cursor driver, "b" = before it, "r" = from it
+    (inclusive, for refresh); cursor 0 = from the start.
+    Returns (rows, more) where more says whether another page exists in that direction.
+    """
+    key = _sort_key()
+    stmt = (
+        select(User, Location)
+        .outerjoin(Location, Location.user_id == User.user_id)
+        .where(User.status == "active")
+    )
+
+    if filters.state:
+        stmt = stmt.where(or_(Location.state == filters.state, Location.state == US_STATE_NAMES[filters.state]))
+    if filters.stale:
+        stmt = stmt.where(User.last_active_at < datetime.now(timezone.utc) - timedelta(hours=STALE_HOURS))
+    if filters.min_rating is not None:
+        stmt = stmt.where(sql_current_score() >= stars_to_score(filters.min_rating))
+    if filters.max_rating is not None:
+        stmt = stmt.where(sql_current_score() <= stars_to_score(filters.max_rating))
+
+    if cursor:
+        # Position of the cursor driver; a deleted one yields an empty page
+        other = aliased(User)
+        anchor = tuple_(
+            select(func.coalesce(other.full_name, "")).where(other.user_id == cursor).scalar_subquery(),
+            cursor
+        )
+        if direction == "b":
+            stmt = stmt.where(key < anchor)
+        elif direction == "r":
+            stmt = stmt.where(key >= anchor)
+        else:
+            stmt = stmt.where(key > anchor)
+
+    if direction == "b":
+        stmt = stmt.order_by(func.coalesce(User.full_name, "").desc(), User.user_id.desc())
+    else:
+        stmt = stmt.order_by(func.coalesce(User.full_name, ""), User.user_id)
+
+    async with async_session_factory() as session:
+        result = await session.execute(stmt.limit(PAGE_SIZE + 1))
+        rows = [tuple(row) for row in result.all()]
+
+    more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    if direction == "b":
+        rows.reverse()
+    return rows, more
+
+async def fetch_drivers_by_ids(user_ids) -> dict:
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(User, Location)
+            .outerjoin(Location, Location.user_id == User.user_id)
+            .where(User.user_id.in_(list(user_ids)))
+        )
+        return {user.user_id: (user, loc) for user, loc in result.all()}
+
+@dataclass
+class DriversPage:
+    version: int # fleet_version the rows are current as of
+    rows: list
+    more: bool
+    cards: dict = field(default_factory=dict) # user_id -> rendered card parts
+
+page_cache = TTLCache(maxsize=256, ttl=PAGE_CACHE_TTL)
+
+def _patchable(changes, filters: ListFilters) -> bool:
+    # Location moves never reorder the list (sorted by name), but they can move a
+    # driver in or out of a state / stale filter. Profile changes can do anything.
+    return not filters.state and not filters.stale and all(kind == LOCATION for _, kind in changes)
+
+async def get_drivers_page(filters: ListFilters, cursor: int = 0, direction: str = "a") -> DriversPage:
+    """
+    fetch_drivers_page behind a cache keyed by fleet_version: an unchanged fleet
+    costs no query; location-only changes re-read just the affected rows of the page.
+    """
+    key = (direction, cursor, filters.pack())
+    version = fleet_version.value # taken before reading: later changes get applied next time
+    page = page_cache.get(key)
+    if page is not MISSING:
+        changes = fleet_version.changes_since(page.version)
+        if changes == []:
+            return page
+        if changes is not None and _patchable(changes, filters):
+            changed = {user_id for user_id, _ in changes} & {u.user_id for u, _ in page.rows}
+            if changed:
+                fresh = await fetch_drivers_by_ids(changed)
+                page.rows = [fresh.get(u.user_id, (u, loc)) for u, loc in page.rows]
+                for user_id in changed:
+                    page.cards.pop(user_id, None)
+            page.version = version
+            return page
+
+    rows, more = await fetch_drivers_page(filters, cursor, direction)
+    page = DriversPage(version, rows, more)
+    page_cache.set(key, page)
+    return page
+
+def alias_page(page: DriversPage, filters: ListFilters, first_user_id: int):
+    """
+    Registers a forward page under its refresh key too (drv_r from its first row),
+    so the first refresh of a freshly opened page is already a cache hit.
+    """
+    page_cache.set(("r", first_user_id, filters.pack()), page)
@@ -0,0 +1,187 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Tuple
+
+from sqlalchemy import select, func
+
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User, Location
+from bot.common.services.driver_index import DriverEntry, MILES_PER_DEG_LAT
+from bot.common.services.geocoding import EARTH_RADIUS_MI
+from bot.common.services.rating import current_score, sql_current_score, stars_to_score
+
+# KNN without a radius: try growing boxes before falling back to a full ordered scan
+KNN_STEPS_MILES = (50, 200, 800)
+
+@dataclass
+class FindFilters:
+    """
+    Optional /find filters. Evaluated in SQL by search_drivers_db and
+    as a predicate against the in-memory driver index.
+    """
+    radius_miles: Optional[float] = None
+    min_rating: Optional[float] = None # stars, as displayed (1..5)
+    seen_within_hours: Optional[float] = None
+
+    def __bool__(self):
+        return any(v is not None for v in (self.radius_miles, self.min_rating, self.seen_within_hours))
+
+    def seen_since(self) -> Optional[datetime]:
+        if self.seen_within_hours is None:
+            return None
+        return datetime.now(timezone.utc) - timedelta(hours=self.seen_within_hours)
+
+    def predicate(self):
+        """
+        Rating/seen check for index entries (radius is handled by the index query itself).
+        """
+        seen_since = self.seen_since()
+        min_score = stars_to_score(self.min_rating) if self.min_rating is not None else None
+
+        def check(entry: DriverEntry) -> bool:
+            if min_score is not None and entry.rating_score < min_score:
+                return False
+            if seen_since is not None:
+                last_active = entry.last_active_at
+                if last_active.tzinfo is None:
+                    last_active = last_active.replace(tzinfo=timezone.utc)
+                if last_active < seen_since:
+                    return False
+            return True
+
+        return check if (min_score is not None or seen_since is not None) else None
+
+    def describe(self) -> str:
+        parts = []
+        if self.radius_miles is not None:
+            parts.append(f"≤ {self.radius_miles:g} mi")
+        if self.min_rating is not None:
+            parts.append(f"⭐️ ≥ {self.min_rating:g}")
+        if self.seen_within_hours is not None:
+            parts.append(f"seen ≤ {self.seen_within_hours:g}h")
+        return ", ".join(parts)
+
+def parse_find_args(args: List[str]) -> Tuple[List[str], FindFilters]:
+    """
+    Splits /find arguments into location words and filters.
+    Filters: r=50 (or 50mi), min=4.5 (or rating=4.5), seen=12 (or 12h).
+    Raises ValueError on a malformed filter value.
+    """
+    words = []
+    filters = FindFilters()
+    for arg in args:
+        low = arg.lower()
+        key, sep, value = low.partition("=")
+        if sep:
+            if key in ("r", "radius"):
+                filters.radius_miles = _number(key, value.removesuffix("mi"))
+            elif key in ("min", "rating"):
+                filters.min_rating = _number(key, value)
+            elif key == "seen":
+                filters.seen_within_hours = _number(key, value.removesuffix("h"))
+            else:
+                raise ValueError(f"Unknown filter '{key}'")
+        elif low.endswith("mi") and _is_number(low[:-2]):
+            filters.radius_miles = float(low[:-2])
+        elif low.endswith("h") and _is_number(low[:-1]):
+            filters.seen_within_hours = float(low[:-1])
+        else:
+            words.append(arg)
+
+    for value in (filters.radius_miles, filters.min_rating, filters.seen_within_hours):
+        if value is not None and (value <= 0 or math.isnan(value) or math.isinf(value)):
+            raise ValueError("Filter values must be positive numbers")
+    return words, filters
+
+def _number(key: str, value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Bad value for '{key}': {value}")
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+def _distance_expr(lat: float, lon: float):
+    # Haversine in SQL, miles
+    half_dlat = func.radians(Location.latitude - lat) * 0.5
+    half_dlon = func.radians(Location.longitude - lon) * 0.5
+    a = (
+        func.power(func.sin(half_dlat), 2)
+        + math.cos(math.radians(lat)) * func.cos(func.radians(Location.latitude)) * func.power(func.sin(half_dlon), 2)
+    )
+    return 2 * EARTH_RADIUS_MI * func.asin(func.sqrt(func.least(a, 1.0)))
+
+def _bbox(lat: float, lon: float, radius_miles: float):
+    """
+    Lat/lon box containing the circle; served by ix_locations_lat_lon.
+    """
+    dlat = radius_miles / MILES_PER_DEG_LAT
+    conds = [Location.latitude.between(lat - dlat, lat + dlat)]
+    # Longitude degrees shrink towards the poles: size the box at its widest-latitude edge
+    edge_lat = abs(lat) + dlat
+    if edge_lat < 89.0:
+        dlon = radius_miles / (MILES_PER_DEG_LAT * math.cos(math.radians(edge_lat)))
+        if dlon < 180.0:
+            conds.append(Location.longitude.between(lon - dlon, lon + dlon))
+    return conds
+
+async def search_drivers_db(lat: float, lon: float, k: int = 10, filters: FindFilters = None) -> List[Tuple[DriverEntry, float]]:
+    """
+    Nearest active drivers computed in Postgres: bounding-box prefilter, exact
+    distance, filters and ORDER BY ... LIMIT k in one query. Returns (entry, miles).
+    """
+    filters = filters or FindFilters()
+    dist = _distance_expr(lat, lon)
+
+    base = select(User, Location, dist.label("dist")).where(User.status == 'active')
+    if filters.min_rating is not None:
+        base = base.where(sql_current_score() >= stars_to_score(filters.min_rating))
+    seen_since = filters.seen_since()
+    if seen_since is not None:
+        base = base.where(User.last_active_at >= seen_since)
+
+    async with async_session_factory() as session:
+        if filters.radius_miles is not None:
+            steps = (filters.radius_miles,)
+        else:
+            steps = KNN_STEPS_MILES
+
+        for radius in steps:
+            stmt = (
+                base.join(Location, Location.user_id == User.user_id)
+                .where(*_bbox(lat, lon, radius))
+                .where(dist <= radius)
+                .order_by(dist)
+                .limit(k)
+            )
+            rows = (await session.execute(stmt)).all()
+            # k hits inside the circle are the true top k; so is anything under an explicit radius
+            if len(rows) >= k or filters.radius_miles is not None:
+                return [(_entry(u, loc), float(d)) for u, loc, d in rows]
+
+        # Sparse fleet: full ordered scan, drivers without a position last
+        stmt = (
+            base.outerjoin(Location, Location.user_id == User.user_id)
+            .order_by(dist.asc().nullslast(), User.full_name)
+            .limit(k)
+        )
+        rows = (await session.execute(stmt)).all()
+        return [(_entry(u, loc), float(d) if d is not None else float('inf')) for u, loc, d in rows]
+
+def _entry(user: User, loc: Optional[Location]) -> DriverEntry:
+    return DriverEntry(
+        user_id=user.user_id,
+        full_name=user.full_name,
+        rating_score=current_score(user),
+        last_active_at=user.last_active_at,
+        city=loc.city if loc else None,
+        state=loc.state if loc else None,
+        latitude=loc.latitude if loc else None,
+        longitude=loc.longitude if loc else None
+    )
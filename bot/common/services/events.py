@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# Typed payloads of the pg_notify channels (triggers in database/core.py)
+
+@dataclass(frozen=True)
+class DriverLocation:
+    """
+    driver_location: a locations row was written.
+    """
+    user_id: int
+    lat: float
+    lon: float
+    city: Optional[str]
+    state: Optional[str]
+    seen_at: datetime
+
+    @classmethod
+    def parse(cls, data: dict) -> "DriverLocation":
+        return cls(
+            user_id=int(data["user_id"]),
+            lat=data["lat"],
+            lon=data["lon"],
+            city=data["city"],
+            state=data["state"],
+            seen_at=datetime.fromtimestamp(float(data["ts"]), tz=timezone.utc),
+        )
+
+@dataclass(frozen=True)
+class DriverProfile:
+    """
+    driver_profile: status, name or rating changed ("deleted" for deleted rows).
+    """
+    user_id: int
+    status: str
+
+    @classmethod
+    def parse(cls, data: dict) -> "DriverProfile":
+        return cls(user_id=int(data["user_id"]), status=data["status"])
+
+@dataclass(frozen=True)
+class ProfileInvalidation:
+    """
+    user_profile: a user id, or "*" (user_id None) for every cached profile.
+    """
+    user_id: Optional[int]
+
+    @classmethod
+    def parse(cls, data) -> "ProfileInvalidation":
+        return cls(user_id=None if data == "*" else int(data))
+
+def latest_per_user(events: List) -> List:
+    """
+    Last event per user_id, in order of those last events: a burst of
+    updates for one driver is applied once.
+    """
+    latest = {}
+    for event in events:
+        latest.pop(event.user_id, None)
+        latest[event.user_id] = event
+    return list(latest.values())
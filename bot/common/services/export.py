@@ -0,0 +1,277 @@
+import csv
+import gzip
+import io
+import tempfile
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import select, or_, cast, Float
+
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User, Location, Order, LocationHistory
+from bot.common.data.locations import US_STATE_NAMES, STATE_FIPS, FIPS_STATES
+from bot.common.services.rating import sql_current_score
+
+DATASETS = ("drivers", "orders", "history")
+FORMATS = ("csv", "xlsx", "parquet")
+STATUSES = ("active", "pending", "banned", "all")
+# Rows fetched per round-trip from the server-side cursor
+CHUNK_ROWS = 2000
+# Kept in memory up to this size, then spilled to a temp file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+# History without a date range: last N days (the scan then touches only those partitions)
+HISTORY_DEFAULT_DAYS = 7
+
+@dataclass
+class ExportRequest:
+    dataset: str = "drivers"
+    fmt: str = "csv"
+    gzip: bool = False
+    status: str = "active" # drivers only
+    state: Optional[str] = None # state code
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None # inclusive
+    driver_id: Optional[int] = None # orders/history
+
+    def filename(self) -> str:
+        name = f"{self.dataset}_export_{datetime.now().strftime('%Y%m%d')}.{self.fmt}"
+        return name + ".gz" if self.gzip else name
+
+    def describe(self) -> str:
+        parts = []
+        if self.dataset == "drivers" and self.status != "all":
+            parts.append(self.status)
+        if self.state:
+            parts.append(US_STATE_NAMES[self.state])
+        if self.driver_id:
+            parts.append(f"driver {self.driver_id}")
+        if self.date_from or self.date_to:
+            parts.append(f"{self.date_from or '…'} → {self.date_to or '…'}")
+        return ", ".join(parts)
+
+def parse_export_args(args: List[str]) -> ExportRequest:
+    """
+    /export [drivers|orders|history] [csv|xlsx|parquet] [gz]
+            [status=active|pending|banned|all] [state=TX] [driver=ID]
+            [from=YYYY-MM-DD] [to=YYYY-MM-DD]
+    Raises ValueError on bad input.
+    """
+    req = ExportRequest()
+    for arg in args:
+        low = arg.lower()
+        key, sep, value = low.partition("=")
+        if not sep:
+            if low in DATASETS:
+                req.dataset = low
+            elif low in FORMATS:
+                req.fmt = low
+            elif low in ("gz", "gzip"):
+                req.gzip = True
+            else:
+                raise ValueError(f"Unknown option '{arg}'")
+        elif key == "status":
+            if value not in STATUSES:
+                raise ValueError(f"Status must be one of: {', '.join(STATUSES)}")
+            req.status = value
+        elif key == "state":
+            if value.upper() not in US_STATE_NAMES:
+                raise ValueError(f"Unknown state '{value}'")
+            req.state = value.upper()
+        elif key == "driver":
+            if not value.isdigit():
+                raise ValueError(f"Bad driver id '{value}'")
+            req.driver_id = int(value)
+        elif key in ("from", "to"):
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Bad date for '{key}': {value} (use YYYY-MM-DD)")
+            setattr(req, "date_from" if key == "from" else "date_to", day)
+        else:
+            raise ValueError(f"Unknown filter '{key}'")
+
+    if req.gzip and req.fmt != "csv":
+        raise ValueError("gz only applies to CSV (XLSX and Parquet are compressed already)")
+    if req.dataset == "drivers" and req.driver_id:
+        raise ValueError("driver= applies to orders and history")
+    if req.dataset == "orders" and req.state:
+        raise ValueError("state= applies to drivers and history")
+    if req.dataset != "drivers" and req.status != "active":
+        raise ValueError("status= applies to drivers")
+    if req.date_from and req.date_to and req.date_from > req.date_to:
+        raise ValueError("'from' is after 'to'")
+    if req.dataset == "history" and not req.date_from:
+        req.date_from = (req.date_to or datetime.now(timezone.utc).date()) - timedelta(days=HISTORY_DEFAULT_DAYS - 1)
+    return req
+
+def _start_of(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+def _date_range(column, req: ExportRequest):
+    conditions = []
+    if req.date_from:
+        conditions.append(column >= _start_of(req.date_from))
+    if req.date_to:
+        conditions.append(column < _start_of(req.date_to + timedelta(days=1)))
+    return conditions
+
+def build_query(req: ExportRequest):
+    """
+    Returns (statement, columns) where columns are (header, kind) pairs;
+    kind is one of int, float, str, bool, datetime, state (FIPS id -> code).
+    """
+    if req.dataset == "drivers":
+        columns = [
+            ("User ID", "int"), ("Name", "str"), ("Phone", "str"), ("Zelle", "str"), ("Status", "str"),
+            ("City", "str"), ("State", "str"), ("Rating", "float"), ("Joined At", "datetime"), ("Last Active", "datetime"),
+        ]
+        stmt = (
+            select(
+                User.user_id, User.full_name, User.phone, User.zelle, User.status,
+                Location.city, Location.state, sql_current_score(),
+                User.created_at, User.last_active_at
+            )
+            .outerjoin(Location, Location.user_id == User.user_id)
+            .order_by(User.user_id)
+        )
+        if req.status != "all":
+            stmt = stmt.where(User.status == req.status)
+        if req.state:
+            stmt = stmt.where(or_(Location.state == req.state, Location.state == US_STATE_NAMES[req.state]))
+        stmt = stmt.where(*_date_range(User.created_at, req))
+
+    elif req.dataset == "orders":
+        columns = [
+            ("Order ID", "int"), ("Driver ID", "int"), ("Driver", "str"), ("Admin ID", "int"),
+            ("From", "str"), ("To", "str"), ("Good", "bool"), ("Created At", "datetime"),
+        ]
+        stmt = (
+            select(
+                Order.id, Order.driver_id, User.full_name, Order.admin_id,
+                Order.route_from, Order.route_to, Order.is_good, Order.created_at
+            )
+            .outerjoin(User, User.user_id == Order.driver_id)
+            .order_by(Order.id)
+        )
+        if req.driver_id:
+            stmt = stmt.where(Order.driver_id == req.driver_id)
+        stmt = stmt.where(*_date_range(Order.created_at, req))
+
+    else:
+        columns = [("User ID", "int"), ("Recorded At", "datetime"), ("Lat", "float"), ("Lon", "float"), ("State", "state")]
+        stmt = select(
+            LocationHistory.user_id, LocationHistory.recorded_at,
+            cast(LocationHistory.lat_e6, Float) * 1e-6, cast(LocationHistory.lon_e6, Float) * 1e-6,
+            LocationHistory.state_id
+        ).order_by(LocationHistory.recorded_at)
+        if req.driver_id:
+            stmt = stmt.where(LocationHistory.user_id == req.driver_id)
+        if req.state:
+            stmt = stmt.where(LocationHistory.state_id == STATE_FIPS[req.state])
+        stmt = stmt.where(*_date_range(LocationHistory.recorded_at, req))
+
+    return stmt, columns
+
+class _CsvSink:
+    def __init__(self, spool, columns, compress: bool):
+        self._gz = gzip.GzipFile(fileobj=spool, mode="wb") if compress else None
+        self._text = io.TextIOWrapper(self._gz or spool, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text)
+        self._writer.writerow([header for header, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(
+            [v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, datetime) else v for v in row] for row in rows
+        )
+
+    def close(self):
+        self._text.flush()
+        self._text.detach() # Leave the spool open
+        if self._gz:
+            self._gz.close()
+
+class _XlsxSink:
+    def __init__(self, spool, columns):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ValueError("XLSX export needs openpyxl (pip install openpyxl)")
+        self._spool = spool
+        # write_only: rows are streamed to a temp file instead of kept as cell objects
+        self._book = Workbook(write_only=True)
+        self._sheet = self._book.create_sheet("export")
+        self._sheet.append([header for header, _ in columns])
+
+    def write(self, rows):
+        for row in rows:
+            # Excel has no time zones
+            self._sheet.append([v.replace(tzinfo=None) if isinstance(v, datetime) else v for v in row])
+
+    def close(self):
+        self._book.save(self._spool)
+
+class _ParquetSink:
+    def __init__(self, spool, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {
+            "int": pa.int64(), "float": pa.float64(), "str": pa.string(), "state": pa.string(),
+            "bool": pa.bool_(), "datetime": pa.timestamp("us", tz="UTC"),
+        }
+        self._pa = pa
+        self._schema = pa.schema([(header, types[kind]) for header, kind in columns])
+        # One row group per fetched chunk
+        self._writer = pq.ParquetWriter(spool, self._schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in self._schema]
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(values, type=f.type) for values, f in zip(columns, self._schema)],
+            schema=self._schema
+        ))
+
+    def close(self):
+        self._writer.close()
+
+def _sink(req: ExportRequest, spool, columns):
+    if req.fmt == "xlsx":
+        return _XlsxSink(spool, columns)
+    if req.fmt == "parquet":
+        return _ParquetSink(spool, columns)
+    return _CsvSink(spool, columns, req.gzip)
+
+async def export_to_file(req: ExportRequest):
+    """
+    Streams the export through a server-side cursor into a spooled temp file,
+    CHUNK_ROWS at a time, so memory stays flat regardless of table size.
+    Returns (file positioned at 0, row count, size in bytes); the caller closes the file.
+    Raises ValueError if the format's optional dependency is missing.
+    """
+    stmt, columns = build_query(req)
+    state_columns = [i for i, (_, kind) in enumerate(columns) if kind == "state"]
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+    try:
+        sink = _sink(req, spool, columns)
+        rows_written = 0
+        async with async_session_factory() as session:
+            result = await session.stream(stmt.execution_options(yield_per=CHUNK_ROWS))
+            async for chunk in result.partitions():
+                rows = [list(row) for row in chunk]
+                for row in rows:
+                    for i in state_columns:
+                        row[i] = FIPS_STATES.get(row[i], "")
+                sink.write(rows)
+                rows_written += len(rows)
+        sink.close()
+    except BaseException:
+        spool.close()
+        raise
+
+    size = spool.seek(0, io.SEEK_END)
+    spool.seek(0)
+    return spool, rows_written, size
@@ -0,0 +1,40 @@
+from collections import deque
+from typing import List, Optional, Tuple
+
+LOCATION = "location"
+PROFILE = "profile" # status, name or rating
+
+class FleetVersion:
+    """
+    Monotonic counter of driver changes, bumped from the driver_location /
+    driver_profile notifications. Keeps a bounded log of what changed so a
+    cached view can tell which of its rows are affected.
+    """
+    def __init__(self, log_size: int = 2000):
+        self.value = 0
+        self._log = deque(maxlen=log_size) # (version, user_id, kind)
+
+    def bump(self, user_id: int, kind: str):
+        self.value += 1
+        self._log.append((self.value, user_id, kind))
+
+    def reset(self):
+        """
+        Everything may have changed (e.g. notifications missed while disconnected):
+        views older than this can no longer be patched.
+        """
+        self.value += 1
+        self._log.clear()
+
+    def changes_since(self, version: int) -> Optional[List[Tuple[int, str]]]:
+        """
+        (user_id, kind) of changes after `version`; None if the log no longer
+        reaches back that far and the caller must assume everything changed.
+        """
+        if version == self.value:
+            return []
+        if not self._log or self._log[0][0] > version + 1:
+            return None
+        return [(user_id, kind) for v, user_id, kind in self._log if v > version]
+
+fleet_version = FleetVersion()
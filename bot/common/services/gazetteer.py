@@ -0,0 +1,267 @@
+import bisect
+import csv
+import math
+import re
+from array import array
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Optional, Tuple, List
+
+DATA_PATH = Path(__file__).parent.parent / "data" / "us_places.tsv"
+EARTH_RADIUS_KM = 6371.0088
+
+def to_xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    """
+    Unit-sphere vector for (lat, lon) in degrees.
+    """
+    phi = math.radians(lat)
+    lam = math.radians(lon)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+def chord_to_km(chord: float) -> float:
+    return 2 * math.asin(min(1.0, chord / 2)) * EARTH_RADIUS_KM
+
+def normalize_name(text: str) -> str:
+    """
+    Search key: lowercase, "St." -> "saint", punctuation dropped, single spaces.
+    """
+    text = text.lower().replace("-", " ")
+    text = re.sub(r"\bst\.?(?=\s)", "saint", text)
+    text = re.sub(r"\bft\.?(?=\s)", "fort", text)
+    text = re.sub(r"[^\w\s]", "", text)
+    return " ".join(text.split())
+
+def _trigrams(key: str):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class KDTree:
+    """
+    Static 3-D KD-tree over unit-sphere vectors.
+    Chord length is monotonic in great-circle distance, so the nearest point
+    in 3-D is also the nearest point on the globe (no dateline/pole special cases).
+    The tree is implicit: a permutation of row ids where each range's median is its node.
+    """
+    def __init__(self, lats, lons):
+        n = len(lats)
+        self._xyz = array('d')
+        for lat, lon in zip(lats, lons):
+            self._xyz.extend(to_xyz(lat, lon))
+
+        order = list(range(n))
+        self._build(order, 0, n, 0)
+        self._order = array('l', order)
+
+    def _build(self, order, lo, hi, depth):
+        if hi - lo <= 1:
+            return
+        axis = depth % 3
+        xyz = self._xyz
+        order[lo:hi] = sorted(order[lo:hi], key=lambda i: xyz[3 * i + axis])
+        mid = (lo + hi) // 2
+        self._build(order, lo, mid, depth + 1)
+        self._build(order, mid + 1, hi, depth + 1)
+
+    def __len__(self):
+        return len(self._order)
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """
+        Returns (row id, distance in km) of the closest point, or (-1, inf) if empty.
+        """
+        q = to_xyz(lat, lon)
+        best = [float('inf'), -1] # squared chord, row id
+        self._search(q, best, 0, len(self._order), 0)
+        if best[1] < 0:
+            return -1, float('inf')
+        return best[1], chord_to_km(math.sqrt(best[0]))
+
+    def _search(self, q, best, lo, hi, depth):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        i = self._order[mid]
+        base = 3 * i
+        xyz = self._xyz
+
+        dx = q[0] - xyz[base]
+        dy = q[1] - xyz[base + 1]
+        dz = q[2] - xyz[base + 2]
+        d2 = dx * dx + dy * dy + dz * dz
+        if d2 < best[0]:
+            best[0] = d2
+            best[1] = i
+
+        diff = q[depth % 3] - xyz[base + depth % 3]
+        if diff < 0:
+            near, far = (lo, mid), (mid + 1, hi)
+        else:
+            near, far = (mid + 1, hi), (lo, mid)
+
+        self._search(q, best, near[0], near[1], depth + 1)
+        # Only cross the splitting plane if it is closer than the best match
+        if diff * diff < best[0]:
+            self._search(q, best, far[0], far[1], depth + 1)
+
+class Gazetteer:
+    """
+    Compact, array-backed table of US places.
+    Row i is (states[i], names[i], lats[i], lons[i], populations[i]); the row
+    number is also the place id used in callback data.
+    Name search uses a sorted key array (bisect for prefixes) that indexes
+    every word start, so "worth" finds Fort Worth; a trigram index for typo
+    tolerance is built on first use.
+    """
+    def __init__(self, rows):
+        self.states = []
+        self.names = []
+        self.lats = array('d')
+        self.lons = array('d')
+        self.populations = array('l')
+        for state, name, lat, lon, population in rows:
+            self.states.append(state)
+            self.names.append(name)
+            self.lats.append(float(lat))
+            self.lons.append(float(lon))
+            self.populations.append(int(population))
+        self.tree = KDTree(self.lats, self.lons)
+
+        # Rows of each state, most populous first
+        self._by_state = {}
+        for i in sorted(range(len(self.names)), key=lambda i: -self.populations[i]):
+            self._by_state.setdefault(self.states[i], array('l')).append(i)
+
+        self._normalized = [normalize_name(name) for name in self.names]
+        keys = []
+        for i, normalized in enumerate(self._normalized):
+            words = normalized.split()
+            for w in range(len(words)):
+                keys.append((" ".join(words[w:]), w, i))
+        keys.sort()
+        self._keys = [k[0] for k in keys]
+        self._key_rows = array('l', (k[2] for k in keys))
+        self._key_word = array('b', (min(k[1], 127) for k in keys)) # 0 = match at the name start
+        self._trigram_index = None
+    @classmethod
+    def load(cls, path: Path = DATA_PATH) -> "Gazetteer":
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter="\t")
+            next(reader) # Header
+            return cls(reader)
+
+    def __len__(self):
+        return len(self.names)
+
+    def nearest(self, lat: float, lon: float, max_km: float = float('inf')) -> Optional[Tuple[str, str, float]]:
+        """
+        Offline reverse geocoding. Returns (State Code, City, Distance km) or None
+        if no bundled place lies within max_km.
+        """
+        i, dist_km = self.tree.nearest(lat, lon)
+        if i < 0 or dist_km > max_km:
+            return None
+        return self.states[i], self.names[i], dist_km
+
+    def label(self, i: int) -> str:
+        return f"{self.names[i]}, {self.states[i]}"
+
+    def state_codes(self) -> List[str]:
+        return sorted(self._by_state)
+
+    def state_places(self, state_code: str) -> array:
+        """
+        Row ids of a state's places, most populous first.
+        """
+        return self._by_state.get(state_code, array('l'))
+
+    def lookup(self, name: str, state_code: Optional[str] = None) -> Optional[int]:
+        """
+        Exact (normalized) name match; the most populous one if several.
+        """
+        key = normalize_name(name)
+        lo = bisect.bisect_left(self._keys, key)
+        best = None
+        for j in range(lo, len(self._keys)):
+            if self._keys[j] != key:
+                break
+            i = self._key_rows[j]
+            if self._key_word[j] != 0 or (state_code and self.states[i] != state_code):
+                continue
+            if best is None or self.populations[i] > self.populations[best]:
+                best = i
+        return best
+
+    def _split_state(self, query: str) -> Tuple[str, Optional[str]]:
+        # "Naperville, IL" / "naperville il" -> ("naperville", "IL")
+        head, sep, tail = query.rpartition(",")
+        if sep and tail.strip().upper() in self._by_state:
+            return head, tail.strip().upper()
+        words = query.split()
+        if len(words) > 1 and len(words[-1]) == 2 and words[-1].upper() in self._by_state:
+            return " ".join(words[:-1]), words[-1].upper()
+        return query, None
+
+    def search(self, query: str, limit: int = 10) -> List[int]:
+        """
+        Autocomplete: prefix matches (name starts first, then word starts, each by
+        population); fuzzy matches only when nothing matches the prefix. Returns row ids.
+        """
+        text, state_code = self._split_state(query)
+        key = normalize_name(text)
+        if not key:
+            return list(self.state_places(state_code)[:limit]) if state_code else []
+
+        lo = bisect.bisect_left(self._keys, key)
+        hi = bisect.bisect_left(self._keys, key + "\uffff")
+        hits = {}
+        for j in range(lo, hi):
+            i = self._key_rows[j]
+            if state_code and self.states[i] != state_code:
+                continue
+            rank = (self._key_word[j] != 0, -self.populations[i])
+            if i not in hits or rank < hits[i]:
+                hits[i] = rank
+        if hits:
+            return sorted(hits, key=hits.get)[:limit]
+        if len(key) >= 3:
+            return self.fuzzy(key, state_code, limit)
+        return []
+
+    def fuzzy(self, query: str, state_code: Optional[str] = None, limit: int = 10, cutoff: float = 0.7) -> List[int]:
+        """
+        Typo-tolerant name match: trigram candidates, re-scored with difflib.
+        """
+        if self._trigram_index is None:
+            index = {}
+            for i, normalized in enumerate(self._normalized):
+                for gram in _trigrams(normalized):
+                    index.setdefault(gram, array('l')).append(i)
+            self._trigram_index = index
+
+        key = normalize_name(query)
+        counts = {}
+        for gram in _trigrams(key):
+            for i in self._trigram_index.get(gram, ()):
+                counts[i] = counts.get(i, 0) + 1
+        if state_code:
+            counts = {i: c for i, c in counts.items() if self.states[i] == state_code}
+
+        candidates = sorted(counts, key=counts.get, reverse=True)[:limit * 3]
+        matcher = SequenceMatcher(None, "", key) # seq2 (the query) is analysed once
+        scored = []
+        for i in candidates:
+            name = self._normalized[i]
+            # Compare against the same-length prefix too, so partial input still matches
+            best = 0.0
+            for candidate in (name, name[:len(key)]):
+                matcher.set_seq1(candidate)
+                if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                    best = max(best, matcher.ratio())
+            if best >= cutoff:
+                scored.append((-best, -self.populations[i], i))
+        scored.sort()
+        return [i for _, _, i in scored[:limit]]
+
+# Loaded once per process (a few ms)
+places = Gazetteer.load()
@@ -1,60 +1,181 @@
-from geopy.geocoders import Nominatim
-from geopy.location import Location
+import math
+import re
 from typing import Optional, Tuple
 
+import numpy as np
+
+from bot.common.config import settings
+from bot.common.data.locations import US_STATE_NAMES
+from bot.common.database.redis import redis
+from bot.common.services.cache import TieredCache, MISSING
+from bot.common.services.gazetteer import places
+from bot.common.services.nominatim import NominatimClient, GeocoderBusy
+from bot.common.services.ratelimit import TokenBucket
+
 # Use a specific user_agent to comply with OSM policy
-geolocator = Nominatim(user_agent="TeamHubBot/1.0")
+# The bucket key is shared by both bots, so the whole deployment stays under the limit
+geocoder = NominatimClient(
+    settings.NOMINATIM_URL,
+    user_agent="TeamHubBot/1.0",
+    limiter=TokenBucket(redis, "ratelimit:nominatim", rate=settings.NOMINATIM_RATE),
+    queue_size=settings.GEOCODE_QUEUE_SIZE,
+    workers=settings.GEOCODE_WORKERS
+)
+
+forward_cache = TieredCache(
+    "geo:fwd", redis,
+    maxsize=settings.GEOCODE_CACHE_SIZE,
+    ttl=settings.GEOCODE_CACHE_TTL,
+    negative_ttl=settings.GEOCODE_NEGATIVE_TTL
+)
+reverse_cache = TieredCache(
+    "geo:rev", redis,
+    maxsize=settings.GEOCODE_CACHE_SIZE,
+    ttl=settings.GEOCODE_CACHE_TTL,
+    negative_ttl=settings.GEOCODE_NEGATIVE_TTL
+)
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for forward lookups: "  new york ,NY" -> "new york, ny"
+    """
+    query = re.sub(r"\s*,\s*", ", ", query.strip().lower())
+    return re.sub(r"\s+", " ", query).strip(", ")
 
-def get_location_by_query(query: str) -> Optional[Tuple[str, str, float, float]]:
+def coords_key(lat: float, lon: float) -> str:
+    """
+    Cache key for reverse lookups: coordinates snapped to a grid cell.
+    """
+    p = settings.GEOCODE_REVERSE_PRECISION
+    return f"{lat:.{p}f}:{lon:.{p}f}"
+
+def _pick_city(address: dict) -> Optional[str]:
+    return address.get('city') or address.get('town') or address.get('village') or address.get('county')
+
+async def _geocode(query: str) -> Optional[Tuple[str, str, float, float]]:
+    # Raises on network errors/timeouts so failures are never negative-cached
+    # Limit to USA for better accuracy
+    results = await geocoder.request(
+        "search", {"q": query, "countrycodes": "us", "limit": 1},
+        deadline=settings.GEOCODE_TIMEOUT
+    )
+    if not results:
+        return None
+
+    loc = results[0]
+    address = loc.get('address', {})
+    state = address.get('state')
+    if not state:
+        return None
+
+    return state, _pick_city(address), float(loc['lat']), float(loc['lon'])
+
+async def _reverse(lat: float, lon: float) -> Optional[Tuple[str, str]]:
+    loc = await geocoder.request(
+        "reverse", {"lat": lat, "lon": lon},
+        deadline=settings.GEOCODE_TIMEOUT
+    )
+    if not loc or "error" in loc:
+        return None
+
+    address = loc.get('address', {})
+    return address.get('state', 'GPS'), _pick_city(address) or 'Location'
+
+async def get_location_by_query(query: str) -> Optional[Tuple[str, str, float, float]]:
     """
     Returns (State, City, Lat, Lon) or None
     """
+    key = normalize_query(query)
+    cached = await forward_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
     try:
-        # Limit to USA for better accuracy
-        loc: Location = geolocator.geocode(query, addressdetails=True, country_codes="us", timeout=10)
-        if not loc:
-            return None
-        
-        address = loc.raw.get('address', {})
-        state = address.get('state')
-        city = address.get('city') or address.get('town') or address.get('village') or address.get('county')
-        
-        if not state:
-            return None
-            
-        return state, city, loc.latitude, loc.longitude
+        result = await _geocode(query)
+    except GeocoderBusy as e:
+        print(f"Geocoding skipped: {e}")
+        return None
     except Exception as e:
         print(f"Geocoding error: {e}")
         return None
 
-def get_location_by_coords(lat: float, lon: float) -> Optional[Tuple[str, str, float, float]]:
+    await forward_cache.set(key, result)
+    return result
+
+async def get_location_by_coords(lat: float, lon: float) -> Optional[Tuple[str, str, float, float]]:
     """
     Reverse geocoding. Returns (State, City, Lat, Lon)
+    Answered offline from the bundled gazetteer (nearest place). Nominatim is only
+    used for points outside its coverage, and only if GEOCODE_REVERSE_ONLINE is set.
     """
-    try:
-        # Reverse geocode
-        loc: Location = geolocator.reverse((lat, lon), exactly_one=True, addressdetails=True, timeout=10)
-        if not loc:
+    place = places.nearest(lat, lon, max_km=settings.GEOCODE_OFFLINE_MAX_KM)
+    if place:
+        state_code, city, _ = place
+        return US_STATE_NAMES.get(state_code, state_code), city, lat, lon
+
+    if not settings.GEOCODE_REVERSE_ONLINE:
+        return "GPS", "Location", lat, lon
+
+    key = coords_key(lat, lon)
+    cached = await reverse_cache.get(key)
+    if cached is MISSING:
+        try:
+            cached = await _reverse(lat, lon)
+        except Exception as e:
+            print(f"Reverse Geocoding error: {e}")
             return "GPS", "Location", lat, lon
-            
-        address = loc.raw.get('address', {})
-        state = address.get('state', 'GPS')
-        city = address.get('city') or address.get('town') or address.get('village') or address.get('county') or 'Location'
-        
-        return state, city, lat, lon
-    except Exception as e:
-        print(f"Reverse Geocoding error: {e}")
+        await reverse_cache.set(key, cached)
+
+    if cached is None:
         return "GPS", "Location", lat, lon
 
+    state, city = cached
+    return state, city, lat, lon
+
+def geocode_cache_stats() -> dict:
+    return {"forward": forward_cache.stats(), "reverse": reverse_cache.stats()}
+
+EARTH_RADIUS_MI = 3958.7613
+
 def calculate_distance(lat1, lon1, lat2, lon2) -> float:
     """
-    Calculate distance in miles between two coordinates.
+    Calculate distance in miles between two coordinates (haversine).
     """
-    from geopy.distance import geodesic
     try:
-        # geodesic expects (lat, lon) tuples
-        # returns distance object, we want miles
-        return geodesic((lat1, lon1), (lat2, lon2)).miles
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        dphi = phi2 - phi1
+        dlam = math.radians(lon2 - lon1)
+        a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+        return 2 * EARTH_RADIUS_MI * math.asin(math.sqrt(a))
     except Exception as e:
         print(f"Distance calc error: {e}")
         return float('inf')
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Distances in miles from one point to arrays of points, in one vectorized pass.
+    NaN coordinates give NaN distances.
+    """
+    phi = np.radians(lat)
+    phis = np.radians(lats)
+    dphi = phis - phi
+    dlam = np.radians(lons) - np.radians(lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi) * np.cos(phis) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def rank_nearest(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-K nearest points. Returns (indices, distances in miles), nearest first.
+    Points without coordinates (NaN) rank last with distance inf.
+    Uses argpartition, so only the K winners are sorted: O(n + k log k).
+    """
+    dist = haversine_miles(lat, lon, lats, lons)
+    dist = np.where(np.isnan(dist), np.inf, dist)
+
+    k = min(k, len(dist))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+
+    idx = np.argpartition(dist, k - 1)[:k]
+    idx = idx[np.argsort(dist[idx], kind="stable")]
+    return idx, dist[idx]
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import time
+import uuid
+
+from bot.common.config import settings
+from bot.common.database.redis import redis
+
+# Extend (or, with 0 ms, drop) the lease only if we still own it
+EXTEND_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    if tonumber(ARGV[2]) > 0 then
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+JOB_STATS_KEY = "jobs:stats"
+
+class Lease:
+    """
+    Redis lease: SET NX PX with a random owner token, so only the holder
+    can extend or release it and a crashed holder's lease simply expires.
+    """
+    def __init__(self, redis, key: str, ttl_ms: int):
+        self.redis = redis
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self._extend = redis.register_script(EXTEND_LUA)
+
+    async def acquire(self) -> bool:
+        return bool(await self.redis.set(self.key, self.token, nx=True, px=self.ttl_ms))
+
+    async def extend(self) -> bool:
+        return bool(await self._extend(keys=[self.key], args=[self.token, self.ttl_ms]))
+
+    async def release(self, keep_ms: int = 0):
+        """
+        keep_ms > 0 keeps the key that much longer (still ours), so nobody
+        else can take it meanwhile.
+        """
+        await self._extend(keys=[self.key], args=[self.token, keep_ms])
+
+async def _heartbeat(lease: Lease, name: str, job: asyncio.Task, lost: list):
+    while True:
+        await asyncio.sleep(lease.ttl_ms / 3000)
+        try:
+            if await lease.extend():
+                continue
+            print(f"Job {name}: lease lost, stopping this run")
+        except Exception as e:
+            print(f"Job {name}: lease renewal failed, stopping this run: {e}")
+        # Another replica may take over: don't keep running side by side
+        lost.append(True)
+        job.cancel()
+        return
+
+async def _record(name: str, **counters):
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for field, value in counters.items():
+                if field in ("last_ms", "last_at"):
+                    pipe.hset(JOB_STATS_KEY, f"{name}:{field}", value)
+                else:
+                    pipe.hincrby(JOB_STATS_KEY, f"{name}:{field}", value)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Job {name}: failed to record stats: {e}")
+
+def singleton_job(name: str, func, period: float):
+    """
+    Wraps a scheduler job so that, with several replicas running the same
+    schedule, each tick runs on one of them only. A run holds the lease
+    lease:job:<name> (renewed every TTL/3 while it runs) and keeps it until
+    the end of its period slot, so replicas whose timers are offset don't
+    repeat the tick. Records runs, skipped ticks, failures and durations in jobs:stats.
+    """
+    ttl_ms = int(settings.JOB_LEASE_TTL_SECONDS * 1000)
+
+    @functools.wraps(func)
+    async def run(*args, **kwargs):
+        started = time.time()
+        lease = Lease(redis, f"lease:job:{name}", ttl_ms)
+        try:
+            acquired = await lease.acquire()
+        except Exception as e:
+            print(f"Job {name}: lease unavailable, skipping tick: {e}")
+            return
+        if not acquired:
+            await _record(name, skipped=1)
+            return
+
+        lost = []
+        heartbeat = asyncio.create_task(_heartbeat(lease, name, asyncio.current_task(), lost))
+        failed = False
+        try:
+            return await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            if not lost:
+                raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            heartbeat.cancel()
+            elapsed_ms = round((time.time() - started) * 1000)
+            slot_end = (started // period + 1) * period
+            if not lost:
+                try:
+                    await lease.release(keep_ms=max(0, int((slot_end - time.time()) * 1000)))
+                except Exception as e:
+                    print(f"Job {name}: lease release failed (expires by itself): {e}")
+            await _record(
+                name, runs=1, failed=int(failed), lost=len(lost), total_ms=elapsed_ms,
+                last_ms=elapsed_ms, last_at=int(started)
+            )
+
+    return run
+
+async def read_job_stats() -> dict:
+    """
+    {job name: {runs, skipped, failed, lost, total_ms, last_ms, last_at}}
+    """
+    raw = await redis.hgetall(JOB_STATS_KEY)
+    stats = {}
+    for field, value in raw.items():
+        name, _, counter = field.decode().rpartition(":")
+        stats.setdefault(name, {})[counter] = int(value)
+    return stats
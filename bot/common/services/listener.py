@@ -1,28 +1,228 @@
 import asyncio
+import json
+import random
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
 import asyncpg
-from aiogram import Bot
+
+@dataclass
+class _Subscription:
+    handler: Callable
+    parse: Optional[Callable]
+    batch: bool
+
+# Running listeners by name, for stats()
+_listeners = {}
 
 class DBListener:
-    def __init__(self, db_url: str, channels: list[str], callback):
+    """
+    Postgres LISTEN/NOTIFY event bus.
+
+    Payloads are decoded (JSON, else the raw text) and queued; a fixed pool of
+    workers parses them into each subscription's event type and calls the
+    handlers registered with on(). Events with the same key (user_id, when the
+    payload has one) always go to the same worker, so they are handled in order.
+    A worker takes everything queued for it (up to max_batch) at once: batch
+    handlers get a burst as one list.
+
+    Queues are bounded. Overflowing events are dropped and on_connect is run
+    again once the backlog clears, the same resync as after a reconnect.
+    The connection is health-checked every health_interval and re-established
+    with exponential back-off.
+    """
+    def __init__(
+        self, db_url: str, name: str = "db", on_connect=None,
+        workers: int = 4, queue_size: int = 10000, max_batch: int = 500,
+        health_interval: float = 30.0, max_backoff: float = 60.0
+    ):
         self.db_url = db_url.replace("postgresql+asyncpg://", "postgresql://")
-        self.channels = channels
-        self.callback = callback
+        self.name = name
+        # Awaited after every (re)connect, once LISTEN is active: notifications
+        # missed while disconnected can be recovered by reloading state here.
+        self.on_connect = on_connect
+        self.max_batch = max_batch
+        self.health_interval = health_interval
+        self.max_backoff = max_backoff
         self.conn = None
+        self._subs = defaultdict(list)
+        self._queues = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._tasks = []
+        self._lost: Optional[asyncio.Event] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.connected = False
+        self.received = 0
+        self.handled = 0
+        self.failed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.reconnects = 0
+        self.lag_avg_ms = 0.0 # moving average, queue in -> handled
+        self.lag_max_ms = 0.0
+
+    def on(self, channel: str, handler, parse: Callable = None, batch: bool = False):
+        """
+        handler(event), or handler([events]) with batch=True.
+        parse turns the decoded payload into the event (e.g. DriverLocation.parse).
+        """
+        self._subs[channel].append(_Subscription(handler, parse, batch))
+
+    @property
+    def channels(self) -> list:
+        return list(self._subs)
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "handled": self.handled,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "reconnects": self.reconnects,
+            "queued": sum(q.qsize() for q in self._queues),
+            "lag_avg_ms": round(self.lag_avg_ms, 1),
+            "lag_max_ms": round(self.lag_max_ms, 1),
+        }
 
     async def start(self):
+        _listeners[self.name] = self
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        backoff = 1.0
+        while not self._closing:
+            try:
+                await self._connect()
+                backoff = 1.0
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Listener error: {e}")
+            finally:
+                await self._disconnect()
+            if self._closing:
+                break
+            self.reconnects += 1
+            delay = backoff * random.uniform(0.5, 1.0)
+            print(f"Listener reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def close(self):
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self._disconnect()
+        _listeners.pop(self.name, None)
+
+    async def _connect(self):
+        self._lost = asyncio.Event()
+        self.conn = await asyncpg.connect(self.db_url)
+        self.conn.add_termination_listener(lambda conn: self._lost.set())
+        for channel in self._subs:
+            await self.conn.add_listener(channel, self._handle_notification)
+        self.connected = True
+        print(f"Listening on channels: {self.channels}")
+        if self.on_connect:
+            await self.on_connect()
+
+    async def _watch(self):
+        # Returns (raises) when the connection is gone or stops answering
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), timeout=self.health_interval)
+                raise ConnectionError("connection closed")
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.wait_for(self.conn.fetchval("SELECT 1"), timeout=10)
+
+    async def _disconnect(self):
+        self.connected = False
+        conn, self.conn = self.conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await asyncio.wait_for(conn.close(), timeout=5)
+            except Exception:
+                conn.terminate()
+
+    def _handle_notification(self, connection, pid, channel, payload):
+        self.received += 1
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            data = payload
+        key = data.get("user_id") if isinstance(data, dict) else data
+        queue = self._queues[zlib.crc32(f"{channel}:{key}".encode()) % len(self._queues)]
         try:
-            self.conn = await asyncpg.connect(self.db_url)
-            for channel in self.channels:
-                await self.conn.add_listener(channel, self._handle_notification)
-            
-            print(f"Listening on channels: {self.channels}")
-            while True:
-                await asyncio.sleep(1) # Keep alive
+            queue.put_nowait((channel, data, time.monotonic()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._schedule_resync()
+
+    def _schedule_resync(self):
+        if self.on_connect and (self._resync_task is None or self._resync_task.done()):
+            self._resync_task = asyncio.create_task(self._resync())
+
+    async def _resync(self):
+        # Dropped events left state stale: reload it once the backlog is handled
+        while any(q.qsize() for q in self._queues):
+            await asyncio.sleep(0.1)
+        print(f"Listener {self.name}: {self.dropped} events dropped so far, resyncing")
+        try:
+            await self.on_connect()
         except Exception as e:
-            print(f"Listener error: {e}")
-            await asyncio.sleep(5)
-            await self.start() # Reconnect
+            print(f"Listener {self.name}: resync failed: {e}")
 
-    def _handle_notification(self, connection, pid, channel, payload):
-        # Fire and forget callback
-        asyncio.create_task(self.callback(channel, payload))
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            items = [await queue.get()]
+            while len(items) < self.max_batch and not queue.empty():
+                items.append(queue.get_nowait())
+
+            now = time.monotonic()
+            for _, _, queued_at in items:
+                lag_ms = (now - queued_at) * 1000
+                self.lag_avg_ms += (lag_ms - self.lag_avg_ms) * 0.05
+                self.lag_max_ms = max(self.lag_max_ms, lag_ms)
+
+            by_channel = defaultdict(list)
+            for channel, data, _ in items:
+                by_channel[channel].append(data)
+            for channel, payloads in by_channel.items():
+                await self._dispatch(channel, payloads)
+            self.handled += len(items)
+            self.batches += 1
+
+    async def _dispatch(self, channel: str, payloads: list):
+        for sub in self._subs.get(channel, ()):
+            events = []
+            for payload in payloads:
+                try:
+                    events.append(sub.parse(payload) if sub.parse else payload)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Bad {channel} payload {payload!r}: {e}")
+            if sub.batch:
+                if events:
+                    await self._call(channel, sub.handler, events)
+            else:
+                for event in events:
+                    await self._call(channel, sub.handler, event)
+
+    async def _call(self, channel: str, handler, arg):
+        try:
+            await handler(arg)
+        except Exception as e:
+            self.failed += 1
+            print(f"Listener handler for {channel} failed: {e}")
+
+def listener_stats() -> dict:
+    return {name: listener.stats() for name, listener in _listeners.items()}
@@ -0,0 +1,87 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+@dataclass
+class LivePosition:
+    lat: float
+    lon: float
+    at: float # monotonic time it was accepted
+    cell: Tuple[int, int]
+    state: str
+    city: str
+
+class LiveLocationThrottle:
+    """
+    Per-driver filter for Telegram live location updates.
+    An update is accepted only if the driver moved at least min_distance_m
+    and min_interval seconds passed since the last accepted one; a stationary
+    driver is still accepted every heartbeat seconds so last_active_at stays fresh.
+    The state/city of the last accepted position is reused until the driver
+    leaves its grid cell, so reverse geocoding runs once per cell crossing.
+    """
+    def __init__(self, min_distance_m: float = 150.0, min_interval: float = 30.0,
+                 heartbeat: float = 600.0, cell_deg: float = 0.05, maxsize: int = 10000):
+        self.min_distance_m = min_distance_m
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.cell_deg = cell_deg
+        self.maxsize = maxsize
+        self._last = {} # user_id -> LivePosition
+        self.accepted = 0
+        self.dropped = 0
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def check(self, user_id: int, lat: float, lon: float, now: float = None) -> Tuple[bool, Optional[Tuple[str, str]]]:
+        """
+        Returns (accept, place): place is the cached (state, city) when the
+        driver is still in the same cell, None when it has to be geocoded.
+        """
+        now = time.monotonic() if now is None else now
+        last = self._last.get(user_id)
+        if last is None:
+            return True, None
+
+        elapsed = now - last.at
+        if elapsed < self.min_interval:
+            self.dropped += 1
+            return False, None
+        if elapsed < self.heartbeat and distance_m(last.lat, last.lon, lat, lon) < self.min_distance_m:
+            self.dropped += 1
+            return False, None
+
+        if self.cell(lat, lon) == last.cell:
+            return True, (last.state, last.city)
+        return True, None
+
+    def remember(self, user_id: int, lat: float, lon: float, state: str, city: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        if user_id not in self._last and len(self._last) >= self.maxsize:
+            self._prune(now)
+        self._last[user_id] = LivePosition(lat, lon, now, self.cell(lat, lon), state, city)
+        self.accepted += 1
+
+    def forget(self, user_id: int):
+        self._last.pop(user_id, None)
+
+    def _prune(self, now: float):
+        # Drivers silent for longer than a heartbeat are no longer streaming
+        stale = [uid for uid, pos in self._last.items() if now - pos.at > self.heartbeat]
+        for uid in stale:
+            del self._last[uid]
+        if len(self._last) >= self.maxsize:
+            oldest = min(self._last, key=lambda uid: self._last[uid].at)
+            del self._last[oldest]
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._last), "accepted": self.accepted, "dropped": self.dropped}
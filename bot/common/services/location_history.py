@@ -0,0 +1,117 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, NamedTuple
+
+from sqlalchemy import text
+
+from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+
+PARTITION_PREFIX = "location_history_"
+DEFAULT_PARTITION = "location_history_default"
+HISTORY_COLUMNS = "user_id, recorded_at, lat_e6, lon_e6, state_id"
+
+class TrackPoint(NamedTuple):
+    recorded_at: datetime
+    lat: float
+    lon: float
+    state_id: int
+
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+def _day_start(day: date) -> str:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc).isoformat()
+
+def create_partition_sql(day: date, from_default: bool = False) -> List[str]:
+    """
+    Statements (one transaction) creating the partition for `day`.
+    With from_default, that day's rows already sitting in the default partition
+    are moved into a standalone table which is then attached; a plain
+    PARTITION OF would fail while the default holds rows in its range.
+    Identifiers and bounds come from dates, not user input.
+    """
+    name = partition_name(day)
+    lo, hi = _day_start(day), _day_start(day + timedelta(days=1))
+    if not from_default:
+        return [f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF location_history FOR VALUES FROM ('{lo}') TO ('{hi}')"]
+    return [
+        f"CREATE TABLE {name} (LIKE location_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at >= '{lo}' AND recorded_at < '{hi}' "
+        f"RETURNING {HISTORY_COLUMNS}) INSERT INTO {name} ({HISTORY_COLUMNS}) SELECT {HISTORY_COLUMNS} FROM moved",
+        f"ALTER TABLE location_history ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')",
+    ]
+
+async def maintain_partitions() -> dict:
+    """
+    Creates daily partitions up to LOCATION_HISTORY_PREMAKE_DAYS ahead and drops
+    the ones older than LOCATION_HISTORY_DAYS. Dropping a partition is instant
+    and leaves no dead tuples, unlike DELETE. Rows that landed in the default
+    partition are moved into their day's partition when it is created, and
+    expired ones are deleted from it. Safe to run repeatedly.
+    """
+    today = datetime.now(timezone.utc).date()
+    keep_from = today - timedelta(days=settings.LOCATION_HISTORY_DAYS)
+    created, dropped = [], []
+    purged = 0
+
+    async with async_session_factory() as session:
+        result = await session.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'location_history'::regclass
+        """))
+        existing = set(result.scalars().all())
+
+        for offset in range(settings.LOCATION_HISTORY_PREMAKE_DAYS + 1):
+            day = today + timedelta(days=offset)
+            name = partition_name(day)
+            if name in existing:
+                continue
+            try:
+                in_default = (await session.execute(text(
+                    f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+                    f"WHERE recorded_at >= '{_day_start(day)}' AND recorded_at < '{_day_start(day + timedelta(days=1))}')"
+                ))).scalar()
+                for statement in create_partition_sql(day, from_default=in_default):
+                    await session.execute(text(statement))
+                await session.commit()
+                created.append(name)
+            except Exception as e:
+                await session.rollback()
+                print(f"Failed to create partition {name}: {e}")
+
+        for name in sorted(existing):
+            suffix = name[len(PARTITION_PREFIX):]
+            if not suffix.isdigit():
+                continue # location_history_default
+            if datetime.strptime(suffix, "%Y%m%d").date() < keep_from:
+                await session.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                await session.commit()
+                dropped.append(name)
+
+        # Partitions are dropped on expiry; the default one has to be trimmed
+        result = await session.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at < :keep_from"),
+            {"keep_from": datetime.combine(keep_from, time.min, tzinfo=timezone.utc)}
+        )
+        await session.commit()
+        purged = result.rowcount or 0
+
+    if created or dropped or purged:
+        print(f"Location history partitions: created {created}, dropped {dropped}, purged {purged} default rows")
+    return {"created": created, "dropped": dropped, "purged": purged}
+
+async def get_track(user_id: int, hours: float = 24) -> List[TrackPoint]:
+    """
+    A driver's positions over the last `hours`, oldest first.
+    The recorded_at bound prunes the scan to the partitions of those days.
+    """
+    async with async_session_factory() as session:
+        result = await session.execute(text("""
+            SELECT recorded_at, lat_e6 * CAST(1e-6 AS DOUBLE PRECISION), lon_e6 * CAST(1e-6 AS DOUBLE PRECISION), state_id
+            FROM location_history
+            WHERE user_id = :user_id
+              AND recorded_at >= now() - make_interval(secs => CAST(:seconds AS DOUBLE PRECISION))
+            ORDER BY recorded_at
+        """), {"user_id": user_id, "seconds": hours * 3600})
+        return [TrackPoint(*row) for row in result.all()]
@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+from bot.common.data.locations import state_id
+from bot.common.services.profiles import get_profile
+from bot.common.services.scheduler import schedule_reminder
+
+# One round-trip: touch the user (proves they exist), append to the history
+# and upsert the current location from it. No users row -> nothing written -> 0 rows.
+SAVE_LOCATION_SQL = text("""
+    WITH u AS (
+        UPDATE users SET last_active_at = now()
+        WHERE user_id = :user_id
+        RETURNING user_id
+    ),
+    h AS (
+        INSERT INTO location_history (user_id, recorded_at, lat_e6, lon_e6, state_id)
+        SELECT user_id, now(), round(CAST(:lat AS DOUBLE PRECISION) * 1e6), round(CAST(:lon AS DOUBLE PRECISION) * 1e6),
+               CAST(:state_id AS SMALLINT) FROM u
+        ON CONFLICT DO NOTHING
+    )
+    INSERT INTO locations (user_id, city, state, latitude, longitude, updated_at)
+    SELECT user_id, :city, :state, CAST(:lat AS DOUBLE PRECISION), CAST(:lon AS DOUBLE PRECISION), now() FROM u
+    ON CONFLICT (user_id) DO UPDATE SET
+        city = EXCLUDED.city,
+        state = EXCLUDED.state,
+        latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        updated_at = EXCLUDED.updated_at
+    RETURNING user_id
+""")
+
+# Same, for a whole batch passed as parallel arrays
+SAVE_LOCATIONS_BATCH_SQL = text("""
+    WITH v AS (
+        SELECT * FROM unnest(
+            CAST(:user_ids AS BIGINT[]), CAST(:cities AS TEXT[]), CAST(:states AS TEXT[]),
+            CAST(:lats AS DOUBLE PRECISION[]), CAST(:lons AS DOUBLE PRECISION[]), CAST(:seen AS TIMESTAMPTZ[]),
+            CAST(:state_ids AS SMALLINT[])
+        ) AS t(user_id, city, state, latitude, longitude, seen_at, state_id)
+    ),
+    u AS (
+        UPDATE users SET last_active_at = greatest(users.last_active_at, v.seen_at)
+        FROM v WHERE users.user_id = v.user_id
+        RETURNING users.user_id
+    ),
+    h AS (
+        INSERT INTO location_history (user_id, recorded_at, lat_e6, lon_e6, state_id)
+        SELECT v.user_id, v.seen_at, round(v.latitude * 1e6), round(v.longitude * 1e6), v.state_id
+        FROM v JOIN u ON u.user_id = v.user_id
+        ON CONFLICT DO NOTHING
+    )
+    INSERT INTO locations (user_id, city, state, latitude, longitude, updated_at)
+    SELECT v.user_id, v.city, v.state, v.latitude, v.longitude, v.seen_at
+    FROM v JOIN u ON u.user_id = v.user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        city = EXCLUDED.city,
+        state = EXCLUDED.state,
+        latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        updated_at = EXCLUDED.updated_at
+""")
+
+async def save_location_now(user_id: int, city: str, state: str, lat: float, lon: float) -> bool:
+    """
+    Synchronous write path. Returns False if the user is not registered.
+    """
+    async with async_session_factory() as session:
+        result = await session.execute(
+            SAVE_LOCATION_SQL,
+            {"user_id": user_id, "city": city, "state": state, "lat": lat, "lon": lon, "state_id": state_id(state)}
+        )
+        saved = result.scalar_one_or_none() is not None
+        await session.commit()
+        return saved
+
+class LocationWriter:
+    """
+    Write-behind buffer for driver positions.
+    Updates are coalesced per driver (last one wins) and flushed every
+    interval as one multi-row upsert, so a burst of N updates from M drivers
+    costs one statement with M rows. A failed batch is put back (unless a
+    newer position arrived meanwhile) and retried on the next tick; so is a
+    batch whose write was cancelled.
+    """
+    def __init__(self, interval: float = 0.3, max_batch: int = 1000):
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending = {} # user_id -> (city, state, lat, lon, seen_at)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+        self.flushed_rows = 0
+        self.batches = 0
+
+    def submit(self, user_id: int, city: str, state: str, lat: float, lon: float):
+        self._pending[user_id] = (city, state, lat, lon, datetime.now(timezone.utc))
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            async with async_session_factory() as session:
+                await session.execute(SAVE_LOCATIONS_BATCH_SQL, {
+                    "user_ids": list(batch),
+                    "cities": [v[0] for v in batch.values()],
+                    "states": [v[1] for v in batch.values()],
+                    "lats": [v[2] for v in batch.values()],
+                    "lons": [v[3] for v in batch.values()],
+                    "seen": [v[4] for v in batch.values()],
+                    "state_ids": [state_id(v[1]) for v in batch.values()],
+                })
+                await session.commit()
+            self.flushed_rows += len(batch)
+            self.batches += 1
+        except Exception as e:
+            print(f"Location flush failed ({len(batch)} rows), will retry: {e}")
+            self._requeue(batch)
+        except BaseException:
+            # Cancelled mid-write: keep the rows for the next flush
+            self._requeue(batch)
+            raise
+
+    def _requeue(self, batch: dict):
+        for user_id, value in batch.items():
+            self._pending.setdefault(user_id, value)
+
+    async def close(self):
+        """
+        Stops the flush loop (letting a running flush finish) and writes
+        whatever is still buffered.
+        """
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await self._task
+            finally:
+                self._task = None
+                self._closing = False
+        await self.flush()
+
+location_writer = LocationWriter(interval=settings.LOCATION_FLUSH_MS / 1000)
+
+async def save_location(user_id: int, city: str, state: str, lat: float, lon: float, buffered: bool = None) -> bool:
+    """
+    Saves a driver's position. Returns False if the user is not registered.
+    Buffered writes (LOCATION_WRITE_BEHIND by default) go through location_writer
+    and registration is checked against the cached profile instead of the database.
+    """
+    if buffered is None:
+        buffered = settings.LOCATION_WRITE_BEHIND
+    if not buffered:
+        saved = await save_location_now(user_id, city, state, lat, lon)
+    elif await get_profile(user_id) is None:
+        saved = False
+    else:
+        location_writer.submit(user_id, city, state, lat, lon)
+        saved = True
+
+    if saved:
+        await schedule_reminder(user_id)
+    return saved
@@ -0,0 +1,73 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+def normalize_text(text: str) -> str:
+    text = re.sub(r"[^\w\s@.]", " ", (text or "").lower())
+    return " ".join(text.split())
+
+def trigrams(text: str) -> set:
+    """
+    pg_trgm style: each word padded with two spaces in front and one behind.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class NGramIndex:
+    """
+    In-memory inverted trigram index over a few short text fields per document,
+    the fallback for pg_trgm. A document scores by its best field:
+    1.0 if the query is a substring of it, else the share of the query's
+    trigrams found in it (close to pg_trgm's word_similarity).
+    """
+    def __init__(self):
+        self._postings = defaultdict(set) # trigram -> doc ids
+        self._fields: Dict[int, List[Tuple[str, set]]] = {}
+
+    def __len__(self):
+        return len(self._fields)
+
+    def add(self, doc_id: int, *fields: str):
+        entries = []
+        for field in fields:
+            text = normalize_text(field)
+            if not text:
+                continue
+            grams = trigrams(text)
+            entries.append((text, grams))
+            for gram in grams:
+                self._postings[gram].add(doc_id)
+        self._fields[doc_id] = entries
+
+    def search(self, query: str, limit: int = 10, threshold: float = 0.5) -> List[Tuple[int, float]]:
+        query = normalize_text(query)
+        grams = trigrams(query)
+        if not grams:
+            return []
+
+        # Candidates share at least one trigram with the query
+        hits = defaultdict(int)
+        for gram in grams:
+            for doc_id in self._postings.get(gram, ()):
+                hits[doc_id] += 1
+
+        needed = threshold * len(grams)
+        scored = []
+        for doc_id, count in hits.items():
+            fields = self._fields[doc_id]
+            # Substrings first: a short inner match (an area code in a phone)
+            # shares too few trigrams to pass the count check below
+            if any(query in text for text, _ in fields):
+                scored.append((doc_id, 1.0))
+                continue
+            if count < needed:
+                continue # Can't reach the threshold in any single field
+            best = max(len(grams & field_grams) / len(grams) for _, field_grams in fields)
+            if best >= threshold:
+                scored.append((doc_id, best))
+
+        scored.sort(key=lambda item: -item[1])
+        return scored[:limit]
@@ -0,0 +1,119 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+import aiohttp
+
+from bot.common.services.ratelimit import TokenBucket
+
+class GeocoderBusy(Exception):
+    """
+    Raised when the request queue is full (back-pressure) or the deadline expires.
+    """
+
+@dataclass
+class _Job:
+    path: str
+    params: dict
+    future: asyncio.Future
+    waiters: int = field(default=1)
+
+class NominatimClient:
+    """
+    Async Nominatim client.
+    - One pooled aiohttp session per process.
+    - All requests go through a bounded queue drained by a few workers; when the
+      queue is full new requests fail fast instead of piling up.
+    - Workers take a token from a Redis bucket shared by both bots, so the whole
+      deployment stays within the OSM usage policy (~1 req/s).
+    - Identical in-flight requests are coalesced into one HTTP call.
+    """
+    def __init__(self, base_url: str, user_agent: str, limiter: TokenBucket,
+                 queue_size: int = 20, workers: int = 2, http_timeout: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.user_agent = user_agent
+        self.limiter = limiter
+        self.queue_size = queue_size
+        self.workers = workers
+        self.http_timeout = http_timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._inflight = {} # request key -> _Job
+
+    def _start(self):
+        # Lazily bound to the running loop on first use
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._session = aiohttp.ClientSession(
+            headers={"User-Agent": self.user_agent},
+            timeout=aiohttp.ClientTimeout(total=self.http_timeout),
+            connector=aiohttp.TCPConnector(limit=self.workers)
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, path: str, params: dict, deadline: float):
+        """
+        Queues a GET {base_url}/{path} and waits at most `deadline` seconds for the JSON.
+        Raises GeocoderBusy on back-pressure or timeout.
+        """
+        if self._queue is None:
+            self._start()
+
+        key = (path, tuple(sorted(params.items())))
+        job = self._inflight.get(key)
+        if job is not None:
+            job.waiters += 1
+        else:
+            job = _Job(path, params, asyncio.get_running_loop().create_future())
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                raise GeocoderBusy("Geocoder queue is full")
+            self._inflight[key] = job
+            job.future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        try:
+            # shield: one caller timing out must not cancel the shared request
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout=deadline)
+        except asyncio.TimeoutError:
+            raise GeocoderBusy(f"Geocoder deadline of {deadline}s exceeded")
+        finally:
+            job.waiters -= 1
+            if job.waiters <= 0 and not job.future.done():
+                # Nobody is waiting any more, let the worker skip it
+                job.future.cancel()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.future.done():
+                    continue
+                await self.limiter.acquire()
+                if job.future.done():
+                    continue
+                result = await self._fetch(job.path, job.params)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _fetch(self, path: str, params: dict):
+        params = {**params, "format": "jsonv2", "addressdetails": 1}
+        async with self._session.get(f"{self.base_url}/{path}", params=params) as resp:
+            resp.raise_for_status()
+            return await resp.json()
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+from aiogram.types import InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+
+from bot.common.config import settings
+from bot.common.database.redis import redis
+from bot.common.services.ratelimit import TokenBucket
+
+# Telegram: about 1 msg/s per private chat, 20 msg/min per group
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+DEAD_LETTERS_MAX = 1000
+# A replica whose heartbeat is older than this is considered gone; its in-flight jobs are requeued
+CONSUMER_TTL = 30
+# Per-tag counters of tracked jobs (e.g. a broadcast) are kept this long
+TAG_STATS_TTL = 7 * 86400
+# Jobs hold plain JSON: the markup is stored as (class name, fields)
+MARKUPS = {cls.__name__: cls for cls in (InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove)}
+
+def _job(method: str, params: dict, reply_markup, tag: Optional[str], tracked: bool = False) -> dict:
+    job = {"id": uuid.uuid4().hex, "method": method, "params": params, "tag": tag, "attempts": 0}
+    if tracked:
+        # Counted per tag and skipped once the tag is cancelled
+        job["tracked"] = True
+    if reply_markup is not None:
+        job["markup"] = {"type": type(reply_markup).__name__, "data": reply_markup.model_dump(exclude_none=True)}
+    return job
+
+def message_job(chat_id: int, text: str, reply_markup=None, parse_mode: str = "HTML", tag: str = None, tracked: bool = False) -> dict:
+    return _job("send_message", {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}, reply_markup, tag, tracked)
+
+def photo_job(chat_id: int, photo: str, caption: str = None, reply_markup=None, parse_mode: str = "HTML", tag: str = None) -> dict:
+    return _job("send_photo", {"chat_id": chat_id, "photo": photo, "caption": caption, "parse_mode": parse_mode}, reply_markup, tag)
+
+class Outbox:
+    """
+    Persistent queue of outbound messages in Redis, drained by a pool of workers
+    in the process that owns the bot (start()); any process can enqueue.
+    Sends respect a global and a per-chat token bucket. RetryAfter pauses all
+    workers and requeues the job; network/server errors are retried with
+    exponential back-off up to max_attempts; jobs that can never succeed
+    (bot blocked, chat not found) go to a capped dead-letter list.
+    Several processes (replicas) may drain the same outbox: each keeps its in-flight
+    jobs in its own list, and jobs of a replica that stopped heartbeating are
+    requeued by the others. Delivery is at-least-once.
+    Bulk jobs (broadcasts) wait in their own list, taken only when nothing else is queued.
+    Tracked jobs are counted per tag and can be cancelled by tag.
+    Handlers registered with on_dead_letter(tag, ...) see that tag's dead letters.
+
+    Keys: outbox:<name>:ready / :bulk / :processing:<replica> (lists), :alive:<replica>,
+    :delayed (zset by due time), :dead (list), :stats (hash of counters),
+    :tag:<tag> (hash), :cancel:<tag>.
+    """
+    def __init__(self, name: str, redis, workers: int = 4, global_rate: float = 25.0, max_attempts: int = 5):
+        self.name = name
+        self.redis = redis
+        self.workers = workers
+        self.max_attempts = max_attempts
+        prefix = f"outbox:{name}"
+        self._prefix = prefix
+        self._ready = f"{prefix}:ready"
+        self._bulk = f"{prefix}:bulk"
+        self._consumer = uuid.uuid4().hex[:12]
+        self._processing = f"{prefix}:processing:{self._consumer}"
+        self._alive = f"{prefix}:alive:{self._consumer}"
+        self._delayed = f"{prefix}:delayed"
+        self._dead = f"{prefix}:dead"
+        self._stats = f"{prefix}:stats"
+        self._global = TokenBucket(redis, f"ratelimit:tg:{name}", rate=global_rate, capacity=global_rate)
+        self._bot: Optional[Bot] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._paused_until = 0.0
+        self._dead_handlers = {} # tag -> async handler(job, error)
+
+    def on_dead_letter(self, tag: str, handler):
+        """
+        handler(job, error) is awaited after a job with this tag is dead-lettered
+        (in the process draining the outbox).
+        """
+        self._dead_handlers[tag] = handler
+
+    async def enqueue(self, job: dict) -> str:
+        await self.redis.lpush(self._ready, json.dumps(job))
+        await self.redis.hincrby(self._stats, "queued", 1)
+        return job["id"]
+
+    async def enqueue_many(self, jobs: List[dict], bulk: bool = False) -> int:
+        if not jobs:
+            return 0
+        queue = self._bulk if bulk else self._ready
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for start in range(0, len(jobs), 500):
+                pipe.lpush(queue, *[json.dumps(job) for job in jobs[start:start + 500]])
+            pipe.hincrby(self._stats, "queued", len(jobs))
+            await pipe.execute()
+        return len(jobs)
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        self._stopping = False
+        await self.redis.set(self._alive, 1, ex=CONSUMER_TTL)
+        await self._recover_orphans()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._promote_loop()))
+
+    async def close(self, timeout: float = 5.0):
+        """
+        Lets workers finish the message in hand, then stops them.
+        Queued messages stay in Redis for the next start.
+        """
+        self._stopping = True
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        # Whatever is still in flight is picked up by another replica (or our next start)
+        await self.redis.delete(self._alive)
+
+    async def stats(self) -> dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._stats)
+            pipe.llen(self._ready)
+            pipe.llen(self._bulk)
+            pipe.zcard(self._delayed)
+            pipe.llen(self._dead)
+            counters, ready, bulk, delayed, dead = await pipe.execute()
+        processing = 0
+        async for key in self.redis.scan_iter(match=f"{self._prefix}:processing:*"):
+            processing += await self.redis.llen(key)
+        stats = {k.decode(): int(v) for k, v in counters.items()}
+        stats.update(ready=ready + bulk, delayed=delayed, in_flight=processing, dead_letters=dead)
+        return stats
+
+    async def tag_stats(self, tag: str) -> dict:
+        counters = await self.redis.hgetall(f"{self._prefix}:tag:{tag}")
+        return {k.decode(): int(v) for k, v in counters.items()}
+
+    async def set_tag_total(self, tag: str, total: int):
+        key = f"{self._prefix}:tag:{tag}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, "total", total)
+            pipe.expire(key, TAG_STATS_TTL)
+            await pipe.execute()
+
+    async def cancel(self, tag: str):
+        """
+        Tracked jobs with this tag still queued are dropped instead of sent.
+        """
+        await self.redis.set(f"{self._prefix}:cancel:{tag}", 1, ex=TAG_STATS_TTL)
+
+    async def _count_tag(self, job: dict, field: str):
+        if job.get("tracked"):
+            key = f"{self._prefix}:tag:{job['tag']}"
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(key, field, 1)
+                pipe.expire(key, TAG_STATS_TTL)
+                await pipe.execute()
+
+    async def dead_letters(self, limit: int = 20) -> List[dict]:
+        return [json.loads(raw) for raw in await self.redis.lrange(self._dead, 0, limit - 1)]
+
+    async def _count(self, field: str, amount: int = 1):
+        await self.redis.hincrby(self._stats, field, amount)
+
+    async def _recover_orphans(self):
+        # In-flight jobs of replicas that stopped (crashed, or killed mid-send) go back to the queue
+        recovered = 0
+        async for key in self.redis.scan_iter(match=f"{self._prefix}:processing:*"):
+            consumer = key.decode().rpartition(":")[2]
+            if consumer == self._consumer or await self.redis.exists(f"{self._prefix}:alive:{consumer}"):
+                continue
+            while await self.redis.lmove(key, self._ready, "RIGHT", "RIGHT"):
+                recovered += 1
+        if recovered:
+            print(f"Outbox {self.name}: requeued {recovered} unfinished messages")
+
+    async def _promote_loop(self):
+        # Heartbeat, orphan recovery, and delayed (retried) jobs back to the queue when due
+        ticks = 0
+        while not self._stopping:
+            try:
+                await self.redis.set(self._alive, 1, ex=CONSUMER_TTL)
+                ticks += 1
+                if ticks % CONSUMER_TTL == 0:
+                    await self._recover_orphans()
+                due = await self.redis.zrangebyscore(self._delayed, "-inf", time.time(), start=0, num=100)
+                for raw in due:
+                    if await self.redis.zrem(self._delayed, raw):
+                        await self.redis.lpush(self._ready, raw)
+            except Exception as e:
+                print(f"Outbox {self.name}: promote failed: {e}")
+            await asyncio.sleep(1)
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                # Regular messages first; bulk ones only when those are drained
+                raw = await self.redis.lmove(self._ready, self._processing, "RIGHT", "LEFT")
+                if raw is None:
+                    raw = await self.redis.blmove(self._bulk, self._processing, 1, "RIGHT", "LEFT")
+            except Exception as e:
+                print(f"Outbox {self.name}: queue read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if raw is None:
+                continue
+            try:
+                await self._handle(json.loads(raw))
+                await self.redis.lrem(self._processing, 1, raw)
+            except Exception as e:
+                print(f"Outbox {self.name}: job failed: {e}")
+                await self._retry_later(raw, e)
+
+    async def _retry_later(self, raw: bytes, error: Exception):
+        """
+        A job whose handling failed outside the send (Redis, rate-limit script)
+        backs off like a network error instead of waiting for a restart.
+        """
+        try:
+            job = json.loads(raw)
+            job["attempts"] += 1
+            if job["attempts"] >= self.max_attempts:
+                await self._dead_letter(job, error)
+                await self.redis.lrem(self._processing, 1, raw)
+                return
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(self._delayed, {json.dumps(job): time.time() + 2 ** job["attempts"]})
+                pipe.lrem(self._processing, 1, raw)
+                pipe.hincrby(self._stats, "retried", 1)
+                await pipe.execute()
+        except Exception as e:
+            # Redis is still away: stays in this replica's processing list, requeued once it stops
+            print(f"Outbox {self.name}: job kept for restart: {e}")
+            await asyncio.sleep(1)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        rate = PRIVATE_CHAT_RATE if chat_id > 0 else GROUP_CHAT_RATE
+        return TokenBucket(self.redis, f"ratelimit:tg:{self.name}:chat:{chat_id}", rate=rate, capacity=max(1.0, rate * 3))
+
+    async def _send(self, job: dict):
+        kwargs = dict(job["params"])
+        markup = job.get("markup")
+        if markup:
+            kwargs["reply_markup"] = MARKUPS[markup["type"]].model_validate(markup["data"])
+        await getattr(self._bot, job["method"])(**kwargs)
+
+    async def _handle(self, job: dict):
+        if job.get("tracked") and await self.redis.exists(f"{self._prefix}:cancel:{job['tag']}"):
+            await self._count_tag(job, "cancelled")
+            return
+
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self._chat_bucket(job["params"]["chat_id"]).acquire()
+        await self._global.acquire()
+
+        try:
+            await self._send(job)
+        except TelegramRetryAfter as e:
+            # Flood control applies to the whole bot: every worker waits
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            await self._count("retry_after")
+            await self._delay(job, e.retry_after)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Blocked / deactivated / chat not found: retrying won't help
+            await self._dead_letter(job, e)
+        except (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError) as e:
+            job["attempts"] += 1
+            if job["attempts"] >= self.max_attempts:
+                await self._dead_letter(job, e)
+            else:
+                await self._count("retried")
+                await self._delay(job, 2 ** job["attempts"])
+        except Exception as e:
+            await self._dead_letter(job, e)
+        else:
+            await self._count("sent")
+            await self._count_tag(job, "sent")
+
+    async def _delay(self, job: dict, seconds: float):
+        await self.redis.zadd(self._delayed, {json.dumps(job): time.time() + seconds})
+
+    async def _dead_letter(self, job: dict, error: Exception):
+        job["error"] = f"{type(error).__name__}: {error}"
+        job["failed_at"] = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.lpush(self._dead, json.dumps(job))
+            pipe.ltrim(self._dead, 0, DEAD_LETTERS_MAX - 1)
+            pipe.hincrby(self._stats, "dead", 1)
+            await pipe.execute()
+        await self._count_tag(job, "failed")
+        print(f"Outbox {self.name}: undeliverable to {job['params']['chat_id']}: {job['error']}")
+        handler = self._dead_handlers.get(job.get("tag"))
+        if handler is not None:
+            try:
+                await handler(job, error)
+            except Exception as e:
+                print(f"Outbox {self.name}: dead-letter handler for {job['tag']} failed: {e}")
+
+# Drained by the driver bot, which owns the chats with drivers and posts to the admin group
+driver_outbox = Outbox(
+    "driver", redis,
+    workers=settings.OUTBOX_WORKERS,
+    global_rate=settings.OUTBOX_GLOBAL_RATE,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+)
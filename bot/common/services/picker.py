@@ -0,0 +1,84 @@
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import aliased
+
+from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User
+from bot.common.database.redis import redis
+
+# Same page size as build_pagination_kb
+PICKER_PAGE_SIZE = 10
+
+PickerItem = Tuple[str, int] # (button text, user_id)
+
+def _key(chat_id: int, message_id: int) -> str:
+    return f"picker:{chat_id}:{message_id}"
+
+def _sort_key():
+    # Matches ix_users_active_name, same order as /drivers
+    return tuple_(func.coalesce(User.full_name, ""), User.user_id)
+
+def _item(user_id: int, full_name: Optional[str]) -> PickerItem:
+    return (full_name or str(user_id), user_id)
+
+async def load_picker_items() -> List[PickerItem]:
+    """
+    All active drivers as (name, id), without locations or other columns.
+    """
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(User.user_id, User.full_name).where(User.status == "active").order_by(*_sort_key().clauses)
+        )
+        return [_item(user_id, name) for user_id, name in result.all()]
+
+async def save_snapshot(chat_id: int, message_id: int, items: List[PickerItem]):
+    try:
+        await redis.set(_key(chat_id, message_id), json.dumps(items), ex=settings.PICKER_SNAPSHOT_TTL)
+    except Exception as e:
+        print(f"Picker snapshot write failed: {e}")
+
+async def load_snapshot(chat_id: int, message_id: int) -> Optional[List[PickerItem]]:
+    """
+    None when expired (or Redis is down): the caller falls back to fetch_picker_page.
+    """
+    try:
+        raw = await redis.get(_key(chat_id, message_id))
+    except Exception as e:
+        print(f"Picker snapshot read failed: {e}")
+        return None
+    return [tuple(item) for item in json.loads(raw)] if raw else None
+
+async def fetch_picker_page(anchor: int = 0, direction: str = "a") -> List[PickerItem]:
+    """
+    One page without a snapshot, keyset-paginated from the anchor driver:
+    direction "a" = after it, "b" = before it; anchor 0 = first page.
+    An anchor deleted meanwhile yields an empty page.
+    """
+    key = _sort_key()
+    stmt = select(User.user_id, User.full_name).where(User.status == "active")
+    if anchor:
+        other = aliased(User)
+        position = tuple_(
+            select(func.coalesce(other.full_name, "")).where(other.user_id == anchor).scalar_subquery(),
+            anchor
+        )
+        stmt = stmt.where(key < position if direction == "b" else key > position)
+
+    if direction == "b":
+        stmt = stmt.order_by(func.coalesce(User.full_name, "").desc(), User.user_id.desc())
+    else:
+        stmt = stmt.order_by(func.coalesce(User.full_name, ""), User.user_id)
+
+    async with async_session_factory() as session:
+        rows = (await session.execute(stmt.limit(PICKER_PAGE_SIZE))).all()
+    items = [_item(user_id, name) for user_id, name in rows]
+    if direction == "b":
+        items.reverse()
+    return items
+
+async def count_picker_items() -> int:
+    async with async_session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(User).where(User.status == "active"))
@@ -0,0 +1,88 @@
+import json
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User
+from bot.common.database.redis import redis
+from bot.common.services.cache import TieredCache, MISSING
+from bot.common.services.events import ProfileInvalidation
+
+STATS_KEY = "stats:driver_bot:caches"
+
+class UserProfile(NamedTuple):
+    """
+    Slim projection of a users row, enough for middlewares and routing.
+    """
+    user_id: int
+    language: str
+    status: str
+    full_name: Optional[str]
+
+profile_cache = TieredCache(
+    "user:profile",
+    redis if settings.PROFILE_CACHE_REDIS else None,
+    maxsize=settings.PROFILE_CACHE_SIZE,
+    ttl=settings.PROFILE_CACHE_TTL,
+    negative_ttl=settings.PROFILE_CACHE_TTL
+)
+
+# Bumped on every invalidation: a lookup that raced with one does not store its result
+_generation = 0
+
+async def get_profile(user_id: int) -> Optional[UserProfile]:
+    """
+    Read-through lookup; None for unknown (unregistered) users.
+    Kept fresh by the user_profile trigger, TTL only bounds staleness if
+    a notification is lost.
+    """
+    cached = await profile_cache.get(str(user_id))
+    if cached is not MISSING:
+        return UserProfile(*cached) if cached is not None else None
+
+    generation = _generation
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(User.user_id, User.language, User.status, User.full_name).where(User.user_id == user_id)
+        )
+        row = result.one_or_none()
+
+    profile = UserProfile(*row) if row else None
+    if generation == _generation:
+        await profile_cache.set(str(user_id), profile)
+    return profile
+
+async def invalidate_profile(user_id: int):
+    global _generation
+    _generation += 1
+    await profile_cache.delete(str(user_id))
+
+async def flush_profiles():
+    global _generation
+    _generation += 1
+    await profile_cache.clear()
+    print("Profile cache flushed")
+
+async def on_profile_events(events: List[ProfileInvalidation]):
+    # user_profile burst: "*" (admin /cache flush) drops everything, else each user once
+    if any(event.user_id is None for event in events):
+        await flush_profiles()
+        return
+    for user_id in {event.user_id for event in events}:
+        await invalidate_profile(user_id)
+
+async def publish_cache_stats(extra: dict = None):
+    """
+    Publishes this process' cache stats to Redis for the admin /cache command.
+    """
+    stats = {"profiles": profile_cache.stats(), **(extra or {})}
+    try:
+        await redis.set(STATS_KEY, json.dumps(stats), ex=300)
+    except Exception as e:
+        print(f"Failed to publish cache stats: {e}")
+
+async def read_cache_stats() -> Optional[dict]:
+    raw = await redis.get(STATS_KEY)
+    return json.loads(raw) if raw else None
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+# Refill-and-take in one atomic step. Uses the Redis clock so every process
+# sharing the bucket agrees on time. Returns 0 if the tokens were taken,
+# otherwise the number of ms to wait before retrying.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+class TokenBucket:
+    """
+    Token bucket stored in Redis, shared by every process using the same key.
+    rate: tokens per second, capacity: burst size.
+    """
+    def __init__(self, redis, key: str, rate: float, capacity: float = 1.0):
+        self.redis = redis
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._script = redis.register_script(TOKEN_BUCKET_LUA)
+
+    async def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Returns 0 if acquired, otherwise seconds to wait.
+        """
+        wait_ms = await self._script(keys=[self.key], args=[self.rate, self.capacity, tokens])
+        return int(wait_ms) / 1000
+
+    async def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """
+        Waits until tokens are available. Returns False if that would exceed timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = await self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
@@ -1,69 +1,197 @@
 import math
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, update
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, update, func, case, text
+from bot.common.config import settings
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User, Order
 
+# Bayesian smoothing with a prior for the 4.0 start:
+# initial score 0.75 maps to 4.0 stars (1 + 4*0.75)
+PRIOR_GOOD = 15.0
+PRIOR_TOTAL = 20.0
+PRIOR_SCORE = PRIOR_GOOD / PRIOR_TOTAL
+# confidence = 1 - exp(-orders / CONFIDENCE_ORDERS)
+CONFIDENCE_ORDERS = 7.0
+
+def bayesian_score(good: float, total: float) -> float:
+    return (good + PRIOR_GOOD) / (total + PRIOR_TOTAL)
+
+def confidence(count: int) -> float:
+    return 1 - math.exp(-count / CONFIDENCE_ORDERS)
+
+def decay_factor(age_seconds: float) -> float:
+    """
+    Weight of an order (or accumulator) that is age_seconds old:
+    halves every RATING_HALF_LIFE_DAYS.
+    """
+    return 0.5 ** (max(age_seconds, 0.0) / (settings.RATING_HALF_LIFE_DAYS * 86400))
+
+def _sql_decay(since):
+    # Same as decay_factor, evaluated by Postgres against now()
+    age = func.extract("epoch", func.now() - since)
+    return func.power(0.5, func.greatest(age, 0) / (settings.RATING_HALF_LIFE_DAYS * 86400))
+
+def current_score(user, now: datetime = None) -> float:
+    """
+    Read-time score: decays the stored accumulators up to now, so scores of
+    drivers without new orders drift back to the prior without a write.
+    """
+    if user.rating_updated_at is None:
+        return user.rating_score
+    now = now or datetime.now(timezone.utc)
+    updated_at = user.rating_updated_at
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    f = decay_factor((now - updated_at).total_seconds())
+    return bayesian_score(user.rating_good_acc * f, user.rating_total_acc * f)
+
+def sql_current_score():
+    """
+    current_score() as a SQL expression, for filters evaluated in Postgres.
+    """
+    f = _sql_decay(User.rating_updated_at)
+    return case(
+        (User.rating_updated_at.is_(None), User.rating_score),
+        else_=(User.rating_good_acc * f + PRIOR_GOOD) / (User.rating_total_acc * f + PRIOR_TOTAL)
+    )
+
+async def apply_order_rating(session, user_id: int, is_good: bool):
+    """
+    O(1) rating update for one new order, in the caller's transaction.
+    Decays the accumulators to now(), adds the order and refreshes the
+    stored score/confidence in a single UPDATE (atomic under concurrent /rate).
+    """
+    f = _sql_decay(func.coalesce(User.rating_updated_at, func.now()))
+    good = User.rating_good_acc * f + (1.0 if is_good else 0.0)
+    total = User.rating_total_acc * f + 1.0
+
+    stmt = update(User).where(User.user_id == user_id).values(
+        rating_good_acc=good,
+        rating_total_acc=total,
+        rating_count=User.rating_count + 1,
+        rating_updated_at=func.now(),
+        rating_score=(good + PRIOR_GOOD) / (total + PRIOR_TOTAL),
+        rating_confidence=1 - func.exp(-(User.rating_count + 1) / CONFIDENCE_ORDERS),
+        last_active_at=User.last_active_at # Being rated is not driver activity (skip onupdate)
+    )
+    await session.execute(stmt)
+
 async def recalculate_rating(user_id: int):
     """
-    Recalculates user rating based on all historical orders.
-    Formula:
-    weight = 1.0 (<=30d), 0.5 (31-90d), 0.2 (>90d)
-    score = (weighted_good + 1) / (weighted_total + 2)
+    Rebuilds one driver's accumulators from their full order history
+    (repair path; /rate uses apply_order_rating).
+    weight = 0.5 ** (age / half-life)
+    score = (weighted_good + 15) / (weighted_total + 20)
     confidence = 1 - exp(-total / 7)
     """
     async with async_session_factory() as session:
-        # Fetch all orders for the user
-        result = await session.execute(select(Order).where(Order.driver_id == user_id))
-        orders = result.scalars().all()
-        
-        now = datetime.now(timezone.utc)
-        weighted_good = 0.0
-        weighted_total = 0.0
-        raw_total_count = len(orders)
-        
-        for order in orders:
-            # Ensure order.created_at is aware or fallback
-            order_date = order.created_at
-            if order_date.tzinfo is None:
-                order_date = order_date.replace(tzinfo=timezone.utc)
-            
-            age_days = (now - order_date).days
-            
-            # Determine weight
-            if age_days <= 30:
-                weight = 1.0
-            elif age_days <= 90:
-                weight = 0.5
-            else:
-                weight = 0.2
-            
-            weighted_total += weight
-            if order.is_good:
-                weighted_good += (1.0 * weight)
-            # if bad, add nothing to weighted_good, but add to total
-        
-        # Bayesian Smoothing with Prior for 4.0 start
-        # We want initial score 0.75 (which maps to 4.0 stars: 1 + 4*0.75)
-        # 0.75 = PRIOR_GOOD / PRIOR_TOTAL
-        # Let's use PRIOR_TOTAL = 20, PRIOR_GOOD = 15
-        PRIOR_GOOD = 15.0
-        PRIOR_TOTAL = 20.0
-        
-        score = (weighted_good + PRIOR_GOOD) / (weighted_total + PRIOR_TOTAL)
-        
-        # Confidence
-        # confidence = 1 - exp(-total / 7)
-        confidence = 1 - math.exp(-raw_total_count / 7.0)
-        
-        # Update User
+        w = _sql_decay(Order.created_at)
+        result = await session.execute(
+            select(
+                func.coalesce(func.sum(case((Order.is_good, w), else_=0.0)), 0.0),
+                func.coalesce(func.sum(w), 0.0),
+                func.count(Order.id)
+            ).where(Order.driver_id == user_id)
+        )
+        weighted_good, weighted_total, raw_total_count = result.one()
+
         stmt = update(User).where(User.user_id == user_id).values(
-            rating_score=score,
-            rating_confidence=confidence
+            rating_good_acc=weighted_good,
+            rating_total_acc=weighted_total,
+            rating_count=raw_total_count,
+            rating_updated_at=func.now(),
+            rating_score=bayesian_score(weighted_good, weighted_total),
+            rating_confidence=confidence(raw_total_count),
+            last_active_at=User.last_active_at
         )
         await session.execute(stmt)
         await session.commit()
 
+# Per-driver decayed aggregates over all orders, with the score they imply
+_RECOMPUTE_CTE = """
+    WITH s AS (
+        SELECT driver_id, good, total, cnt,
+               (good + CAST(:prior_good AS DOUBLE PRECISION)) / (total + CAST(:prior_total AS DOUBLE PRECISION)) AS score,
+               1 - exp(-cnt / CAST(:confidence_orders AS DOUBLE PRECISION)) AS conf
+        FROM (
+            SELECT driver_id,
+                   sum(CASE WHEN is_good THEN w ELSE 0 END) AS good,
+                   sum(w) AS total,
+                   count(*) AS cnt
+            FROM (
+                SELECT driver_id, is_good,
+                       power(0.5, greatest(extract(epoch FROM now() - created_at), 0) / CAST(:half_life_s AS DOUBLE PRECISION)) AS w
+                FROM orders
+            ) o
+            GROUP BY driver_id
+        ) agg
+    )
+"""
+
+# A row is stale only if its stored accumulators, decayed to now() the way
+# sql_current_score() does at read time, disagree with the full history.
+# Comparing rating_score instead would flag nearly every rated driver every
+# night (the score drifts with decay alone), and each rewrite fires
+# trigger_driver_profile and bumps updated_at for the sync.
+_CHANGED = """(
+    u.rating_updated_at IS NULL
+    OR u.rating_count <> s.cnt
+    OR abs(u.rating_good_acc * power(0.5, greatest(extract(epoch FROM now() - u.rating_updated_at), 0)
+           / CAST(:half_life_s AS DOUBLE PRECISION)) - s.good) > CAST(:eps AS DOUBLE PRECISION)
+    OR abs(u.rating_total_acc * power(0.5, greatest(extract(epoch FROM now() - u.rating_updated_at), 0)
+           / CAST(:half_life_s AS DOUBLE PRECISION)) - s.total) > CAST(:eps AS DOUBLE PRECISION)
+)"""
+
+async def recompute_all_ratings(dry_run: bool = False, eps: float = 1e-4) -> dict:
+    """
+    Recomputes every rated driver from their order history in one set-based
+    statement (UPDATE ... FROM (SELECT ... GROUP BY driver_id)), with the same
+    decay weights as apply_order_rating. Only rows whose accumulators (decayed
+    to now) or order count disagree with the history are written; scores are
+    decayed at read time, so a consistent row needs no nightly rewrite.
+    dry_run reports what would change without writing.
+    Returns {"drivers", "changed", "elapsed_ms", "dry_run"}.
+    """
+    params = {
+        "prior_good": PRIOR_GOOD,
+        "prior_total": PRIOR_TOTAL,
+        "confidence_orders": CONFIDENCE_ORDERS,
+        "half_life_s": settings.RATING_HALF_LIFE_DAYS * 86400,
+        "eps": eps,
+    }
+    started = time.perf_counter()
+    async with async_session_factory() as session:
+        if dry_run:
+            sql = _RECOMPUTE_CTE + f"""
+                SELECT count(*), count(*) FILTER (WHERE {_CHANGED})
+                FROM users u JOIN s ON s.driver_id = u.user_id
+            """
+        else:
+            # The outer SELECT still sees the pre-update snapshot of users
+            sql = _RECOMPUTE_CTE + f""",
+                upd AS (
+                    UPDATE users u SET
+                        rating_good_acc = s.good,
+                        rating_total_acc = s.total,
+                        rating_count = s.cnt,
+                        rating_updated_at = now(),
+                        rating_score = s.score,
+                        rating_confidence = s.conf
+                    FROM s
+                    WHERE u.user_id = s.driver_id AND {_CHANGED}
+                    RETURNING u.user_id
+                )
+                SELECT (SELECT count(*) FROM s), (SELECT count(*) FROM upd)
+            """
+        drivers, changed = (await session.execute(text(sql), params)).one()
+        if not dry_run:
+            await session.commit()
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"Rating recompute{' (dry run)' if dry_run else ''}: {changed}/{drivers} drivers changed in {elapsed_ms:.0f} ms")
+    return {"drivers": drivers, "changed": changed, "elapsed_ms": elapsed_ms, "dry_run": dry_run}
+
 def get_star_rating(score: float) -> str:
     """
     Converts score (0..1) to stars string.
@@ -73,6 +201,9 @@ def get_star_rating(score: float) -> str:
     # Round to 1 decimal
     return f"{stars_val:.1f} ⭐️"
 
+def stars_to_score(stars: float) -> float:
+    return (stars - 1) / 4
+
 def get_rating_category(score: float) -> str:
     if score >= 0.85:
         return "Excellent 🟢"
@@ -1,61 +1,192 @@
+import json
+import time
 from datetime import datetime, timezone
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from typing import Optional
 from sqlalchemy import select
-from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+from bot.common.config import settings
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User
+from bot.common.database.redis import redis
+from bot.common.services.outbox import driver_outbox, message_job
 
-async def check_inactive_drivers(bot: Bot, db_url: str, hours: int = 12):
+# Inactivity reminders as a timer wheel in Redis:
+#   reminders:due  - ZSET user_id -> unix time the next reminder is due
+#   reminders:sent - HASH user_id -> {"count", "last"} of reminders sent since the last location
+#                    ("blocked" too once a reminder could not be delivered at all)
+DUE_KEY = "reminders:due"
+SENT_KEY = "reminders:sent"
+BATCH = 100
+
+def _due_after_activity(last_active: datetime) -> float:
+    if last_active.tzinfo is None:
+        last_active = last_active.replace(tzinfo=timezone.utc)
+    return last_active.timestamp() + settings.REMINDER_AFTER_HOURS * 3600
+
+def retry_delay(sent: int) -> float:
     """
-    Checks for drivers who haven't updated location in 'hours' time.
-    Sends them a reminder with a location button.
-    Should be scheduled to run every 30 minutes.
+    Seconds until the next reminder after `sent` unanswered ones.
+    """
+    hours = min(settings.REMINDER_RETRY_HOURS * 2 ** (sent - 1), settings.REMINDER_RETRY_MAX_HOURS)
+    return hours * 3600
+
+async def schedule_reminder(user_id: int, seen_at: Optional[float] = None):
+    """
+    Called on every location update: pushes the driver's reminder back and
+    resets the back-off. O(log n), one round trip.
+    """
+    due = (seen_at or time.time()) + settings.REMINDER_AFTER_HOURS * 3600
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(DUE_KEY, {str(user_id): due})
+            pipe.hdel(SENT_KEY, str(user_id))
+            await pipe.execute()
+    except Exception as e:
+        print(f"Failed to schedule reminder for {user_id}: {e}")
+
+async def _on_reminder_dead_letter(job: dict, error: Exception):
+    """
+    A reminder Telegram refused for good (bot blocked, chat gone): take the
+    driver off the wheel instead of re-queuing into the dead letters every
+    back-off step. The SENT_KEY entry keeps seed_reminders from re-adding
+    them; their next location (schedule_reminder) clears it.
+    """
+    if not isinstance(error, (TelegramForbiddenError, TelegramBadRequest)):
+        return # Network trouble: the back-off already has the next attempt
+    user_id = str(job["params"]["chat_id"])
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrem(DUE_KEY, user_id)
+        pipe.hset(SENT_KEY, user_id, json.dumps({"count": settings.REMINDER_MAX_SENT, "last": time.time(), "blocked": True}))
+        await pipe.execute()
+
+driver_outbox.on_dead_letter("reminder", _on_reminder_dead_letter)
+
+async def seed_reminders():
+    """
+    Startup: schedules active drivers missing from the wheel (first run, or a
+    lost Redis). Existing entries and drivers in back-off are left alone.
     """
-    start_time = datetime.now()
     async with async_session_factory() as session:
-        # Get all approved users
-        stmt = select(User).where(User.status == 'active')
-        result = await session.execute(stmt)
-        users = result.scalars().all()
-        
-        kb = ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="📍 Send Location", request_location=True)]],
-            resize_keyboard=True,
-            one_time_keyboard=True
-        )
-
-        cnt = 0
-        for user in users:
-            last_active = user.last_active_at
-            if last_active.tzinfo is None:
-                last_active = last_active.replace(tzinfo=timezone.utc)
-            
-            # Use UTC for current time comparison to avoid offset issues
-            now_utc = datetime.now(timezone.utc)
-            diff = (now_utc - last_active).total_seconds()
-            
-            # If inactivity > hours (12h), send reminder
-            # The scheduler runs every ~30m, so this acts as a 30m retry loop
-            if diff > hours * 3600:
-                try:
-                    # Localization fallback (english default for system messages)
-                    msg = (
-                        f"⏳ <b>Update Required!</b>\n\n"
-                        f"It has been over {hours} hours since your last location update.\n"
-                        f"Please share your live location now to receive orders."
-                    )
-                    
-                    await bot.send_message(
-                        user.user_id, 
-                        msg,
-                        reply_markup=kb,
-                        parse_mode="HTML"
-                    )
+        rows = (await session.execute(
+            select(User.user_id, User.last_active_at).where(User.status == 'active')
+        )).all()
+    if not rows:
+        return
+    in_backoff = set(await redis.hkeys(SENT_KEY))
+    due = {
+        str(user_id): _due_after_activity(last_active)
+        for user_id, last_active in rows
+        if str(user_id).encode() not in in_backoff
+    }
+    if due:
+        added = await redis.zadd(DUE_KEY, due, nx=True)
+        if added:
+            print(f"Scheduled reminders for {added} drivers")
+
+async def _claim_due(now: float) -> list:
+    members = await redis.zrangebyscore(DUE_KEY, "-inf", now, start=0, num=BATCH)
+    claimed = []
+    for member in members:
+        # ZREM succeeds for one caller only: no double sends from overlapping runs
+        if await redis.zrem(DUE_KEY, member):
+            claimed.append(int(member))
+    return claimed
+
+async def _requeue(user_ids: list, now: float):
+    """
+    Puts claimed but unprocessed drivers back on the wheel, due now.
+    NX: a reschedule from a location update that raced in wins.
+    """
+    try:
+        await redis.zadd(DUE_KEY, {str(u): now for u in user_ids}, nx=True)
+    except Exception as e:
+        print(f"Failed to requeue {len(user_ids)} reminders: {e}")
+
+async def _remind(user_id: int, user: tuple, raw, now: float, msg: str, kb) -> bool:
+    """
+    Decides one claimed driver: drop, reschedule or queue a reminder.
+    Returns True if a reminder was queued.
+    """
+    status, last_active = user
+    if status != 'active':
+        # Deleted, banned or pending: off the wheel until the next location
+        await redis.hdel(SENT_KEY, str(user_id))
+        return False
+    due = _due_after_activity(last_active)
+    if due > now:
+        # Newer activity than the wheel knew of (e.g. a missed reschedule)
+        await redis.zadd(DUE_KEY, {str(user_id): due})
+        return False
+
+    sent = json.loads(raw)["count"] if raw else 0
+    if sent >= settings.REMINDER_MAX_SENT:
+        return False # Gave up; the next location puts the driver back on the wheel
+
+    try:
+        # Localization fallback (english default for system messages)
+        await driver_outbox.enqueue(message_job(user_id, msg, reply_markup=kb, tag="reminder"))
+    except Exception as e:
+        print(f"Failed to queue reminder to {user_id}: {e}")
+        await redis.zadd(DUE_KEY, {str(user_id): now + retry_delay(max(sent, 1))})
+        return False
+
+    sent += 1
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(SENT_KEY, str(user_id), json.dumps({"count": sent, "last": now}))
+        if sent < settings.REMINDER_MAX_SENT:
+            pipe.zadd(DUE_KEY, {str(user_id): now + retry_delay(sent)})
+        await pipe.execute()
+    return True
+
+async def process_due_reminders():
+    """
+    Queues the reminders that are due (sent by driver_outbox). Cost scales with due entries, not fleet
+    size; scheduled every minute. The database is only read to confirm the
+    claimed drivers are still active and still stale. If a batch fails
+    midway, the drivers it had not got to yet go back on the wheel.
+    """
+    start_time = datetime.now()
+    kb = ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text="📍 Send Location", request_location=True)]],
+        resize_keyboard=True,
+        one_time_keyboard=True
+    )
+    hours = settings.REMINDER_AFTER_HOURS
+    msg = (
+        f"⏳ <b>Update Required!</b>\n\n"
+        f"It has been over {hours:g} hours since your last location update.\n"
+        f"Please share your live location now to receive orders."
+    )
+
+    cnt = 0
+    while True:
+        now = time.time()
+        user_ids = await _claim_due(now)
+        if not user_ids:
+            break
+
+        handled = set()
+        try:
+            async with async_session_factory() as session:
+                rows = (await session.execute(
+                    select(User.user_id, User.status, User.last_active_at).where(User.user_id.in_(user_ids))
+                )).all()
+            users = {user_id: (status, last_active) for user_id, status, last_active in rows}
+            sent_counts = await redis.hmget(SENT_KEY, [str(u) for u in user_ids])
+
+            for user_id, raw in zip(user_ids, sent_counts):
+                if await _remind(user_id, users.get(user_id, (None, None)), raw, now, msg, kb):
                     cnt += 1
-                except Exception as e:
-                    print(f"Failed to send reminder to {user.user_id}: {e}")
-        
-        if cnt > 0:
-            print(f"Sent {cnt} location reminders. Duration: {datetime.now() - start_time}")
+                handled.add(user_id)
+        finally:
+            unhandled = [u for u in user_ids if u not in handled]
+            if unhandled:
+                await _requeue(unhandled, now)
+
+        if len(user_ids) < BATCH:
+            break
+
+    if cnt > 0:
+        print(f"Queued {cnt} location reminders. Duration: {datetime.now() - start_time}")
@@ -0,0 +1,141 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, tuple_, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from bot.common.config import settings
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User, Order, SyncWatermark, SyncDeletion
+from bot.common.services.export import ExportRequest, build_query
+from bot.common.services.sync_sinks import SyncSink
+
+# Tombstones already applied are kept this long, then purged
+DELETIONS_KEEP_DAYS = 7
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+async def _load_watermark(name: str):
+    async with async_session_factory() as session:
+        value = await session.scalar(select(SyncWatermark.value).where(SyncWatermark.name == name))
+    return json.loads(value) if value else None
+
+async def _save_watermark(name: str, value):
+    async with async_session_factory() as session:
+        stmt = insert(SyncWatermark).values(name=name, value=json.dumps(value))
+        stmt = stmt.on_conflict_do_update(index_elements=["name"], set_={"value": stmt.excluded.value, "updated_at": func.now()})
+        await session.execute(stmt)
+        await session.commit()
+
+async def _fetch_drivers(watermark, limit: int, settled_before: datetime):
+    # Every user change bumps updated_at (trigger), including location saves
+    # (they touch last_active_at), so one mark covers the joined row
+    stmt, columns = build_query(ExportRequest(dataset="drivers", status="all"))
+    stmt = (
+        stmt.add_columns(User.updated_at)
+        .where(User.updated_at <= settled_before)
+        .order_by(None).order_by(User.updated_at, User.user_id)
+        .limit(limit)
+    )
+    if watermark:
+        stmt = stmt.where(tuple_(User.updated_at, User.user_id) > tuple_(datetime.fromisoformat(watermark["ts"]), watermark["id"]))
+
+    async with async_session_factory() as session:
+        rows = (await session.execute(stmt)).all()
+    if not rows:
+        return columns, [], watermark
+    last = rows[-1]
+    return columns, [[_cell(v) for v in row[:-1]] for row in rows], {"ts": last[-1].isoformat(), "id": last[0]}
+
+async def _fetch_orders(watermark, limit: int, settled_before: datetime):
+    # Orders are never updated: the id is enough
+    stmt, columns = build_query(ExportRequest(dataset="orders"))
+    stmt = stmt.where(Order.created_at <= settled_before).limit(limit)
+    if watermark:
+        stmt = stmt.where(Order.id > watermark["id"])
+
+    async with async_session_factory() as session:
+        rows = (await session.execute(stmt)).all()
+    if not rows:
+        return columns, [], watermark
+    return columns, [[_cell(v) for v in row] for row in rows], {"id": rows[-1][0]}
+
+STREAMS = {
+    "drivers": _fetch_drivers,
+    "orders": _fetch_orders,
+}
+
+async def _sync_deletions(sink: SyncSink, limit: int) -> int:
+    watermark = await _load_watermark("deletions")
+    applied = 0
+    while True:
+        async with async_session_factory() as session:
+            stmt = select(SyncDeletion.id, SyncDeletion.stream, SyncDeletion.key).order_by(SyncDeletion.id).limit(limit)
+            if watermark:
+                stmt = stmt.where(SyncDeletion.id > watermark["id"])
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            break
+
+        by_stream = {}
+        for _, stream, key in rows:
+            by_stream.setdefault(stream, []).append(key)
+        for stream, keys in by_stream.items():
+            await sink.delete(stream, keys)
+
+        watermark = {"id": rows[-1][0]}
+        await _save_watermark("deletions", watermark)
+        applied += len(rows)
+        if len(rows) < limit:
+            break
+
+    async with async_session_factory() as session:
+        await session.execute(delete(SyncDeletion).where(
+            SyncDeletion.deleted_at < datetime.now(timezone.utc) - timedelta(days=DELETIONS_KEEP_DAYS)
+        ))
+        await session.commit()
+    return applied
+
+async def run_sync(sink: SyncSink) -> dict:
+    """
+    One incremental pass: for each stream, reads rows past its high-water mark
+    in keyset order, SYNC_BATCH_ROWS at a time, upserts them into the sink and
+    only then advances the mark (at-least-once; upserts are idempotent).
+    A row changed many times since the last pass is read once, in its latest state.
+    Rows newer than SYNC_LAG_SECONDS are left for the next pass, so transactions
+    that commit late with an older timestamp are not skipped.
+    """
+    started = time.perf_counter()
+    limit = settings.SYNC_BATCH_ROWS
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=settings.SYNC_LAG_SECONDS)
+    stats = {}
+    try:
+        # Deletions first: a driver deleted and then re-registered must end up present
+        stats["deleted"] = await _sync_deletions(sink, limit)
+        for name, fetch in STREAMS.items():
+            watermark = await _load_watermark(name)
+            synced = 0
+            while True:
+                columns, rows, new_watermark = await fetch(watermark, limit, settled_before)
+                if not rows:
+                    break
+                await sink.upsert(name, [header for header, _ in columns], rows)
+                await _save_watermark(name, new_watermark)
+                watermark = new_watermark
+                synced += len(rows)
+                if len(rows) < limit:
+                    break
+            stats[name] = synced
+    except Exception as e:
+        # Marks only advance after a successful batch: the next pass resumes here
+        print(f"Sync failed: {e}")
+        stats["error"] = str(e)
+
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+    if any(stats.get(k) for k in (*STREAMS, "deleted", "error")):
+        print(f"Sync: {stats}")
+    return stats
@@ -0,0 +1,214 @@
+import asyncio
+import csv
+import os
+import sqlite3
+from pathlib import Path
+from typing import List
+
+class SyncSink:
+    """
+    Destination of the incremental sync. Rows are plain lists (str/int/float/bool/None)
+    whose first column is the stream's key; upserts replace the row with that key.
+    """
+    async def upsert(self, stream: str, header: List[str], rows: List[list]):
+        raise NotImplementedError
+
+    async def delete(self, stream: str, keys: List[int]):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class CsvSink(SyncSink):
+    """
+    One <stream>.csv per stream in a directory, rewritten atomically per batch.
+    For local use and tests: every batch costs O(file size).
+    """
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, stream: str) -> Path:
+        return self.directory / f"{stream}.csv"
+
+    def _load(self, stream: str):
+        path = self._path(stream)
+        if not path.exists():
+            return None, {}
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            return header, {row[0]: row for row in reader}
+
+    def _save(self, stream: str, header, rows: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(stream)
+        tmp = path.with_suffix(".csv.tmp")
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows.values())
+        os.replace(tmp, path)
+
+    def _upsert(self, stream, header, rows):
+        _, existing = self._load(stream)
+        for row in rows:
+            existing[str(row[0])] = ["" if v is None else v for v in row]
+        self._save(stream, header, existing)
+
+    def _delete(self, stream, keys):
+        header, existing = self._load(stream)
+        if header is None:
+            return
+        for key in keys:
+            existing.pop(str(key), None)
+        self._save(stream, header, existing)
+
+    async def upsert(self, stream, header, rows):
+        await asyncio.to_thread(self._upsert, stream, header, rows)
+
+    async def delete(self, stream, keys):
+        await asyncio.to_thread(self._delete, stream, keys)
+
+class SqliteSink(SyncSink):
+    """
+    One table per stream in a SQLite file, keyed on the first column.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._tables = set()
+
+    def _connect(self):
+        if self._conn is None:
+            # Used from asyncio.to_thread workers, one call at a time
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self._conn
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    def _upsert(self, stream, header, rows):
+        conn = self._connect()
+        table = self._quote(stream)
+        if stream not in self._tables:
+            columns = ", ".join(
+                self._quote(h) + (" PRIMARY KEY" if i == 0 else "") for i, h in enumerate(header)
+            )
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            self._tables.add(stream)
+        placeholders = ", ".join("?" for _ in header)
+        with conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+
+    def _delete(self, stream, keys):
+        if stream not in self._tables and not self._has_table(stream):
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                f"DELETE FROM {self._quote(stream)} WHERE {self._key_column(stream)} = ?",
+                [(key,) for key in keys]
+            )
+
+    def _has_table(self, stream) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (stream,)
+        ).fetchone()
+        return row is not None
+
+    def _key_column(self, stream) -> str:
+        info = self._connect().execute(f"PRAGMA table_info({self._quote(stream)})").fetchall()
+        return self._quote(info[0][1])
+
+    async def upsert(self, stream, header, rows):
+        await asyncio.to_thread(self._upsert, stream, header, rows)
+
+    async def delete(self, stream, keys):
+        await asyncio.to_thread(self._delete, stream, keys)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class SheetsSink(SyncSink):
+    """
+    One worksheet per stream in a Google Spreadsheet (header in row 1).
+    Keeps a key -> row number map per sheet, so a batch is one batch_update
+    for changed rows plus one append for new ones. Needs gspread.
+    """
+    def __init__(self, spreadsheet_key: str, credentials_file: str):
+        try:
+            import gspread
+        except ImportError:
+            raise ValueError("The Sheets sync sink needs gspread (pip install gspread)")
+        self._client = gspread.service_account(filename=credentials_file)
+        self._book = self._client.open_by_key(spreadsheet_key)
+        self._sheets = {} # stream -> worksheet
+        self._rows = {} # stream -> {key: row number}
+
+    def _sheet(self, stream, header=None):
+        if stream in self._sheets:
+            return self._sheets[stream]
+        import gspread
+        try:
+            sheet = self._book.worksheet(stream)
+        except gspread.WorksheetNotFound:
+            if header is None:
+                return None
+            sheet = self._book.add_worksheet(stream, rows=1000, cols=len(header))
+            sheet.append_row(header, value_input_option="RAW")
+        self._sheets[stream] = sheet
+        self._load_index(stream)
+        return sheet
+
+    def _load_index(self, stream):
+        keys = self._sheets[stream].col_values(1)[1:] # Skip header
+        self._rows[stream] = {key: i + 2 for i, key in enumerate(keys) if key}
+
+    def _upsert(self, stream, header, rows):
+        sheet = self._sheet(stream, header)
+        index = self._rows[stream]
+        rows = [["" if v is None else v for v in row] for row in rows]
+        updates = [
+            {"range": f"A{index[str(row[0])]}", "values": [row]}
+            for row in rows if str(row[0]) in index
+        ]
+        new = [row for row in rows if str(row[0]) not in index]
+        if updates:
+            sheet.batch_update(updates, value_input_option="RAW")
+        if new:
+            sheet.append_rows(new, value_input_option="RAW")
+            self._load_index(stream)
+
+    def _delete(self, stream, keys):
+        sheet = self._sheet(stream)
+        if sheet is None:
+            return
+        index = self._rows[stream]
+        # Bottom-up so earlier row numbers stay valid
+        for row_number in sorted((index[str(k)] for k in keys if str(k) in index), reverse=True):
+            sheet.delete_rows(row_number)
+        self._load_index(stream)
+
+    async def upsert(self, stream, header, rows):
+        await asyncio.to_thread(self._upsert, stream, header, rows)
+
+    async def delete(self, stream, keys):
+        await asyncio.to_thread(self._delete, stream, keys)
+
+def make_sink(spec: str, credentials_file: str = None) -> SyncSink:
+    """
+    "csv:/dir", "sqlite:/path.db" or "sheets:<spreadsheet key>".
+    """
+    kind, sep, target = spec.partition(":")
+    if not sep or not target:
+        raise ValueError(f"Bad sync sink '{spec}'")
+    if kind == "csv":
+        return CsvSink(target)
+    if kind == "sqlite":
+        return SqliteSink(target)
+    if kind == "sheets":
+        return SheetsSink(target, credentials_file)
+    raise ValueError(f"Unknown sync sink '{kind}'")
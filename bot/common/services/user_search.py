@@ -0,0 +1,106 @@
+import re
+import time
+from typing import List, Tuple
+
+from sqlalchemy import select, func, case, or_, literal_column, text
+from sqlalchemy.orm import joinedload
+
+from bot.common.database.core import async_session_factory
+from bot.common.database.models import User
+from bot.common.services.ngram import NGramIndex
+
+# Same expression as the ix_users_phone_trgm index (constants, so the planner can match it)
+PHONE_DIGITS_SQL = "regexp_replace(coalesce(users.phone, ''), '[^0-9]', '', 'g')"
+MIN_QUERY_LENGTH = 3
+# How long the pg_trgm check / the fallback index stay valid (seconds)
+TRGM_CHECK_TTL = 600
+FALLBACK_TTL = 60
+
+_trgm = {"available": None, "checked_at": 0.0}
+_fallback = {"index": None, "built_at": 0.0}
+
+async def _trgm_available() -> bool:
+    now = time.monotonic()
+    if _trgm["available"] is None or now - _trgm["checked_at"] > TRGM_CHECK_TTL:
+        async with async_session_factory() as session:
+            found = await session.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+        _trgm["available"], _trgm["checked_at"] = found is not None, now
+    return _trgm["available"]
+
+def _like_pattern(query: str) -> str:
+    # Match % and _ literally
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+async def _search_trgm(query: str, limit: int) -> List[Tuple[User, float]]:
+    """
+    One query: the %> (word similarity) and ILIKE conditions are served by the
+    trigram GIN indexes on full_name, zelle and phone digits.
+    """
+    digits = re.sub(r"\D", "", query)
+    like = _like_pattern(query)
+    phone_digits = literal_column(PHONE_DIGITS_SQL)
+    phone_match = phone_digits.like(f"%{digits}%") if len(digits) >= MIN_QUERY_LENGTH else None
+
+    conditions = [
+        User.full_name.op("%>")(query), User.full_name.ilike(like, escape="\\"),
+        User.zelle.op("%>")(query), User.zelle.ilike(like, escape="\\"),
+    ]
+    scores = [
+        func.word_similarity(query, func.coalesce(User.full_name, "")),
+        func.word_similarity(query, func.coalesce(User.zelle, "")),
+        case((User.full_name.ilike(like, escape="\\"), 1.0), else_=0.0),
+        case((User.zelle.ilike(like, escape="\\"), 1.0), else_=0.0),
+    ]
+    if phone_match is not None:
+        conditions.append(phone_match)
+        scores.append(case((phone_match, 1.0), else_=0.0))
+
+    score = func.greatest(*scores).label("score")
+    stmt = (
+        select(User, score)
+        .options(joinedload(User.location))
+        .where(or_(*conditions))
+        .order_by(score.desc(), User.full_name)
+        .limit(limit)
+    )
+    async with async_session_factory() as session:
+        result = await session.execute(stmt)
+        return [(user, float(s)) for user, s in result.unique().all()]
+
+async def _fallback_index() -> NGramIndex:
+    now = time.monotonic()
+    if _fallback["index"] is None or now - _fallback["built_at"] > FALLBACK_TTL:
+        async with async_session_factory() as session:
+            rows = (await session.execute(select(User.user_id, User.full_name, User.phone, User.zelle))).all()
+        index = NGramIndex()
+        for user_id, full_name, phone, zelle in rows:
+            index.add(user_id, full_name, zelle, re.sub(r"\D", "", phone or ""))
+        _fallback["index"], _fallback["built_at"] = index, now
+    return _fallback["index"]
+
+async def _search_fallback(query: str, limit: int) -> List[Tuple[User, float]]:
+    index = await _fallback_index()
+    matches = index.search(query, limit)
+    if not matches:
+        return []
+    async with async_session_factory() as session:
+        result = await session.execute(
+            select(User).options(joinedload(User.location)).where(User.user_id.in_([m[0] for m in matches]))
+        )
+        users = {u.user_id: u for u in result.unique().scalars().all()}
+    return [(users[user_id], score) for user_id, score in matches if user_id in users]
+
+async def search_users(query: str, limit: int = 10) -> Tuple[List[Tuple[User, float]], bool]:
+    """
+    Fuzzy search over name, Zelle and phone digits, best match first.
+    Returns (matches, used_trigram_index). Uses pg_trgm when the extension
+    is installed, otherwise an in-memory trigram index rebuilt every FALLBACK_TTL.
+    Raises ValueError for queries shorter than MIN_QUERY_LENGTH.
+    """
+    query = " ".join(query.split())
+    if len(query) < MIN_QUERY_LENGTH:
+        raise ValueError(f"Search needs at least {MIN_QUERY_LENGTH} characters")
+    if await _trgm_available():
+        return await _search_trgm(query, limit), True
+    return await _search_fallback(query, limit), False
@@ -1,20 +1,34 @@
 from aiogram import Router, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import (
+    Message, ReplyKeyboardMarkup, KeyboardButton, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums import ChatAction, ChatType
-from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import func
 import math
 
 from bot.common.services.geocoding import get_location_by_query, get_location_by_coords
 from bot.common.services.i18n import t
-from bot.common.database.core import async_session_factory
-from bot.common.database.models import User as DBUser, Location as DBLocation
-from bot.common.data.locations import US_STATES, US_CITIES
+from bot.common.services.location_store import save_location
+from bot.common.services.live_location import LiveLocationThrottle
+from bot.common.config import settings
+from bot.common.services.gazetteer import places
+from bot.common.data.locations import US_STATE_NAMES, find_city
 
 router = Router()
 
+# Biggest places of a state offered in the city menu; the rest via search
+MAX_MENU_CITIES = 50
+PLACE_PREFIX = "📍 "
+
+live_throttle = LiveLocationThrottle(
+    min_distance_m=settings.LIVE_LOCATION_MIN_METERS,
+    min_interval=settings.LIVE_LOCATION_MIN_INTERVAL,
+    heartbeat=settings.LIVE_LOCATION_HEARTBEAT,
+    cell_deg=settings.LIVE_LOCATION_CELL_DEG
+)
+
 class LocationStates(StatesGroup):
     waiting_for_manual_city = State() 
     browsing_states = State()
@@ -46,8 +60,8 @@ async def cmd_manual_selection(message: Message, state: FSMContext):
     await show_states_menu(message, page=0)
 
 async def show_states_menu(message: Message | CallbackQuery, page=0):
-    # Pagination for States
-    items = list(US_STATES.items()) # [(code, name), ...]
+    # Pagination for States (every state in the gazetteer)
+    items = sorted(((code, US_STATE_NAMES.get(code, code)) for code in places.state_codes()), key=lambda x: x[1])
     ITEMS_PER_PAGE = 10
     total_pages = math.ceil(len(items) / ITEMS_PER_PAGE)
     start = page * ITEMS_PER_PAGE
@@ -72,6 +86,7 @@ async def show_states_menu(message: Message | CallbackQuery, page=0):
         nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"state_page_{page+1}"))
     if nav_row:
         buttons.append(nav_row)
+    buttons.append([InlineKeyboardButton(text=t("search_city_btn"), switch_inline_query_current_chat="")])
         
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     
@@ -90,13 +105,13 @@ async def cb_state_page(callback: CallbackQuery):
 @router.callback_query(F.data.startswith("set_state_"))
 async def cb_state_selected(callback: CallbackQuery, state: FSMContext):
     state_code = callback.data.split("_")[2]
-    state_name = US_STATES.get(state_code, state_code)
+    state_name = US_STATE_NAMES.get(state_code, state_code)
     
     await state.update_data(selected_state=state_name, selected_state_code=state_code)
     await show_cities_menu(callback, state_code, page=0) # Pass state_code explicitly or via retrieval
 
 async def show_cities_menu(callback: CallbackQuery, state_code: str, page=0):
-    cities = US_CITIES.get(state_code, []) # List of strings
+    cities = places.state_places(state_code)[:MAX_MENU_CITIES] # Place ids, most populous first
     
     ITEMS_PER_PAGE = 10
     total_pages = math.ceil(len(cities) / ITEMS_PER_PAGE)
@@ -106,9 +121,8 @@ async def show_cities_menu(callback: CallbackQuery, state_code: str, page=0):
     
     buttons = []
     row = []
-    for city in page_items:
-        cb_data = f"set_city_{city}"[:64]
-        row.append(InlineKeyboardButton(text=city, callback_data=cb_data))
+    for place_id in page_items:
+        row.append(InlineKeyboardButton(text=places.names[place_id], callback_data=f"set_place_{place_id}"))
         if len(row) == 2:
             buttons.append(row)
             row = []
@@ -124,7 +138,10 @@ async def show_cities_menu(callback: CallbackQuery, state_code: str, page=0):
     if nav_row:
         buttons.append(nav_row)
 
-    buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="back_to_states")])
+    buttons.append([
+        InlineKeyboardButton(text="🔙 Back", callback_data="back_to_states"),
+        InlineKeyboardButton(text=t("search_city_btn"), switch_inline_query_current_chat=f"{state_code} ")
+    ])
     
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     await callback.message.edit_text(t("enter_city"), reply_markup=kb, parse_mode="HTML")
@@ -143,28 +160,83 @@ async def cb_back_states(callback: CallbackQuery):
     await show_states_menu(callback, page=0)
     await callback.answer()
 
+async def save_place(user_id: int, place_id: int):
+    """
+    Saves a gazetteer place as the driver's location. Returns (State, City) or None.
+    """
+    state_name = US_STATE_NAMES.get(places.states[place_id], places.states[place_id])
+    city_name = places.names[place_id]
+    success = await save_location(user_id, city_name, state_name, places.lats[place_id], places.lons[place_id])
+    return (state_name, city_name) if success else None
+
+@router.callback_query(F.data.startswith("set_place_"))
+async def cb_place_selected(callback: CallbackQuery):
+    place_id = int(callback.data.replace("set_place_", ""))
+    if not 0 <= place_id < len(places):
+        await callback.answer()
+        return
+
+    saved = await save_place(callback.from_user.id, place_id)
+    if not saved:
+         await callback.message.answer("⚠️ <b>User not found!</b>\nPlease run /start to register first.", parse_mode="HTML")
+         return
+
+    state_name, city_name = saved
+    await callback.message.delete()
+    await callback.message.answer(t("location_saved", state=state_name, city=city_name), parse_mode="HTML")
+    await callback.answer()
+
+# Autocomplete: typing "@bot Nap" suggests "Naperville, IL" from the local gazetteer
+@router.inline_query()
+async def inline_city_search(query: InlineQuery):
+    results = [
+        InlineQueryResultArticle(
+            id=str(place_id),
+            title=places.label(place_id),
+            description=US_STATE_NAMES.get(places.states[place_id], ""),
+            input_message_content=InputTextMessageContent(message_text=f"{PLACE_PREFIX}{places.label(place_id)}")
+        )
+        for place_id in places.search(query.query, limit=20)
+    ]
+    await query.answer(results, cache_time=3600, is_personal=False)
+
+@router.message(F.via_bot, F.text.startswith(PLACE_PREFIX), F.chat.type == ChatType.PRIVATE)
+async def handle_inline_place(message: Message, state: FSMContext):
+    if message.via_bot.id != message.bot.id:
+        return
+    city, _, state_code = message.text.removeprefix(PLACE_PREFIX).rpartition(", ")
+    place_id = places.lookup(city, state_code)
+    if place_id is None:
+        await message.answer(t("location_not_found"), parse_mode="HTML")
+        return
+
+    saved = await save_place(message.from_user.id, place_id)
+    if not saved:
+         await message.answer("⚠️ <b>User not found!</b>\nPlease run /start to register first.", parse_mode="HTML")
+         return
+
+    await state.clear()
+    state_name, city_name = saved
+    await message.answer(t("location_saved", state=state_name, city=city_name), parse_mode="HTML")
+
+# City buttons sent before the gazetteer-driven menus
+@router.callback_query(F.data.startswith("set_city_"))
+async def cb_city_selected(callback: CallbackQuery, state: FSMContext):
     city_name = callback.data.replace("set_city_", "")
     data = await state.get_data()
     state_name = data.get("selected_state", "Unknown")
     
-    # Resolving coordinates for manual selection
+    # Menu cities ship with coordinates; geocode only if the catalog lacks one
     lat, lon = 0.0, 0.0
-    try:
-        query = f"{city_name}, {state_name}"
-        # Running in executor to avoid blocking event loop
-        import asyncio
-        from bot.common.services.geocoding import get_location_by_query
-        
-        loop = asyncio.get_running_loop()
-        # Run blocking geocode in separate thread
-        loc_res = await loop.run_in_executor(None, get_location_by_query, query)
-        
+    catalog_res = find_city(city_name, data.get("selected_state_code"))
+    if catalog_res:
+        _, _, lat, lon = catalog_res
+    else:
+        loc_res = await get_location_by_query(f"{city_name}, {state_name}")
         if loc_res:
             _, _, lat, lon = loc_res
-    except Exception as e:
-        print(f"Manual geocoding failed: {e}")
     
-    success = await save_location(callback.from_user.id, state_name, city_name, lat, lon)
+    success = await save_location(callback.from_user.id, city_name, state_name, lat, lon)
     
     if not success:
          await callback.message.answer("⚠️ <b>User not found!</b>\nPlease run /start to register first.", parse_mode="HTML")
@@ -180,14 +252,18 @@ async def handle_location(message: Message, state: FSMContext):
     lat = message.location.latitude
     lon = message.location.longitude
     
-    # Use existing reverse geocoding service
-    res_state, res_city, _, _ = get_location_by_coords(lat, lon)
+    # Offline gazetteer first, Nominatim only outside coverage
+    res_state, res_city, _, _ = await get_location_by_coords(lat, lon)
     
     success = await save_location(message.from_user.id, res_city, res_state, lat, lon)
     
     if not success:
          await message.answer("⚠️ <b>User not found!</b>\nPlease run /start to register first.", parse_mode="HTML")
          return
+
+    if message.location.live_period:
+        # Start of a live share: the edits that follow are throttled against this point
+        live_throttle.remember(message.from_user.id, lat, lon, res_state, res_city)
     
     await state.clear()
     await message.answer(t("location_saved", state=res_state, city=res_city), parse_mode="HTML")
@@ -204,38 +280,26 @@ async def handle_location(message: Message, state: FSMContext):
     # The user wanted something like "Thank you" instead of "Menu"
     await message.answer(t("menu_text_thank_you"), reply_markup=kb, parse_mode="HTML")
 
-async def save_location(user_id, city, state, lat, lon):
-    async with async_session_factory() as session:
-        # Check if user exists first or handle integrity error
-        # Just checking is cleaner for logic flow here
-        from sqlalchemy import select
-        user_exists = await session.scalar(select(DBUser).where(DBUser.user_id == user_id))
-        if not user_exists:
-            return False
-
-        stmt = insert(DBLocation).values(
-            user_id=user_id,
-            city=city,
-            state=state,
-            latitude=lat,
-            longitude=lon
-        ).on_conflict_do_update(
-            index_elements=['user_id'],
-            set_=dict(
-                city=city,
-                state=state,
-                latitude=lat,
-                longitude=lon,
-                updated_at=func.now()
-            )
-        )
-        await session.execute(stmt)
-        
-        # Update User last_active_at
-        from sqlalchemy import update
-        await session.execute(
-            update(DBUser).where(DBUser.user_id == user_id).values(last_active_at=func.now())
-        )
-        
-        await session.commit()
-        return True
+@router.edited_message(F.location, F.chat.type == ChatType.PRIVATE)
+async def handle_live_location(message: Message):
+    """
+    Live location updates arrive as edits of the shared message every few seconds.
+    Most are dropped by live_throttle; accepted ones reuse the cell's place name
+    and go through the write-behind buffer. Silent: no replies.
+    """
+    user_id = message.from_user.id
+    lat = message.location.latitude
+    lon = message.location.longitude
+
+    accept, place = live_throttle.check(user_id, lat, lon)
+    if not accept:
+        return
+
+    if place:
+        res_state, res_city = place
+    else:
+        res_state, res_city, _, _ = await get_location_by_coords(lat, lon)
+
+    # Remembered even for unregistered users, so their stream is throttled too
+    await save_location(user_id, res_city, res_state, lat, lon, buffered=True)
+    live_throttle.remember(user_id, lat, lon, res_state, res_city)
@@ -12,13 +12,15 @@ from bot.keyboards.common import get_lang_keyboard
 from bot.common.services.i18n import t, set_lang
 from bot.common.database.core import async_session_factory
 from bot.common.database.models import User as DBUser
+from bot.common.services.profiles import UserProfile
+from bot.common.services.outbox import driver_outbox, message_job, photo_job
 from bot.common.config import settings
 # Removed circular import of notify_user_callback
 
 router = Router()
 
 @router.message(CommandStart(), F.chat.type == ChatType.PRIVATE)
-async def cmd_start(message: Message, state: FSMContext, user_lang: str = "en", db_user: DBUser = None):
+async def cmd_start(message: Message, state: FSMContext, user_lang: str = "en", db_user: UserProfile = None):
     if db_user and db_user.status == "active":
         await message.answer(t("welcome_back") or "Welcome back!") # TODO: Add menu
         return
@@ -124,24 +126,25 @@ async def process_photo(message: Message, state: FSMContext, bot: Bot):
             [InlineKeyboardButton(text="✅ Approve Driver", callback_data=f"approve_{message.from_user.id}")]
         ])
         
+        # Queued: delivery (and retries) happen in the outbox workers
         if data['dl_photo_id']:
-             await message.bot.send_photo(
+             await driver_outbox.enqueue(photo_job(
                  settings.ADMIN_GROUP_ID, 
                  data['dl_photo_id'], 
                  caption=msg, 
-                 parse_mode="HTML", 
-                 reply_markup=kb
-             )
+                 reply_markup=kb,
+                 tag="new_driver"
+             ))
         else:
-             await message.bot.send_message(
+             await driver_outbox.enqueue(message_job(
                  settings.ADMIN_GROUP_ID, 
                  msg + "\n\n⚠️ <b>No DL Photo provided!</b>", 
-                 parse_mode="HTML", 
-                 reply_markup=kb
-             )
+                 reply_markup=kb,
+                 tag="new_driver"
+             ))
     except Exception as e:
         # Failure to notify group shouldn't crash the user flow, but we should log it
-        # Likely cause: Bot not in group or ID wrong.
+        # Likely cause: Redis unavailable. Undeliverable alerts end up in the outbox dead letters.
         print(f"Failed to notify Admin Group: {e}")
         await message.answer("⚠️ System Warning: Could not notify dispatchers. Please contact admin manually.")
 
@@ -177,12 +180,7 @@ async def cb_approve(callback: CallbackQuery):
             is_persistent=True
         )
         
-        await callback.bot.send_message(
-            target_id, 
-            t("profile_approved"),
-            reply_markup=kb,
-            parse_mode="HTML"
-        )
+        await driver_outbox.enqueue(message_job(target_id, t("profile_approved"), reply_markup=kb, tag="approved"))
         
     except Exception as e:
         print(f"Approval error: {e}")
@@ -3,12 +3,22 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-from redis.asyncio import Redis
 
 from bot.common.config import settings
+from bot.common.database.redis import redis
 from bot.common.database.core import init_db
-from bot.common.services.listener import DBListener
-from bot.common.services.scheduler import check_inactive_drivers
+from bot.common.services.listener import DBListener, listener_stats
+from bot.common.services.events import ProfileInvalidation
+from bot.common.services.geocoding import geocoder, geocode_cache_stats
+from bot.common.services.profiles import on_profile_events, flush_profiles, publish_cache_stats
+from bot.common.services.scheduler import process_due_reminders, seed_reminders
+from bot.common.services.rating import recompute_all_ratings
+from bot.common.services.location_store import location_writer
+from bot.common.services.outbox import driver_outbox, message_job
+from bot.common.services.location_history import maintain_partitions
+from bot.common.services.sync import run_sync
+from bot.common.services.sync_sinks import make_sink
+from bot.common.services.lease import singleton_job
 from bot.driver.handlers import registration, location, help
 from bot.middlewares.i18n import I18nMiddleware
 
@@ -28,21 +38,27 @@ async def notify_user_callback(channel, payload, bot: Bot):
                 is_persistent=True
             )
             
-            await bot.send_message(
+            await driver_outbox.enqueue(message_job(
                 user_id, 
                 "✅ <b>Profile Approved!</b>\n\n"
                 "Please share your current location so we can send you orders.\n"
                 "<i>Click the button below:</i>",
                 reply_markup=kb,
-                parse_mode="HTML"
-            )
+                tag="approved"
+            ))
         except Exception as e:
             logging.error(f"Failed to notify user {payload}: {e}")
 
+async def publish_stats():
+    await publish_cache_stats({
+        "geocoding": geocode_cache_stats(),
+        "live_location": location.live_throttle.stats(),
+        "listeners": listener_stats(),
+    })
+
 async def main():
     logging.basicConfig(level=logging.INFO)
     
-    redis = Redis(host='redis')
     storage = RedisStorage(redis=redis)
     
     bot = Bot(token=settings.DRIVER_BOT_TOKEN.get_secret_value())
@@ -57,25 +73,52 @@ async def main():
     dp.include_router(help.router)
 
     await init_db()
+    # Daily location_history partitions, so new rows don't land in the default one
+    await maintain_partitions()
     
     # Start DB Listener
     # Removed 'user_approved' listener as it is now handled directly in registration handler
-    listener = DBListener(
-        settings.database_url, 
-        [], 
-        lambda c, p: None
-    )
+    # user_profile keeps the middleware's profile cache fresh; notifications may
+    # have been missed while disconnected, so every (re)connect starts from empty.
+    listener = DBListener(settings.database_url, name="driver", on_connect=flush_profiles)
+    listener.on("user_profile", on_profile_events, parse=ProfileInvalidation.parse, batch=True)
     asyncio.create_task(listener.start())
     
     # Start Scheduler
+    # Every replica runs the same schedule; singleton_job makes one of them run each tick
+    # (publish_stats stays per process)
     scheduler = AsyncIOScheduler()
-    # Check every 30 mins for drivers inactive > 12h
-    scheduler.add_job(check_inactive_drivers, 'interval', minutes=30, args=[bot, settings.database_url, 12]) 
+    # Inactivity reminders: location saves keep each driver's due time in Redis,
+    # this only pops the entries that are due
+    await seed_reminders()
+    scheduler.add_job(singleton_job("reminders", process_due_reminders, 60), 'interval', minutes=1, max_instances=1)
+    # Cache hit ratios for the admin /cache command
+    scheduler.add_job(publish_stats, 'interval', minutes=1)
+    # Nightly: decay ratings of drivers without new orders, apply formula changes
+    scheduler.add_job(singleton_job("recompute_ratings", recompute_all_ratings, 86400), 'cron', hour=settings.RATING_RECOMPUTE_HOUR, minute=0)
+    # Create upcoming location_history partitions, drop expired ones
+    scheduler.add_job(singleton_job("history_partitions", maintain_partitions, 6 * 3600), 'interval', hours=6)
+    # Incremental mirror (e.g. dispatchers' Google Sheet): only rows changed since the last run
+    sync_sink = make_sink(settings.SYNC_SINK, settings.GOOGLE_CREDENTIALS_FILE) if settings.SYNC_SINK else None
+    if sync_sink:
+        scheduler.add_job(
+            singleton_job("sync", run_sync, settings.SYNC_INTERVAL_MINUTES * 60),
+            'interval', minutes=settings.SYNC_INTERVAL_MINUTES, args=[sync_sink], max_instances=1
+        )
     scheduler.start()
+    # Reminders, approval notices and admin alerts are queued; workers send them rate-limited
+    await driver_outbox.start(bot)
 
     try:
         await dp.start_polling(bot)
     finally:
+        # Buffered positions must reach the database before the process exits
+        await location_writer.close()
+        await listener.close()
+        await driver_outbox.close()
+        if sync_sink:
+            await sync_sink.close()
+        await geocoder.close()
         await bot.session.close()
 
 if __name__ == "__main__":
@@ -1,10 +1,8 @@
 from typing import Any, Dict, Callable, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, User
-from sqlalchemy.future import select
 from bot.common.services.i18n import t, set_lang
-from bot.common.database.core import async_session_factory
-from bot.common.database.models import User as DBUser
+from bot.common.services.profiles import get_profile
 
 class I18nMiddleware(BaseMiddleware):
     async def __call__(
@@ -18,24 +16,23 @@ class I18nMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        async with async_session_factory() as session:
-            result = await session.execute(select(DBUser).where(DBUser.user_id == user.id))
-            db_user = result.scalar_one_or_none()
+        # Cached slim profile: no DB round-trip on the common path
+        profile = await get_profile(user.id)
+
+        if profile:
+            set_lang(profile.language)
+            data["user_lang"] = profile.language
+            data["db_user"] = profile
+        else:
+            # Try to get lang from FSM if not in DB
+            state = data.get("state")
+            fsm_lang = "en"
+            if state:
+                fsm_data = await state.get_data()
+                fsm_lang = fsm_data.get("language", "en")
             
-            if db_user:
-                set_lang(db_user.language)
-                data["user_lang"] = db_user.language
-                data["db_user"] = db_user
-            else:
-                # Try to get lang from FSM if not in DB
-                state = data.get("state")
-                fsm_lang = "en"
-                if state:
-                    fsm_data = await state.get_data()
-                    fsm_lang = fsm_data.get("language", "en")
-                
-                set_lang(fsm_lang)
-                data["user_lang"] = fsm_lang
-                data["db_user"] = None
+            set_lang(fsm_lang)
+            data["user_lang"] = fsm_lang
+            data["db_user"] = None
         
         return await handler(event, data)
@@ -0,0 +1,59 @@
+"""
+Benchmark: /find nearest-driver ranking.
+Old path: per-driver geopy geodesic in a Python loop + full sort.
+New path: rank_nearest (vectorized haversine + argpartition top-K).
+
+Usage: python -m scripts.bench_nearest [drivers ...]
+"""
+import random
+import sys
+import timeit
+
+import numpy as np
+
+from bot.common.services.geocoding import rank_nearest, calculate_distance
+
+try:
+    from geopy.distance import geodesic
+except ImportError:
+    geodesic = None
+
+def loop_rank(t_lat, t_lon, drivers, k=10):
+    results = []
+    for lat, lon in drivers:
+        if geodesic is not None:
+            dist = geodesic((t_lat, t_lon), (lat, lon)).miles
+        else:
+            dist = calculate_distance(t_lat, t_lon, lat, lon)
+        results.append((lat, lon, dist))
+    results.sort(key=lambda x: x[2])
+    return results[:k]
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000, 20000]
+    rnd = random.Random(1)
+    t_lat, t_lon = 41.8781, -87.6298 # Chicago
+
+    baseline = "geopy geodesic loop" if geodesic else "haversine loop (geopy not installed)"
+    print(f"{'drivers':>8} | {baseline:>36} | {'rank_nearest':>12} | speedup")
+    for n in sizes:
+        drivers = [(rnd.uniform(25, 49), rnd.uniform(-124, -67)) for _ in range(n)]
+        lats = np.array([d[0] for d in drivers])
+        lons = np.array([d[1] for d in drivers])
+
+        # Same winners (geodesic vs haversine may swap near-ties, compare distances loosely)
+        idx, dists = rank_nearest(t_lat, t_lon, lats, lons, k=10)
+        expected = [r[2] for r in loop_rank(t_lat, t_lon, drivers)]
+        assert np.allclose(dists, expected, rtol=5e-3), "rankings differ"
+
+        reps = max(1, 20000 // n)
+        t_loop = timeit.timeit(lambda: loop_rank(t_lat, t_lon, drivers), number=reps) / reps
+        # Array build is included: /find builds arrays from the fetched rows every call
+        t_vec = timeit.timeit(
+            lambda: rank_nearest(t_lat, t_lon, np.array([d[0] for d in drivers]), np.array([d[1] for d in drivers]), k=10),
+            number=reps * 10
+        ) / (reps * 10)
+        print(f"{n:>8} | {t_loop * 1000:>33.2f} ms | {t_vec * 1000:>9.3f} ms | {t_loop / t_vec:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
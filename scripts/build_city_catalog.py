@@ -0,0 +1,81 @@
+"""
+Build-time generator for bot/common/data/us_cities.tsv: coordinates for every
+city in the US_CITIES menus, so manual selection never geocodes at runtime.
+
+Each city is resolved from the bundled gazetteer first; only names it does
+not know go to Nominatim (1 request/second, per the OSM usage policy).
+Re-run after editing US_CITIES and commit the generated file.
+
+Usage: python -m scripts.build_city_catalog [--offline]
+"""
+import csv
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from bot.common.data.locations import US_CITIES, US_STATE_NAMES, CATALOG_PATH
+from bot.common.services.gazetteer import places
+
+NOMINATIM_URL = os.environ.get("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+USER_AGENT = "TeamHub_City_Catalog"
+
+# Menu label -> gazetteer name, where they differ
+ALIASES = {
+    ("GA", "Augusta-Richmond"): "Augusta",
+}
+
+def from_gazetteer(state_code: str, city: str):
+    name = ALIASES.get((state_code, city), city).lower()
+    for i, (state, place) in enumerate(zip(places.states, places.names)):
+        if state == state_code and place.lower() == name:
+            return places.lats[i], places.lons[i]
+    return None
+
+def from_nominatim(state_code: str, city: str):
+    params = urllib.parse.urlencode({
+        "city": ALIASES.get((state_code, city), city),
+        "state": US_STATE_NAMES[state_code],
+        "country": "United States",
+        "format": "jsonv2",
+        "limit": 1,
+    })
+    req = urllib.request.Request(f"{NOMINATIM_URL}/search?{params}", headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        results = json.load(resp)
+    time.sleep(1.0)
+    if not results:
+        return None
+    return float(results[0]["lat"]), float(results[0]["lon"])
+
+def main():
+    offline = "--offline" in sys.argv[1:]
+    rows = []
+    missing = []
+    for state_code, cities in US_CITIES.items():
+        for city in cities:
+            coords = from_gazetteer(state_code, city)
+            source = "gazetteer"
+            if coords is None and not offline:
+                coords = from_nominatim(state_code, city)
+                source = "nominatim"
+            if coords is None:
+                missing.append(f"{city}, {state_code}")
+                continue
+            rows.append((state_code, city, f"{coords[0]:.4f}", f"{coords[1]:.4f}"))
+            print(f"{state_code:>2} {city:<20} {coords[0]:9.4f} {coords[1]:10.4f} ({source})")
+
+    with open(CATALOG_PATH, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(("state", "city", "lat", "lon"))
+        writer.writerows(rows)
+
+    print(f"Wrote {len(rows)} cities to {CATALOG_PATH}")
+    if missing:
+        print(f"Unresolved ({len(missing)}): {'; '.join(missing)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Rebuilds bot/common/data/us_places.tsv from the Census Bureau Gazetteer
+place file (all incorporated places of the 50 states + DC).
+
+Inputs:
+- the national place Gazetteer file (.txt or .zip, local path or URL), e.g.
+  https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer/2023_Gaz_place_national.zip
+- optionally the city/town population estimates (SUB-EST*.csv) for ranking;
+  without it populations are kept from the current file where names match.
+
+Usage:
+  python -m scripts.build_gazetteer GAZ_FILE [--population SUB-EST.csv] [--include-cdp] [--out PATH]
+"""
+import argparse
+import csv
+import io
+import re
+import urllib.request
+import zipfile
+
+from bot.common.data.locations import US_STATE_NAMES
+from bot.common.services.gazetteer import DATA_PATH
+
+# Functional status codes of incorporated places (A/B/C active governments,
+# F the "balance" part of consolidated cities such as Nashville); S is a CDP
+INCORPORATED = {"A", "B", "C", "F"}
+
+# Census name -> name shown to drivers
+RENAMES = {
+    ("NY", "New York"): "New York City",
+}
+
+def open_text(source: str) -> io.TextIOBase:
+    if source.startswith("http"):
+        with urllib.request.urlopen(source, timeout=60) as resp:
+            data = resp.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    if data[:2] == b"PK":
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            name = next(n for n in zf.namelist() if n.endswith(".txt"))
+            data = zf.read(name)
+    return io.StringIO(data.decode("latin-1"))
+
+def clean_name(name: str) -> str:
+    # "Naperville city" -> "Naperville", "Nashville-Davidson metropolitan government (balance)" -> "Nashville-Davidson"
+    name = name.replace(" (balance)", "")
+    return re.sub(r"(\s+(?:[a-z]+|CDP))+$", "", name).strip()
+
+def read_populations(path: str) -> dict:
+    """
+    GEOID (state FIPS + place code) -> latest population estimate.
+    """
+    populations = {}
+    with open(path, "r", encoding="latin-1", newline="") as f:
+        reader = csv.DictReader(f)
+        column = sorted(c for c in reader.fieldnames if c.startswith("POPESTIMATE"))[-1]
+        for row in reader:
+            if row["PLACE"] in ("00000", "99990"):
+                continue
+            populations[row["STATE"] + row["PLACE"]] = int(row[column] or 0)
+    return populations
+
+def read_current() -> dict:
+    current = {}
+    with open(DATA_PATH, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f, delimiter="\t")
+        for row in reader:
+            current[(row["state"], row["name"])] = int(row["population"])
+    return current
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("gazetteer")
+    parser.add_argument("--population")
+    parser.add_argument("--include-cdp", action="store_true", help="Also keep census-designated (unincorporated) places")
+    parser.add_argument("--out", default=str(DATA_PATH))
+    args = parser.parse_args()
+
+    populations = read_populations(args.population) if args.population else {}
+    current = read_current()
+
+    rows = {}
+    reader = csv.DictReader(open_text(args.gazetteer), delimiter="\t")
+    reader.fieldnames = [c.strip() for c in reader.fieldnames]
+    for row in reader:
+        state = row["USPS"]
+        if state not in US_STATE_NAMES:
+            continue # Territories
+        if row["FUNCSTAT"] not in INCORPORATED and not args.include_cdp:
+            continue # Not an active incorporated place
+        name = clean_name(row["NAME"])
+        name = RENAMES.get((state, name), name)
+        population = populations.get(row["GEOID"], current.get((state, name), 0))
+        key = (state, name)
+        # Same name twice in a state (e.g. a city and a CDP): keep the bigger one
+        if key in rows and rows[key][4] >= population:
+            continue
+        rows[key] = (state, name, float(row["INTPTLAT"]), float(row["INTPTLONG"]), population)
+
+    ordered = sorted(rows.values(), key=lambda r: (r[0], -r[4], r[1]))
+    with open(args.out, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(("state", "name", "lat", "lon", "population"))
+        for state, name, lat, lon, population in ordered:
+            writer.writerow((state, name, f"{lat:.4f}", f"{lon:.4f}", population))
+
+    print(f"Wrote {len(ordered)} places ({len({r[0] for r in ordered})} states) to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# bot.common.config requires these; tests never talk to Telegram
+os.environ.setdefault("DRIVER_BOT_TOKEN", "123:abc")
+os.environ.setdefault("ADMIN_BOT_TOKEN", "456:def")
+os.environ.setdefault("ADMIN_GROUP_ID", "-100")
@@ -0,0 +1,375 @@
+"""
+In-memory stand-ins for Redis and the SQLAlchemy session factory, shared by the tests.
+"""
+import asyncio
+import fnmatch
+import math
+import operator
+
+from sqlalchemy.sql import elements, functions, operators
+
+def _b(value) -> bytes:
+    # redis-py sends everything as bytes and returns bytes (no decode_responses)
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).encode()
+
+def _key(key) -> str:
+    return key.decode() if isinstance(key, bytes) else key
+
+class FakePipeline:
+    """
+    Queues commands and runs them in order on execute(), like a non-transactional pipeline.
+    """
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+        return lambda *args, **kwargs: self.calls.append((command, args, kwargs))
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await command(*args, **kwargs) for command, args, kwargs in calls]
+
+class FakeRedis:
+    """
+    The string, hash, zset and list commands the services use, plus scripts.
+    Scripts are emulated in Python: set_script(source, handler) with
+    handler(keys, args); unknown scripts return 0. Every call is kept in
+    script_calls as (keys, args). TTLs are recorded, never enforced.
+    """
+    def __init__(self):
+        self.strings = {} # key -> bytes
+        self.hashes = {} # key -> {field: bytes}
+        self.zsets = {} # key -> {member: score}
+        self.lists = {} # key -> [bytes], index 0 = left
+        self.ttl_ms = {} # key -> last PX/EX set, in ms
+        self.scripts = {}
+        self.script_calls = []
+
+    # Helpers for assertions
+
+    def zset(self, key) -> dict:
+        return {m.decode(): score for m, score in self.zsets.get(key, {}).items()}
+
+    def hash(self, key) -> dict:
+        return {f.decode(): v.decode() for f, v in self.hashes.get(key, {}).items()}
+
+    def list(self, key) -> list:
+        return [v.decode() for v in self.lists.get(key, [])]
+
+    def set_script(self, source: str, handler):
+        self.scripts[source] = handler
+
+    def script_returns(self, source: str, values):
+        """
+        The script answers with `values` in turn, then 0.
+        """
+        values = list(values)
+
+        async def handler(keys, args):
+            return values.pop(0) if values else 0
+        self.set_script(source, handler)
+
+    # Connection-level
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, source: str):
+        async def script(keys=(), args=()):
+            self.script_calls.append((list(keys), list(args)))
+            handler = self.scripts.get(source)
+            return await handler(keys, args) if handler else 0
+        return script
+
+    async def scan_iter(self, match="*", count=None):
+        keys = set(self.strings) | set(self.hashes) | set(self.zsets) | set(self.lists)
+        for key in sorted(keys):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    async def exists(self, *keys):
+        return sum(
+            any(_key(k) in store for store in (self.strings, self.hashes, self.zsets, self.lists))
+            for k in keys
+        )
+
+    async def delete(self, *keys):
+        removed = 0
+        for key in map(_key, keys):
+            for store in (self.strings, self.hashes, self.zsets, self.lists):
+                if store.pop(key, None) is not None:
+                    removed += 1
+            self.ttl_ms.pop(key, None)
+        return removed
+
+    async def expire(self, key, seconds):
+        self.ttl_ms[_key(key)] = seconds * 1000
+        return 1
+
+    # Strings
+
+    async def get(self, key):
+        return self.strings.get(_key(key))
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        key = _key(key)
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = _b(value)
+        if ex is not None or px is not None:
+            self.ttl_ms[key] = px if px is not None else ex * 1000
+        return True
+
+    # Hashes
+
+    async def hset(self, key, field, value):
+        fields = self.hashes.setdefault(_key(key), {})
+        new = _b(field) not in fields
+        fields[_b(field)] = _b(value)
+        return int(new)
+
+    async def hget(self, key, field):
+        return self.hashes.get(_key(key), {}).get(_b(field))
+
+    async def hmget(self, key, fields):
+        values = self.hashes.get(_key(key), {})
+        return [values.get(_b(f)) for f in fields]
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(_key(key), {}))
+
+    async def hkeys(self, key):
+        return list(self.hashes.get(_key(key), {}))
+
+    async def hdel(self, key, *fields):
+        values = self.hashes.get(_key(key), {})
+        return sum(values.pop(_b(f), None) is not None for f in fields)
+
+    async def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(_key(key), {})
+        value = int(fields.get(_b(field), b"0")) + amount
+        fields[_b(field)] = _b(value)
+        return value
+
+    # Sorted sets
+
+    async def zadd(self, key, mapping, nx=False):
+        members = self.zsets.setdefault(_key(key), {})
+        added = 0
+        for member, score in mapping.items():
+            member = _b(member)
+            if nx and member in members:
+                continue
+            added += member not in members
+            members[member] = float(score)
+        return added
+
+    async def zrem(self, key, *members):
+        values = self.zsets.get(_key(key), {})
+        return sum(values.pop(_b(m), None) is not None for m in members)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(_key(key), {}))
+
+    async def zrangebyscore(self, key, lo, hi, start=None, num=None):
+        lo = float("-inf") if lo == "-inf" else float(lo)
+        hi = float("inf") if hi == "+inf" else float(hi)
+        members = sorted((s, m) for m, s in self.zsets.get(_key(key), {}).items() if lo <= s <= hi)
+        members = [m for _, m in members]
+        if start is not None:
+            members = members[start:start + num if num is not None else None]
+        return members
+
+    # Lists
+
+    async def lpush(self, key, *values):
+        items = self.lists.setdefault(_key(key), [])
+        for value in values:
+            items.insert(0, _b(value))
+        return len(items)
+
+    async def rpush(self, key, *values):
+        items = self.lists.setdefault(_key(key), [])
+        items.extend(_b(v) for v in values)
+        return len(items)
+
+    async def llen(self, key):
+        return len(self.lists.get(_key(key), []))
+
+    async def lrange(self, key, start, end):
+        items = self.lists.get(_key(key), [])
+        return items[start:None if end == -1 else end + 1]
+
+    async def ltrim(self, key, start, end):
+        key = _key(key)
+        self.lists[key] = self.lists.get(key, [])[start:None if end == -1 else end + 1]
+
+    async def lrem(self, key, count, value):
+        items = self.lists.get(_key(key), [])
+        removed = 0
+        while _b(value) in items and (count == 0 or removed < abs(count)):
+            items.remove(_b(value))
+            removed += 1
+        return removed
+
+    async def lmove(self, src, dst, wherefrom="LEFT", whereto="RIGHT"):
+        items = self.lists.get(_key(src))
+        if not items:
+            return None
+        value = items.pop(0 if wherefrom == "LEFT" else -1)
+        if not items:
+            del self.lists[_key(src)]
+        target = self.lists.setdefault(_key(dst), [])
+        if whereto == "LEFT":
+            target.insert(0, value)
+        else:
+            target.append(value)
+        return value
+
+    async def blmove(self, src, dst, timeout, wherefrom="LEFT", whereto="RIGHT"):
+        value = await self.lmove(src, dst, wherefrom, whereto)
+        if value is None:
+            await asyncio.sleep(min(timeout, 0.01))
+        return value
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=None):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+
+    def all(self):
+        return list(self.rows)
+
+    def one(self):
+        return self.rows[0]
+
+    def unique(self):
+        return self
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def scalar_one_or_none(self):
+        return self.scalar()
+
+    def scalars(self):
+        return FakeResult([(row[0],) for row in self.rows])
+
+class FakeSession:
+    """
+    Stands in for async_session_factory: calling it returns itself as the session.
+    Each execute is recorded in `executed` as (statement, params) and answered
+    by rows(statement, params). `fail` is raised by the next execute only;
+    with a `gate`, execute waits for it first (to catch a write in flight).
+    """
+    def __init__(self, rows=None):
+        self.rows = rows or (lambda stmt, params: [])
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail = None
+        self.gate = None
+        self.entered = asyncio.Event()
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt, params=None):
+        self.entered.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail is not None:
+            fail, self.fail = self.fail, None
+            raise fail
+        self.executed.append((stmt, params))
+        return FakeResult(self.rows(stmt, params))
+
+    async def scalar(self, stmt, params=None):
+        return (await self.execute(stmt, params)).scalar()
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+_OPERATORS = {
+    operator.add: operator.add, operator.sub: operator.sub,
+    operator.mul: operator.mul, operator.truediv: operator.truediv,
+    operators.eq: operator.eq, operators.ge: operator.ge, operators.le: operator.le,
+}
+
+_FUNCTIONS = {
+    "now": None, # handled with the row's clock
+    "power": math.pow,
+    "exp": math.exp,
+    "greatest": max,
+    "least": min,
+    "coalesce": lambda *args: next((a for a in args if a is not None), None),
+}
+
+def evaluate(expr, row: dict, now):
+    """
+    Evaluates a SQLAlchemy column expression in Python against `row`
+    ({column name: value}), with now() = `now`. Covers the arithmetic,
+    CASE and functions the rating SQL uses; anything else raises.
+    """
+    if isinstance(expr, elements.BindParameter):
+        return expr.value
+    if isinstance(expr, elements.Null):
+        return None
+    if isinstance(expr, (elements.Grouping, elements.Label)):
+        return evaluate(expr.element, row, now)
+    if isinstance(expr, elements.ColumnClause):
+        return row[expr.key]
+    if isinstance(expr, elements.ExpressionClauseList):
+        values = [evaluate(c, row, now) for c in expr.clauses]
+        result = values[0]
+        for value in values[1:]:
+            result = _OPERATORS[expr.operator](result, value)
+        return result
+    if isinstance(expr, elements.BinaryExpression):
+        left = evaluate(expr.left, row, now)
+        if expr.operator is operators.is_:
+            return left is evaluate(expr.right, row, now)
+        return _OPERATORS[expr.operator](left, evaluate(expr.right, row, now))
+    if isinstance(expr, elements.UnaryExpression) and expr.operator is operator.neg:
+        return -evaluate(expr.element, row, now)
+    if isinstance(expr, elements.Case):
+        for condition, result in expr.whens:
+            if evaluate(condition, row, now):
+                return evaluate(result, row, now)
+        return evaluate(expr.else_, row, now) if expr.else_ is not None else None
+    if isinstance(expr, elements.Extract) and expr.field == "epoch":
+        return evaluate(expr.expr, row, now).total_seconds()
+    if isinstance(expr, functions.FunctionElement) and expr.name in _FUNCTIONS:
+        if expr.name == "now":
+            return now
+        return _FUNCTIONS[expr.name](*[evaluate(c, row, now) for c in expr.clauses.clauses])
+    raise NotImplementedError(f"Can't evaluate {type(expr).__name__}: {expr}")
+
+def apply_update(stmt, row: dict, now):
+    """
+    Applies an UPDATE's SET clause to `row` as Postgres would: every value
+    is computed from the row as it was before the statement.
+    """
+    values = {column.key: evaluate(value, row, now) for column, value in stmt._values.items()}
+    row.update(values)
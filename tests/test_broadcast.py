@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import patch
+
+from bot.common.services import broadcast
+from bot.common.services.broadcast import BroadcastFilters, broadcast_progress, parse_broadcast_args
+
+class TestParseBroadcastArgs(unittest.TestCase):
+    def test_all_drivers(self):
+        filters = parse_broadcast_args([])
+        self.assertEqual(filters, BroadcastFilters())
+        self.assertEqual(filters.describe(), "all active drivers")
+
+    def test_seen_forms(self):
+        for args in (["6h"], ["seen=6"], ["seen=6h"], ["SEEN=6"]):
+            self.assertEqual(parse_broadcast_args(args).seen_within_hours, 6, msg=args)
+        self.assertEqual(parse_broadcast_args(["1.5h"]).seen_within_hours, 1.5)
+
+    def test_filters(self):
+        filters = parse_broadcast_args(["ny", "stale", "min=2", "max=4.5"])
+        self.assertEqual(filters, BroadcastFilters(state="NY", stale=True, min_rating=2, max_rating=4.5))
+        self.assertEqual(filters.describe(), "New York, not seen > 12h, ⭐️ ≥ 2, ⭐️ ≤ 4.5")
+
+    def test_stale_and_seen_exclude_each_other(self):
+        for args in (["stale", "6h"], ["seen=6", "stale"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_broadcast_args(args)
+
+    def test_out_of_range(self):
+        for args in (["min=0"], ["max=5.5"], ["min=-1"], ["seen=0"], ["seen=-2"], ["0h"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_broadcast_args(args)
+
+    def test_bad_input(self):
+        for args in (["min=x"], ["seen=soon"], ["foo=1"], ["XX"], ["h"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_broadcast_args(args)
+
+class FakeOutbox:
+    def __init__(self, stats):
+        self.stats = stats
+
+    async def tag_stats(self, tag):
+        self.tag = tag
+        return self.stats
+
+class TestBroadcastProgress(unittest.IsolatedAsyncioTestCase):
+    async def progress(self, stats):
+        outbox = FakeOutbox(stats)
+        with patch.object(broadcast, "driver_outbox", outbox):
+            progress = await broadcast_progress("abc")
+        self.assertEqual(outbox.tag, "broadcast:abc")
+        return progress
+
+    async def test_in_progress(self):
+        progress = await self.progress({"total": 10, "sent": 4, "failed": 1})
+        self.assertEqual(progress, {"total": 10, "sent": 4, "failed": 1, "cancelled": 0, "done": False})
+
+    async def test_done_counts_failed_and_cancelled(self):
+        self.assertTrue((await self.progress({"total": 10, "sent": 6, "failed": 1, "cancelled": 3}))["done"])
+
+    async def test_not_done_while_queueing(self):
+        # Jobs already sending, total not recorded yet
+        self.assertFalse((await self.progress({"sent": 2}))["done"])
+        self.assertFalse((await self.progress({}))["done"])
+
+    async def test_empty_audience(self):
+        self.assertTrue((await self.progress({"total": 0}))["done"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+from bot.common.services.cache import TTLCache, TieredCache, MISSING
+from fakes import FakeRedis
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a") # "b" is now least recently used
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = TTLCache(maxsize=10, ttl=10, timer=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=100)
+        clock.now = 11
+
+        self.assertIs(cache.get("a"), MISSING)
+        self.assertEqual(cache.get("b"), 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+class TestTieredCache(unittest.TestCase):
+    def test_negative_entries_and_promotion(self):
+        asyncio.run(self._negative_entries_and_promotion())
+
+    async def _negative_entries_and_promotion(self):
+        redis = FakeRedis()
+        cache = TieredCache("t", redis, maxsize=10, ttl=60, negative_ttl=5)
+        await cache.set("found", ("IL", "Chicago", 41.88, -87.63))
+        await cache.set("nope", None)
+
+        # Fresh process sharing the same Redis
+        other = TieredCache("t", redis, maxsize=10, ttl=60, negative_ttl=5)
+        self.assertEqual(await other.get("found"), ("IL", "Chicago", 41.88, -87.63))
+        self.assertIsNone(await other.get("nope"))
+        self.assertIs(await other.get("unknown"), MISSING)
+        self.assertEqual(other.l2_hits, 2)
+        self.assertEqual(other.l2_misses, 1)
+
+        # Second read is served from L1
+        await other.get("found")
+        self.assertEqual(other.l2_hits, 2)
+
+    def test_clear(self):
+        asyncio.run(self._clear())
+
+    async def _clear(self):
+        redis = FakeRedis()
+        await redis.set("other:x", "1")
+        cache = TieredCache("t", redis, maxsize=10, ttl=60, negative_ttl=5)
+        await cache.set("a", 1)
+        await cache.set("b", None)
+        await cache.clear()
+
+        self.assertIs(await cache.get("a"), MISSING)
+        self.assertIs(await cache.get("b"), MISSING)
+        self.assertEqual(list(redis.strings), ["other:x"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import random
+import unittest
+from datetime import datetime, timezone
+
+from bot.common.services.driver_index import DriverIndex, DriverEntry
+from bot.common.services.geocoding import haversine_miles
+
+NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def entry(user_id, lat=None, lon=None, score=0.75):
+    return DriverEntry(user_id=user_id, full_name=f"Driver {user_id}", rating_score=score,
+                       last_active_at=NOW, latitude=lat, longitude=lon)
+
+def brute_force(entries, lat, lon):
+    return sorted(
+        (float(haversine_miles(lat, lon, e.latitude, e.longitude)), e.user_id)
+        for e in entries if e.has_position
+    )
+
+class TestDriverIndex(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(7)
+        self.entries = [entry(i, rnd.uniform(25, 48), rnd.uniform(-124, -67)) for i in range(300)]
+        self.entries += [entry(1000 + i) for i in range(5)]
+        self.index = DriverIndex(cell_deg=0.5)
+        self.index.rebuild(self.entries)
+
+    def test_knn_matches_brute_force(self):
+        rnd = random.Random(11)
+        for _ in range(50):
+            lat, lon = rnd.uniform(25, 48), rnd.uniform(-124, -67)
+            got = [(round(m, 6), e.user_id) for e, m in self.index.knn(lat, lon, k=7)]
+            expected = [(round(m, 6), uid) for m, uid in brute_force(self.entries, lat, lon)[:7]]
+            self.assertEqual(got, expected)
+
+    def test_within_matches_brute_force(self):
+        rnd = random.Random(13)
+        for _ in range(50):
+            lat, lon = rnd.uniform(25, 48), rnd.uniform(-124, -67)
+            got = [e.user_id for e, _ in self.index.within(lat, lon, 150)]
+            expected = [uid for m, uid in brute_force(self.entries, lat, lon) if m <= 150]
+            self.assertEqual(got, expected)
+
+    def test_predicate(self):
+        hits = self.index.knn(40, -100, k=5, predicate=lambda e: e.user_id % 2 == 0)
+        self.assertEqual(len(hits), 5)
+        self.assertTrue(all(e.user_id % 2 == 0 for e, _ in hits))
+
+    def test_without_position(self):
+        self.assertEqual(len(self.index), 305)
+        self.assertEqual({e.user_id for e in self.index.without_position()}, {1000, 1001, 1002, 1003, 1004})
+
+    def test_move(self):
+        self.assertTrue(self.index.move(1000, 40.0, -100.0, "Town", "KS", NOW))
+        (e, miles), = self.index.knn(40.0, -100.0, k=1)
+        self.assertEqual(e.user_id, 1000)
+        self.assertAlmostEqual(miles, 0.0)
+        self.assertEqual(e.state, "KS")
+
+        # Moved out of its old cell
+        self.index.move(1000, 30.0, -90.0, "Other", "LA", NOW)
+        self.assertNotEqual(self.index.knn(40.0, -100.0, k=1)[0][0].user_id, 1000)
+        self.assertEqual(self.index.knn(30.0, -90.0, k=1)[0][0].user_id, 1000)
+
+    def test_move_unknown(self):
+        self.assertFalse(self.index.move(9999, 40.0, -100.0, "Town", "KS", NOW))
+        self.assertNotIn(9999, self.index.entries)
+
+    def test_remove(self):
+        target = self.entries[0]
+        self.index.remove(target.user_id)
+        self.assertNotIn(target.user_id, self.index.entries)
+        hits = self.index.within(target.latitude, target.longitude, 1)
+        self.assertNotIn(target.user_id, [e.user_id for e, _ in hits])
+        self.index.remove(target.user_id) # no-op
+
+    def test_empty(self):
+        index = DriverIndex()
+        index.rebuild([])
+        self.assertEqual(index.knn(40, -100), [])
+        self.assertEqual(index.within(40, -100, 100), [])
+
+class TestRebuild(unittest.TestCase):
+    def test_events_during_snapshot_are_replayed(self):
+        index = DriverIndex()
+        index.rebuild([entry(1, 40, -100), entry(2, 41, -101)])
+
+        index.begin_rebuild()
+        # Applied while the snapshot query runs; the snapshot predates them
+        index.move(1, 30.0, -90.0, "Moved", "LA", NOW)
+        index.remove(2)
+        index.upsert(entry(3, 35, -95))
+        index.rebuild([entry(1, 40, -100), entry(2, 41, -101)])
+
+        self.assertEqual(set(index.entries), {1, 3})
+        self.assertEqual(index.entries[1].state, "LA")
+        self.assertEqual(index.knn(30.0, -90.0, k=1)[0][0].user_id, 1)
+
+    def test_abort_stops_journaling(self):
+        index = DriverIndex()
+        index.begin_rebuild()
+        index.abort_rebuild()
+        index.upsert(entry(1, 40, -100))
+        index.rebuild([])
+        self.assertEqual(len(index), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from bot.common.database.models import User, Location
+from bot.common.services.driver_list import DriversPage, ListFilters, NAME_MAX, PAGE_SIZE, parse_list_args
+from bot.admin.handlers import drivers
+from bot.admin.handlers.helpers import render_drivers_page
+
+class TestParseListArgs(unittest.TestCase):
+    def test_empty(self):
+        self.assertFalse(parse_list_args([]))
+
+    def test_filters(self):
+        filters = parse_list_args(["tx", "STALE", "min=3.5", "MAX=4.5"])
+        self.assertEqual(filters, ListFilters(state="TX", stale=True, min_rating=3.5, max_rating=4.5))
+        self.assertEqual(filters.describe(), "Texas, not seen > 12h, ⭐️ ≥ 3.5, ⭐️ ≤ 4.5")
+
+    def test_bad_input(self):
+        for args in (["XX"], ["min=abc"], ["min=0.5"], ["max=6"], ["foo=1"], ["Texas"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_list_args(args)
+
+    def test_pack_roundtrip(self):
+        for filters in (ListFilters(), ListFilters(state="CA", min_rating=4), ListFilters(stale=True, max_rating=2.5)):
+            self.assertEqual(ListFilters.unpack(filters.pack()), filters)
+        self.assertEqual(ListFilters().pack(), ",,,")
+        self.assertEqual(ListFilters(state="TX", min_rating=4.5).pack(), "TX,,4.5,")
+
+def driver(user_id, name="Driver", minutes_ago=5):
+    user = User(user_id=user_id, full_name=name, rating_score=0.75, rating_updated_at=None,
+                last_active_at=datetime.now(timezone.utc) - timedelta(minutes=minutes_ago))
+    return user, Location(user_id=user_id, city="Austin", state="TX", latitude=30.0, longitude=-97.0)
+
+class TestRenderDriversPage(unittest.TestCase):
+    def test_renders_cards(self):
+        text, shown = render_drivers_page([driver(1, "Ann <B>"), driver(2, minutes_ago=180)], 0, ListFilters(state="TX"))
+        self.assertEqual([u.user_id for u in shown], [1, 2])
+        self.assertIn("(page 1)", text)
+        self.assertIn("🔎 Texas", text)
+        self.assertIn("Ann &lt;B&gt;", text)
+        self.assertIn("5m ago", text)
+        self.assertIn("3h ago", text)
+
+    def test_full_page_of_long_names_fits(self):
+        rows = [driver(10**12 + i, "W" * 200) for i in range(PAGE_SIZE)]
+        text, shown = render_drivers_page(rows, 0, ListFilters(state="TX", min_rating=4))
+        self.assertEqual(len(shown), PAGE_SIZE)
+        self.assertLessEqual(len(text), 4000)
+        self.assertIn("W" * NAME_MAX + "<", text)
+
+    def test_stops_before_limit(self):
+        rows = [driver(i) for i in range(PAGE_SIZE)]
+        full, _ = render_drivers_page(rows, 0, ListFilters())
+        limit = len(full) - 1
+        text, shown = render_drivers_page(rows, 0, ListFilters(), limit=limit)
+        self.assertEqual(len(shown), PAGE_SIZE - 1)
+        self.assertLessEqual(len(text), limit)
+
+    def test_backward_page_keeps_cards_next_to_cursor(self):
+        rows = [driver(i) for i in range(PAGE_SIZE)]
+        full, _ = render_drivers_page(rows, 0, ListFilters())
+        text, shown = render_drivers_page(rows, 0, ListFilters(), limit=len(full) - 1, backward=True)
+        self.assertEqual([u.user_id for u in shown], list(range(1, PAGE_SIZE)))
+        self.assertLess(text.index("<code>1</code>"), text.index(f"<code>{PAGE_SIZE - 1}</code>"))
+
+    def test_first_card_always_shown(self):
+        text, shown = render_drivers_page([driver(1)], 0, ListFilters(), limit=10)
+        self.assertEqual(len(shown), 1)
+
+    def test_card_cache(self):
+        cards = {}
+        render_drivers_page([driver(1, "Old")], 0, ListFilters(), cards=cards)
+        text, _ = render_drivers_page([driver(1, "New")], 1, ListFilters(), cards=cards)
+        self.assertIn("Old", text)
+        self.assertIn("(page 2)", text)
+
+class TestBuildDriversPage(unittest.IsolatedAsyncioTestCase):
+    async def test_backward_truncation_links_dropped_drivers(self):
+        rows = [driver(i) for i in range(1, PAGE_SIZE + 1)]
+        full, _ = render_drivers_page(rows, 2, ListFilters())
+
+        async def page(filters, cursor=0, direction="a"):
+            return DriversPage(1, rows, False)
+
+        real = render_drivers_page
+        with patch.object(drivers, "get_drivers_page", page), \
+             patch.object(drivers, "render_drivers_page",
+                          lambda *args, **kwargs: real(*args, **kwargs, limit=len(full) - 1)):
+            _, kb, _ = await drivers.build_drivers_page(ListFilters(), cursor=99, direction="b", page=2)
+
+        # No more rows before the page in SQL, but driver 1 didn't fit: ⬅️ must reach it
+        prev = kb.inline_keyboard[0][0]
+        self.assertEqual(prev.callback_data.split("_")[:4], ["drv", "b", "2", "1"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy.dialects import postgresql
+
+from bot.common.services import driver_search
+from bot.common.services.driver_index import DriverEntry
+from bot.common.services.driver_search import FindFilters, parse_find_args, search_drivers_db
+from fakes import FakeSession
+
+class TestParseFindArgs(unittest.TestCase):
+    def test_plain_words(self):
+        self.assertEqual(parse_find_args(["Dallas", "TX"]), (["Dallas", "TX"], FindFilters()))
+
+    def test_radius(self):
+        self.assertEqual(parse_find_args(["Dallas", "r=50"])[1].radius_miles, 50)
+        self.assertEqual(parse_find_args(["Dallas", "radius=50mi"])[1].radius_miles, 50)
+        self.assertEqual(parse_find_args(["Dallas", "50mi"]), (["Dallas"], FindFilters(radius_miles=50)))
+
+    def test_min_rating(self):
+        self.assertEqual(parse_find_args(["min=4.5"])[1].min_rating, 4.5)
+        self.assertEqual(parse_find_args(["rating=4"])[1].min_rating, 4)
+
+    def test_seen(self):
+        self.assertEqual(parse_find_args(["seen=12"])[1].seen_within_hours, 12)
+        self.assertEqual(parse_find_args(["seen=12h"])[1].seen_within_hours, 12)
+        self.assertEqual(parse_find_args(["12h"])[1].seen_within_hours, 12)
+
+    def test_combined(self):
+        words, filters = parse_find_args(["New", "York", "R=25", "MIN=4", "6h"])
+        self.assertEqual(words, ["New", "York"])
+        self.assertEqual(filters, FindFilters(radius_miles=25, min_rating=4, seen_within_hours=6))
+        self.assertEqual(filters.describe(), "≤ 25 mi, ⭐️ ≥ 4, seen ≤ 6h")
+
+    def test_bad_input(self):
+        for args in (["r=abc"], ["min="], ["seen=xh"], ["foo=1"], ["r=0"], ["min=-1"], ["r=nan"], ["r=inf"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_find_args(args)
+
+class TestFindFilters(unittest.TestCase):
+    def entry(self, score, hours_ago=0):
+        seen = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+        return DriverEntry(user_id=1, full_name="A", rating_score=score, last_active_at=seen)
+
+    def test_no_predicate_without_filters(self):
+        self.assertIsNone(FindFilters(radius_miles=10).predicate())
+
+    def test_min_rating_is_in_stars(self):
+        check = FindFilters(min_rating=4.5).predicate()
+        self.assertTrue(check(self.entry(0.875))) # 4.5 stars
+        self.assertFalse(check(self.entry(0.8))) # 4.2 stars
+
+    def test_seen(self):
+        check = FindFilters(seen_within_hours=12).predicate()
+        self.assertTrue(check(self.entry(0.5, hours_ago=1)))
+        self.assertFalse(check(self.entry(0.5, hours_ago=13)))
+
+class TestSearchDriversDb(unittest.IsolatedAsyncioTestCase):
+    async def test_min_rating_compared_as_score(self):
+        session = FakeSession()
+        with patch.object(driver_search, "async_session_factory", session):
+            await search_drivers_db(40.0, -100.0, filters=FindFilters(radius_miles=50, min_rating=4.5))
+
+        self.assertEqual(len(session.executed), 1)
+        params = session.executed[0][0].compile(dialect=postgresql.dialect()).params.values()
+        self.assertIn(0.875, params)
+        self.assertNotIn(4.5, params)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import csv
+import gzip
+import io
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from bot.common.services.export import (
+    HISTORY_DEFAULT_DAYS, ExportRequest, _CsvSink, build_query, parse_export_args
+)
+
+class TestParseExportArgs(unittest.TestCase):
+    def test_defaults(self):
+        self.assertEqual(parse_export_args([]), ExportRequest())
+
+    def test_options(self):
+        req = parse_export_args(["ORDERS", "csv", "gz", "driver=42", "from=2025-01-01", "to=2025-01-31"])
+        self.assertEqual(req, ExportRequest(dataset="orders", gzip=True, driver_id=42,
+                                            date_from=date(2025, 1, 1), date_to=date(2025, 1, 31)))
+        self.assertEqual(req.describe(), "driver 42, 2025-01-01 → 2025-01-31")
+        self.assertTrue(req.filename().endswith(".csv.gz"))
+
+    def test_bad_values(self):
+        for args in (["pdf"], ["status=gone"], ["state=XX"], ["driver=abc"], ["from=01/02/2025"], ["foo=1"]):
+            with self.assertRaises(ValueError, msg=args):
+                parse_export_args(args)
+
+    def test_cross_option_validation(self):
+        for args in (
+            ["xlsx", "gz"],
+            ["parquet", "gzip"],
+            ["drivers", "driver=42"],
+            ["orders", "state=TX"],
+            ["history", "status=all"],
+            ["orders", "from=2025-02-01", "to=2025-01-01"],
+        ):
+            with self.assertRaises(ValueError, msg=args):
+                parse_export_args(args)
+
+    def test_history_default_window(self):
+        req = parse_export_args(["history"])
+        today = datetime.now(timezone.utc).date()
+        self.assertEqual(req.date_from, today - timedelta(days=HISTORY_DEFAULT_DAYS - 1))
+        self.assertIsNone(req.date_to)
+
+        req = parse_export_args(["history", "to=2025-03-10"])
+        self.assertEqual(req.date_from, date(2025, 3, 10) - timedelta(days=HISTORY_DEFAULT_DAYS - 1))
+
+        # An explicit start is kept
+        req = parse_export_args(["history", "from=2024-01-01"])
+        self.assertEqual(req.date_from, date(2024, 1, 1))
+
+class TestBuildQuery(unittest.TestCase):
+    def test_to_is_inclusive(self):
+        req = parse_export_args(["orders", "from=2025-01-01", "to=2025-01-31"])
+        stmt, columns = build_query(req)
+        params = stmt.compile(dialect=postgresql.dialect()).params
+        self.assertIn(datetime(2025, 1, 1, tzinfo=timezone.utc), params.values())
+        self.assertIn(datetime(2025, 2, 1, tzinfo=timezone.utc), params.values())
+        self.assertEqual(columns[0], ("Order ID", "int"))
+
+    def test_history_state_column(self):
+        _, columns = build_query(parse_export_args(["history", "state=TX"]))
+        self.assertEqual(columns[-1], ("State", "state"))
+
+class TestCsvSink(unittest.TestCase):
+    columns = [("ID", "int"), ("Name", "str"), ("At", "datetime")]
+    rows = [
+        [1, "Ann, \"A\"", datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)],
+        [2, "Bob\nSmith", None],
+    ]
+    expected = [
+        ["ID", "Name", "At"],
+        ["1", "Ann, \"A\"", "2025-01-02 03:04:05"],
+        ["2", "Bob\nSmith", ""],
+    ]
+
+    def roundtrip(self, compress):
+        with tempfile.SpooledTemporaryFile(max_size=1024, mode="w+b") as spool:
+            sink = _CsvSink(spool, self.columns, compress)
+            sink.write(self.rows[:1])
+            sink.write(self.rows[1:])
+            sink.close()
+            # Spool stays usable after the sink is closed
+            spool.seek(0)
+            data = spool.read()
+        if compress:
+            data = gzip.decompress(data)
+        return list(csv.reader(io.StringIO(data.decode("utf-8"), newline="")))
+
+    def test_plain(self):
+        self.assertEqual(self.roundtrip(False), self.expected)
+
+    def test_gzip(self):
+        self.assertEqual(self.roundtrip(True), self.expected)
+
+if __name__ == "__main__":
+    unittest.main()
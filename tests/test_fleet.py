@@ -0,0 +1,33 @@
+import unittest
+
+from bot.common.services.fleet import FleetVersion, LOCATION, PROFILE
+
+class TestFleetVersion(unittest.TestCase):
+    def test_changes_since(self):
+        fleet = FleetVersion()
+        start = fleet.value
+        fleet.bump(1, LOCATION)
+        fleet.bump(2, PROFILE)
+
+        self.assertEqual(fleet.changes_since(fleet.value), [])
+        self.assertEqual(fleet.changes_since(start), [(1, LOCATION), (2, PROFILE)])
+        self.assertEqual(fleet.changes_since(start + 1), [(2, PROFILE)])
+
+    def test_log_overflow_means_unknown(self):
+        fleet = FleetVersion(log_size=2)
+        start = fleet.value
+        for user_id in range(3):
+            fleet.bump(user_id, LOCATION)
+        self.assertIsNone(fleet.changes_since(start))
+        self.assertEqual(fleet.changes_since(start + 1), [(1, LOCATION), (2, LOCATION)])
+
+    def test_reset(self):
+        fleet = FleetVersion()
+        fleet.bump(1, LOCATION)
+        before = fleet.value
+        fleet.reset()
+        self.assertIsNone(fleet.changes_since(before))
+        self.assertEqual(fleet.changes_since(fleet.value), [])
+
+if __name__ == '__main__':
+    unittest.main()
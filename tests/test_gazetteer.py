@@ -0,0 +1,64 @@
+import random
+import unittest
+
+from bot.common.services.gazetteer import KDTree, Gazetteer, chord_to_km, to_xyz, normalize_name
+
+def brute_force_nearest(lats, lons, lat, lon):
+    q = to_xyz(lat, lon)
+    best = None
+    for i, (p_lat, p_lon) in enumerate(zip(lats, lons)):
+        p = to_xyz(p_lat, p_lon)
+        d2 = sum((a - b) ** 2 for a, b in zip(q, p))
+        if best is None or d2 < best[0]:
+            best = (d2, i)
+    return best[1], chord_to_km(best[0] ** 0.5)
+
+class TestKDTree(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rnd = random.Random(42)
+        lats = [rnd.uniform(20, 70) for _ in range(500)]
+        lons = [rnd.uniform(-170, -60) for _ in range(500)]
+        tree = KDTree(lats, lons)
+
+        for _ in range(200):
+            lat, lon = rnd.uniform(15, 75), rnd.uniform(-175, -55)
+            i, dist = tree.nearest(lat, lon)
+            j, expected = brute_force_nearest(lats, lons, lat, lon)
+            self.assertEqual(i, j)
+            self.assertAlmostEqual(dist, expected, places=6)
+
+    def test_empty(self):
+        self.assertEqual(KDTree([], []).nearest(0, 0)[0], -1)
+
+class TestGazetteer(unittest.TestCase):
+    def test_bundled_lookup(self):
+        places = Gazetteer.load()
+        self.assertGreater(len(places), 500)
+
+        state, city, dist = places.nearest(41.8790, -87.6360) # Chicago Loop
+        self.assertEqual((state, city), ("IL", "Chicago"))
+        self.assertLess(dist, 2)
+
+        # Mid-Atlantic ocean is outside coverage
+        self.assertIsNone(places.nearest(35.0, -50.0, max_km=150))
+
+    def test_search(self):
+        places = Gazetteer.load()
+        label = lambda ids: [places.label(i) for i in ids]
+
+        self.assertEqual(label(places.search("Nap"))[0], "Naperville, IL")
+        self.assertEqual(label(places.search("columbus, ga")), ["Columbus, GA"])
+        self.assertIn("Fort Worth, TX", label(places.search("worth")))
+        self.assertEqual(label(places.search("st pete")), ["St. Petersburg, FL"])
+        # Typos fall back to fuzzy matching
+        self.assertEqual(label(places.search("Napervile"))[0], "Naperville, IL")
+        self.assertEqual(places.lookup("chicago", "IL"), places.search("Chicago")[0])
+        self.assertIsNone(places.lookup("Chicago", "TX"))
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name("St. Louis"), "saint louis")
+        self.assertEqual(normalize_name("Winston-Salem"), "winston salem")
+        self.assertEqual(normalize_name("Coeur d'Alene"), "coeur dalene")
+
+if __name__ == '__main__':
+    unittest.main()
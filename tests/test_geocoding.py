@@ -0,0 +1,60 @@
+import random
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from bot.common.services.geocoding import EARTH_RADIUS_MI, calculate_distance, rank_nearest
+
+# Chicago, the search point
+LAT, LON = 41.8781, -87.6298
+
+class TestDistance(unittest.TestCase):
+    def test_known_distances(self):
+        self.assertEqual(calculate_distance(LAT, LON, LAT, LON), 0.0)
+        # One degree of latitude along a meridian
+        self.assertAlmostEqual(calculate_distance(40, -90, 41, -90), EARTH_RADIUS_MI * np.pi / 180, places=6)
+        # Chicago - New York
+        self.assertAlmostEqual(calculate_distance(LAT, LON, 40.7128, -74.0060), 711, delta=2)
+
+    def test_bad_input(self):
+        with patch("builtins.print"):
+            self.assertEqual(calculate_distance(None, LON, LAT, LON), float("inf"))
+
+class TestRankNearest(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(3)
+        self.lats = np.array([rnd.uniform(25, 48) for _ in range(200)])
+        self.lons = np.array([rnd.uniform(-124, -67) for _ in range(200)])
+
+    def test_matches_full_sort(self):
+        idx, dists = rank_nearest(LAT, LON, self.lats, self.lons, k=10)
+
+        expected = sorted(
+            range(len(self.lats)), key=lambda i: calculate_distance(LAT, LON, self.lats[i], self.lons[i])
+        )[:10]
+        self.assertEqual(idx.tolist(), expected)
+        self.assertEqual(dists.tolist(), sorted(dists.tolist()))
+        for i, d in zip(idx, dists):
+            self.assertAlmostEqual(d, calculate_distance(LAT, LON, self.lats[i], self.lons[i]), places=6)
+
+    def test_k_larger_than_input(self):
+        idx, dists = rank_nearest(LAT, LON, self.lats[:3], self.lons[:3], k=10)
+        self.assertEqual(sorted(idx.tolist()), [0, 1, 2])
+        self.assertEqual(dists.tolist(), sorted(dists.tolist()))
+
+    def test_empty_input(self):
+        idx, dists = rank_nearest(LAT, LON, np.array([]), np.array([]), k=10)
+        self.assertEqual((len(idx), len(dists)), (0, 0))
+        idx, dists = rank_nearest(LAT, LON, self.lats, self.lons, k=0)
+        self.assertEqual((len(idx), len(dists)), (0, 0))
+
+    def test_missing_coordinates_rank_last(self):
+        lats = np.array([np.nan, 40.0, 41.0])
+        lons = np.array([np.nan, -88.0, -87.7])
+        idx, dists = rank_nearest(LAT, LON, lats, lons, k=3)
+        self.assertEqual(idx.tolist(), [2, 1, 0])
+        self.assertEqual(dists[-1], np.inf)
+
+if __name__ == '__main__':
+    unittest.main()
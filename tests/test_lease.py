@@ -0,0 +1,144 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from bot.common.config import settings
+from bot.common.services import lease
+from bot.common.services.lease import EXTEND_LUA, Lease, read_job_stats, singleton_job
+from fakes import FakeRedis
+
+KEY = "lease:job:tick"
+
+def lease_redis() -> FakeRedis:
+    # EXTEND_LUA in Python: extend (ms > 0) or delete, only for the owner's token
+    redis = FakeRedis()
+
+    async def extend(keys, args):
+        key, (token, ms) = keys[0], args
+        if redis.strings.get(key) != token.encode():
+            return 0
+        if ms > 0:
+            redis.ttl_ms[key] = ms
+            return 1
+        return await redis.delete(key)
+
+    redis.set_script(EXTEND_LUA, extend)
+    return redis
+
+def holder(redis):
+    # (owner token, PX) of the lease key
+    if KEY not in redis.strings:
+        return None
+    return redis.strings[KEY].decode(), redis.ttl_ms.get(KEY)
+
+class TestLease(unittest.IsolatedAsyncioTestCase):
+    async def test_owner_checked(self):
+        redis = lease_redis()
+        mine, theirs = Lease(redis, KEY, 1000), Lease(redis, KEY, 1000)
+        self.assertTrue(await mine.acquire())
+        self.assertFalse(await theirs.acquire())
+
+        # Only the holder can extend or release
+        self.assertFalse(await theirs.extend())
+        await theirs.release()
+        self.assertIn(KEY, redis.strings)
+        self.assertTrue(await mine.extend())
+
+        await mine.release(keep_ms=500)
+        self.assertEqual(holder(redis), (mine.token, 500))
+        await mine.release()
+        self.assertIsNone(holder(redis))
+        self.assertTrue(await theirs.acquire())
+
+class TestSingletonJob(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = lease_redis()
+        for target, attr, value in ((lease, "redis", self.redis), (settings, "JOB_LEASE_TTL_SECONDS", 0.3)):
+            patcher = patch.object(target, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_one_replica_runs_each_tick(self):
+        calls = []
+
+        async def job():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        a, b = singleton_job("tick", job, 60), singleton_job("tick", job, 60)
+        self.assertCountEqual(await asyncio.gather(a(), b()), ["ok", None])
+        self.assertEqual(len(calls), 1)
+
+        stats = (await read_job_stats())["tick"]
+        self.assertEqual((stats["runs"], stats["skipped"], stats["failed"], stats["lost"]), (1, 1, 0, 0))
+        self.assertGreaterEqual(stats["last_ms"], 40)
+
+    async def test_lease_kept_until_slot_end(self):
+        async def job():
+            return "ok"
+
+        period = 60
+        await singleton_job("tick", job, period)()
+        now = time.time()
+        _, keep_ms = holder(self.redis)
+        slot_end = (now // period + 1) * period
+        self.assertAlmostEqual(keep_ms, (slot_end - now) * 1000, delta=50)
+        self.assertLessEqual(keep_ms, period * 1000)
+
+        # A later tick in the same slot is skipped
+        self.assertIsNone(await singleton_job("tick", job, period)())
+
+    async def test_released_when_slot_is_over(self):
+        # Period shorter than the run: the slot already ended, nothing kept
+        async def slow():
+            await asyncio.sleep(0.02)
+
+        await singleton_job("tick", slow, 0.01)()
+        self.assertIsNone(holder(self.redis))
+
+    async def test_failure_recorded_and_raised(self):
+        async def job():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            await singleton_job("tick", job, 60)()
+        self.assertEqual((await read_job_stats())["tick"]["failed"], 1)
+
+    async def test_cancelled_when_lease_lost(self):
+        finished = []
+
+        async def job():
+            await asyncio.sleep(0.01)
+            # Expired and taken over by another replica
+            await self.redis.set(KEY, "other", px=1000)
+            await asyncio.sleep(1)
+            finished.append(1)
+
+        started = time.monotonic()
+        self.assertIsNone(await singleton_job("tick", job, 60)())
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(finished, [])
+        # The other replica's lease is left alone
+        self.assertEqual(holder(self.redis), ("other", 1000))
+        self.assertEqual((await read_job_stats())["tick"]["lost"], 1)
+
+    async def test_redis_down_skips_tick(self):
+        async def broken_set(*args, **kwargs):
+            raise ConnectionError("redis down")
+
+        self.redis.set = broken_set
+        calls = []
+
+        async def job():
+            calls.append(1)
+
+        self.assertIsNone(await singleton_job("tick", job, 60)())
+        self.assertEqual(calls, [])
+
+if __name__ == "__main__":
+    unittest.main()
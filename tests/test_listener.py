@@ -0,0 +1,83 @@
+import asyncio
+import json
+import unittest
+
+from bot.common.services.events import DriverLocation, DriverProfile, ProfileInvalidation, latest_per_user
+from bot.common.services.listener import DBListener
+
+class TestEvents(unittest.TestCase):
+    def test_driver_location(self):
+        event = DriverLocation.parse({"user_id": "5", "lat": 40.7, "lon": -74.0, "city": "NYC", "state": "NY", "ts": 0})
+        self.assertEqual(event.user_id, 5)
+        self.assertEqual(event.seen_at.year, 1970)
+
+    def test_profile_invalidation(self):
+        self.assertEqual(ProfileInvalidation.parse(7), ProfileInvalidation(7))
+        self.assertEqual(ProfileInvalidation.parse("*"), ProfileInvalidation(None))
+
+    def test_latest_per_user(self):
+        events = [DriverProfile(1, "active"), DriverProfile(2, "active"), DriverProfile(1, "banned")]
+        self.assertEqual(latest_per_user(events), [DriverProfile(2, "active"), DriverProfile(1, "banned")])
+
+class TestDBListener(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.resyncs = 0
+        async def resync():
+            self.resyncs += 1
+        self.resync = resync
+        self.listener = DBListener("postgresql://test", on_connect=resync, workers=2)
+        self.received = []
+
+    async def asyncTearDown(self):
+        await self.listener.close()
+
+    def notify(self, channel, payload):
+        self.listener._handle_notification(None, 0, channel, payload)
+
+    def start_workers(self):
+        self.listener._tasks = [asyncio.create_task(self.listener._worker(q)) for q in self.listener._queues]
+
+    async def drain(self):
+        for _ in range(50):
+            if self.listener.handled + self.listener.dropped >= self.listener.received:
+                break
+            await asyncio.sleep(0.01)
+
+    async def test_typed_batches_in_order(self):
+        async def handler(events):
+            self.received.append(events)
+        self.listener.on("driver_profile", handler, parse=DriverProfile.parse, batch=True)
+        # Queued before the workers run: arrives as one batch, in order
+        self.notify("driver_profile", json.dumps({"user_id": 1, "status": "active"}))
+        self.notify("driver_profile", json.dumps({"user_id": 1, "status": "banned"}))
+        self.start_workers()
+        await self.drain()
+        self.assertEqual(self.received, [[DriverProfile(1, "active"), DriverProfile(1, "banned")]])
+        self.assertEqual(self.listener.stats()["batches"], 1)
+
+    async def test_plain_payloads_and_failures(self):
+        async def handler(event):
+            if event.user_id == 2:
+                raise RuntimeError("boom")
+            self.received.append(event)
+        self.listener.on("user_profile", handler, parse=ProfileInvalidation.parse)
+        self.start_workers()
+        for payload in ("1", "*", "2", "not-a-number"):
+            self.notify("user_profile", payload)
+        await self.drain()
+        self.assertCountEqual(self.received, [ProfileInvalidation(1), ProfileInvalidation(None)])
+        self.assertEqual(self.listener.failed, 2)
+
+    async def test_overflow_drops_and_resyncs(self):
+        self.listener = DBListener("postgresql://test", on_connect=self.resync, workers=2, queue_size=3)
+        self.listener.on("user_profile", lambda events: asyncio.sleep(0), batch=True)
+        for _ in range(10):
+            self.notify("user_profile", "1") # same key: same queue of 3
+        self.assertEqual(self.listener.dropped, 7)
+        self.start_workers()
+        await self.drain()
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.resyncs, 1)
+
+if __name__ == "__main__":
+    unittest.main()
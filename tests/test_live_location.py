@@ -0,0 +1,45 @@
+import unittest
+
+from bot.common.services.live_location import LiveLocationThrottle, distance_m
+
+class TestLiveLocationThrottle(unittest.TestCase):
+    def setUp(self):
+        self.throttle = LiveLocationThrottle(min_distance_m=150, min_interval=30, heartbeat=600, cell_deg=0.05)
+        self.throttle.remember(1, 40.7000, -74.0000, "New York", "New York City", now=0)
+
+    def test_distance(self):
+        # 0.001 deg of latitude ~ 111 m
+        self.assertAlmostEqual(distance_m(40.0, -74.0, 40.001, -74.0), 111.2, places=0)
+
+    def test_unknown_driver_is_geocoded(self):
+        self.assertEqual(self.throttle.check(2, 40.7, -74.0, now=0), (True, None))
+
+    def test_too_soon_or_too_close(self):
+        # Moved 1 km but only 10 s later
+        self.assertEqual(self.throttle.check(1, 40.7090, -74.0000, now=10), (False, None))
+        # 60 s later but only ~50 m away
+        self.assertEqual(self.throttle.check(1, 40.7004, -74.0000, now=60), (False, None))
+        self.assertEqual(self.throttle.dropped, 2)
+
+    def test_same_cell_reuses_place(self):
+        accept, place = self.throttle.check(1, 40.7090, -74.0000, now=60)
+        self.assertTrue(accept)
+        self.assertEqual(place, ("New York", "New York City"))
+
+    def test_new_cell_needs_geocoding(self):
+        self.assertEqual(self.throttle.check(1, 40.7600, -74.0000, now=60), (True, None))
+
+    def test_heartbeat_for_stationary_driver(self):
+        self.assertEqual(self.throttle.check(1, 40.7000, -74.0000, now=599)[0], False)
+        self.assertEqual(self.throttle.check(1, 40.7000, -74.0000, now=600), (True, ("New York", "New York City")))
+
+    def test_prune_when_full(self):
+        throttle = LiveLocationThrottle(heartbeat=600, maxsize=2)
+        throttle.remember(1, 40.0, -74.0, "A", "a", now=0)
+        throttle.remember(2, 40.0, -74.0, "A", "a", now=700)
+        throttle.remember(3, 40.0, -74.0, "A", "a", now=800)
+        self.assertEqual(throttle.stats()["tracked"], 2)
+        self.assertEqual(throttle.check(1, 40.0, -74.0, now=800), (True, None))
+
+if __name__ == '__main__':
+    unittest.main()
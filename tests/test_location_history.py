@@ -0,0 +1,42 @@
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+
+from bot.common.services import location_history
+from bot.common.services.location_history import TrackPoint, create_partition_sql, get_track, partition_name
+from fakes import FakeSession
+
+class TestPartitions(unittest.TestCase):
+    def test_partition_name(self):
+        self.assertEqual(partition_name(date(2025, 3, 7)), "location_history_20250307")
+        self.assertEqual(partition_name(date(2024, 12, 31)), "location_history_20241231")
+
+    def test_create_plain(self):
+        (sql,) = create_partition_sql(date(2025, 3, 7))
+        self.assertIn("location_history_20250307 PARTITION OF location_history", sql)
+        self.assertIn("FROM ('2025-03-07T00:00:00+00:00') TO ('2025-03-08T00:00:00+00:00')", sql)
+
+    def test_create_moves_rows_out_of_default(self):
+        create, move, attach = create_partition_sql(date(2024, 12, 31), from_default=True)
+        self.assertTrue(create.startswith("CREATE TABLE location_history_20241231 (LIKE location_history"))
+        self.assertIn("DELETE FROM location_history_default", move)
+        self.assertIn("recorded_at >= '2024-12-31T00:00:00+00:00' AND recorded_at < '2025-01-01T00:00:00+00:00'", move)
+        self.assertIn("INSERT INTO location_history_20241231", move)
+        self.assertIn("ATTACH PARTITION location_history_20241231", attach)
+
+class TestGetTrack(unittest.IsolatedAsyncioTestCase):
+    async def test_get_track(self):
+        t0 = datetime(2025, 3, 7, 12, tzinfo=timezone.utc)
+        t1 = datetime(2025, 3, 7, 13, tzinfo=timezone.utc)
+        session = FakeSession(lambda stmt, params: [(t0, 40.5, -74.25, 36), (t1, 40.75, -74.0, 36)])
+        with patch.object(location_history, "async_session_factory", session):
+            track = await get_track(42, hours=6)
+
+        (stmt, params), = session.executed
+        self.assertEqual(params, {"user_id": 42, "seconds": 6 * 3600})
+        self.assertIn("ORDER BY recorded_at", str(stmt))
+        self.assertEqual(track, [TrackPoint(t0, 40.5, -74.25, 36), TrackPoint(t1, 40.75, -74.0, 36)])
+        self.assertEqual(track[0].state_id, 36)
+
+if __name__ == "__main__":
+    unittest.main()
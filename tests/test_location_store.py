@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from bot.common.services import location_store
+from bot.common.services.location_store import LocationWriter
+from fakes import FakeSession
+
+def batches(db):
+    # Each flush as {user_id: (city, lat)}
+    return [dict(zip(p["user_ids"], zip(p["cities"], p["lats"]))) for _, p in db.executed]
+
+class TestLocationWriter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.db = FakeSession()
+        patcher = patch.object(location_store, "async_session_factory", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = LocationWriter(interval=60)
+
+    async def asyncTearDown(self):
+        self.db.gate = None
+        await self.writer.close()
+
+    async def test_coalesces_per_user(self):
+        self.writer.submit(1, "A", "Texas", 30.0, -97.0)
+        self.writer.submit(2, "B", "Texas", 31.0, -97.0)
+        self.writer.submit(1, "C", "Texas", 32.0, -97.0)
+        await self.writer.flush()
+
+        self.assertEqual(batches(self.db), [{1: ("C", 32.0), 2: ("B", 31.0)}])
+        self.assertEqual((self.writer.flushed_rows, self.writer.batches), (2, 1))
+
+    async def test_failed_write_is_requeued(self):
+        self.writer.submit(1, "A", "Texas", 30.0, -97.0)
+        self.writer.submit(2, "B", "Texas", 31.0, -97.0)
+        self.db.fail = RuntimeError("db down")
+        with patch("builtins.print"):
+            await self.writer.flush()
+        self.assertEqual(batches(self.db), [])
+
+        # A newer position for user 1 wins over the failed one
+        self.writer.submit(1, "New", "Texas", 33.0, -97.0)
+        await self.writer.flush()
+        self.assertEqual(batches(self.db), [{1: ("New", 33.0), 2: ("B", 31.0)}])
+
+    async def test_max_batch_wakes_loop(self):
+        self.writer.max_batch = 2
+        self.writer.submit(1, "A", "Texas", 30.0, -97.0)
+        self.writer.submit(2, "B", "Texas", 31.0, -97.0)
+        await asyncio.wait_for(self.db.entered.wait(), timeout=1)
+        await asyncio.sleep(0)
+        self.assertEqual(len(batches(self.db)), 1)
+
+    async def test_close_during_flush_keeps_batch(self):
+        self.writer.max_batch = 1
+        self.db.gate = asyncio.Event()
+        self.writer.submit(1, "A", "Texas", 30.0, -97.0)
+        await asyncio.wait_for(self.db.entered.wait(), timeout=1)
+
+        # Loop is mid-write; more arrives, then shutdown starts
+        self.writer.submit(2, "B", "Texas", 31.0, -97.0)
+        closing = asyncio.create_task(self.writer.close())
+        await asyncio.sleep(0.01)
+        self.assertFalse(closing.done())
+
+        self.db.gate.set()
+        await asyncio.wait_for(closing, timeout=1)
+        self.assertEqual(batches(self.db), [{1: ("A", 30.0)}, {2: ("B", 31.0)}])
+        self.assertEqual(self.writer._pending, {})
+
+    async def test_cancelled_flush_requeues(self):
+        self.db.gate = asyncio.Event()
+        self.writer.submit(1, "A", "Texas", 30.0, -97.0)
+        flushing = asyncio.create_task(self.writer.flush())
+        await asyncio.wait_for(self.db.entered.wait(), timeout=1)
+        flushing.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await flushing
+
+        self.db.gate = None
+        await self.writer.flush()
+        self.assertEqual(batches(self.db), [{1: ("A", 30.0)}])
+
+if __name__ == "__main__":
+    unittest.main()
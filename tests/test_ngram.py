@@ -0,0 +1,59 @@
+import unittest
+
+from bot.common.services.ngram import NGramIndex, normalize_text, trigrams
+from bot.common.services.user_search import _like_pattern
+
+class TestTrigrams(unittest.TestCase):
+    def test_padding(self):
+        self.assertEqual(trigrams("cat"), {"  c", " ca", "cat", "at "})
+
+    def test_per_word(self):
+        self.assertEqual(trigrams("a b"), {"  a", " a ", "  b", " b "})
+
+    def test_normalize(self):
+        self.assertEqual(normalize_text("  Akmal  TOSHEV! "), "akmal toshev")
+        self.assertEqual(normalize_text(None), "")
+
+class TestNGramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NGramIndex()
+        self.index.add(1, "Akmal Toshev", "akmal@zelle.com", "13475550101")
+        self.index.add(2, "Bobur Karimov", None, "19175550199")
+        self.index.add(3, "Akbar Aliev", "", "")
+
+    def test_substring_scores_one(self):
+        self.assertEqual(self.index.search("toshev"), [(1, 1.0)])
+
+    def test_typo_tolerant(self):
+        matches = self.index.search("karimow")
+        self.assertEqual(matches[0][0], 2)
+        self.assertLess(matches[0][1], 1.0)
+
+    def test_phone_digits(self):
+        self.assertEqual([doc for doc, _ in self.index.search("5550199")], [2])
+
+    def test_phone_inner_digits(self):
+        # Area code and exchange are not prefixes of the stored digits
+        for query in ("347", "3475", "555", "5550101"):
+            self.assertEqual(self.index.search(query)[0], (1, 1.0), msg=query)
+        self.assertEqual([doc for doc, _ in self.index.search("555")], [1, 2])
+
+    def test_ranking_and_limit(self):
+        matches = self.index.search("akmal", limit=1)
+        self.assertEqual(matches, [(1, 1.0)])
+
+    def test_threshold(self):
+        self.assertEqual(self.index.search("zzzzzz"), [])
+
+    def test_readd_replaces_fields(self):
+        self.index.add(2, "Bobur Karimov")
+        self.assertEqual(self.index.search("5550199"), [])
+        self.assertEqual(len(self.index), 3)
+
+class TestLikePattern(unittest.TestCase):
+    def test_escapes_wildcards(self):
+        self.assertEqual(_like_pattern("akmal"), "%akmal%")
+        self.assertEqual(_like_pattern("100%_a\\b"), "%100\\%\\_a\\\\b%")
+
+if __name__ == "__main__":
+    unittest.main()
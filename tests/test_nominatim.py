@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+
+from bot.common.services.nominatim import NominatimClient, GeocoderBusy
+from bot.common.services.ratelimit import TokenBucket, TOKEN_BUCKET_LUA
+from fakes import FakeRedis
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        return True
+
+class StubClient(NominatimClient):
+    """
+    HTTP replaced by a stub: each call waits for `release` and returns the params.
+    """
+    def __init__(self, **kwargs):
+        super().__init__("https://example.test", "tests", FakeLimiter(), **kwargs)
+        self.calls = []
+        self.release = asyncio.Event()
+        self.fail = None
+
+    async def _fetch(self, path, params):
+        self.calls.append((path, params))
+        await self.release.wait()
+        if self.fail:
+            raise self.fail
+        return {"path": path, **params}
+
+class TestNominatimClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_identical_requests_are_coalesced(self):
+        self.client = StubClient()
+        first = asyncio.create_task(self.client.request("search", {"q": "Dallas"}, deadline=1))
+        second = asyncio.create_task(self.client.request("search", {"q": "Dallas"}, deadline=1))
+        await asyncio.sleep(0.01)
+        self.client.release.set()
+        results = await asyncio.gather(first, second)
+
+        self.assertEqual(results, [{"path": "search", "q": "Dallas"}] * 2)
+        self.assertEqual(len(self.client.calls), 1)
+        self.assertEqual(self.client.limiter.acquired, 1)
+        self.assertEqual(self.client._inflight, {})
+
+    async def test_deadline(self):
+        self.client = StubClient()
+        with self.assertRaises(GeocoderBusy):
+            await self.client.request("search", {"q": "Austin"}, deadline=0.05)
+        # The only waiter gave up: the shared request was cancelled and forgotten
+        await asyncio.sleep(0)
+        self.assertEqual(self.client._inflight, {})
+
+    async def test_one_waiter_timing_out_keeps_the_request_for_others(self):
+        self.client = StubClient()
+        patient = asyncio.create_task(self.client.request("search", {"q": "Reno"}, deadline=1))
+        with self.assertRaises(GeocoderBusy):
+            await self.client.request("search", {"q": "Reno"}, deadline=0.02)
+        self.client.release.set()
+        self.assertEqual(await patient, {"path": "search", "q": "Reno"})
+
+    async def test_back_pressure(self):
+        # One worker busy with the first job, a queue of one holding the second
+        self.client = StubClient(queue_size=1, workers=1)
+        busy = asyncio.create_task(self.client.request("search", {"q": "a"}, deadline=1))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(self.client.request("search", {"q": "b"}, deadline=1))
+        await asyncio.sleep(0.01)
+        with self.assertRaises(GeocoderBusy):
+            await self.client.request("search", {"q": "c"}, deadline=1)
+        self.client.release.set()
+        await asyncio.gather(busy, queued)
+
+    async def test_errors_reach_every_waiter(self):
+        self.client = StubClient()
+        self.client.fail = RuntimeError("HTTP 500")
+        self.client.release.set()
+        results = await asyncio.gather(
+            self.client.request("reverse", {"lat": 1}, deadline=1),
+            self.client.request("reverse", {"lat": 1}, deadline=1),
+            return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+def bucket_redis(waits):
+    # The bucket script answers with these wait times (ms)
+    redis = FakeRedis()
+    redis.script_returns(TOKEN_BUCKET_LUA, waits)
+    return redis
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    async def test_try_acquire_returns_seconds(self):
+        redis = bucket_redis([0, 250])
+        bucket = TokenBucket(redis, "ratelimit:test", rate=4, capacity=2)
+        self.assertEqual(await bucket.try_acquire(), 0)
+        self.assertEqual(await bucket.try_acquire(), 0.25)
+        self.assertEqual(redis.script_calls[0], (["ratelimit:test"], [4, 2, 1.0]))
+
+    async def test_acquire_waits_then_takes(self):
+        redis = bucket_redis([20, 20, 0])
+        bucket = TokenBucket(redis, "ratelimit:test", rate=50)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.assertTrue(await bucket.acquire())
+        self.assertGreaterEqual(loop.time() - started, 0.035)
+        self.assertEqual(len(redis.script_calls), 3)
+
+    async def test_acquire_gives_up_past_timeout(self):
+        redis = bucket_redis([5000])
+        bucket = TokenBucket(redis, "ratelimit:test", rate=1)
+        self.assertFalse(await bucket.acquire(timeout=1))
+        self.assertEqual(len(redis.script_calls), 1) # Didn't sleep 5 s to find out
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+from aiogram.exceptions import (
+    TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+from aiogram.methods import SendMessage
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+
+from bot.common.services.outbox import Outbox, message_job
+from fakes import FakeRedis
+
+METHOD = SendMessage(chat_id=1, text="x")
+
+class FakeBot:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def send_message(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(kwargs)
+
+class TestOutboxHandle(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis()
+        self.outbox = Outbox("test", self.redis, max_attempts=3)
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def handle(self, job, error=None):
+        self.outbox._bot = FakeBot(error)
+        await self.outbox._handle(job)
+        return self.outbox._bot
+
+    def counters(self):
+        return {k: int(v) for k, v in self.redis.hash("outbox:test:stats").items()}
+
+    def delayed(self):
+        return [(json.loads(raw), due) for raw, due in self.redis.zset("outbox:test:delayed").items()]
+
+    def dead(self):
+        return [json.loads(raw) for raw in self.redis.list("outbox:test:dead")]
+
+    async def test_sent_with_markup(self):
+        kb = ReplyKeyboardMarkup(keyboard=[[KeyboardButton(text="📍", request_location=True)]], resize_keyboard=True)
+        bot = await self.handle(message_job(7, "hi", reply_markup=kb))
+        self.assertEqual(bot.sent[0]["chat_id"], 7)
+        self.assertEqual(bot.sent[0]["reply_markup"], kb)
+        self.assertEqual(self.counters(), {"sent": 1})
+
+    async def test_retry_after_delays_and_pauses(self):
+        job = message_job(7, "hi")
+        await self.handle(job, TelegramRetryAfter(METHOD, "flood", 30))
+
+        (delayed, due), = self.delayed()
+        self.assertEqual(delayed["id"], job["id"])
+        self.assertEqual(delayed["attempts"], 0) # flood control is not the job's fault
+        self.assertAlmostEqual(due, time.time() + 30, delta=2)
+        self.assertGreater(self.outbox._paused_until, time.monotonic() + 25)
+        self.assertEqual(self.counters(), {"retry_after": 1})
+        self.assertEqual(self.dead(), [])
+
+    async def test_forbidden_and_bad_request_are_dead(self):
+        for error in (TelegramForbiddenError(METHOD, "bot was blocked"), TelegramBadRequest(METHOD, "chat not found")):
+            await self.handle(message_job(7, "hi"), error)
+        dead = self.dead()
+        self.assertEqual(len(dead), 2)
+        self.assertIn("chat not found", dead[0]["error"])
+        self.assertIn("TelegramForbiddenError", dead[1]["error"])
+        self.assertEqual(self.delayed(), [])
+        self.assertEqual(self.counters(), {"dead": 2})
+
+    async def test_network_errors_back_off_then_die(self):
+        job = message_job(7, "hi")
+        await self.handle(job, TelegramNetworkError(METHOD, "timeout"))
+        (delayed, due), = self.delayed()
+        self.assertEqual(delayed["attempts"], 1)
+        self.assertAlmostEqual(due, time.time() + 2, delta=1)
+
+        await self.handle(job, TelegramServerError(METHOD, "502"))
+        self.assertEqual(job["attempts"], 2)
+        self.assertEqual(self.counters(), {"retried": 2})
+
+        await self.handle(job, asyncio.TimeoutError())
+        self.assertEqual(job["attempts"], 3)
+        self.assertEqual(len(self.dead()), 1)
+        self.assertEqual(self.counters()["dead"], 1)
+
+    async def test_cancelled_tag_is_skipped(self):
+        await self.outbox.cancel("b1")
+        bot = await self.handle(message_job(7, "hi", tag="b1", tracked=True))
+        self.assertEqual(bot.sent, [])
+        self.assertEqual(self.redis.hash("outbox:test:tag:b1"), {"cancelled": "1"})
+
+    async def test_dead_letter_handler(self):
+        seen = []
+
+        async def handler(job, error):
+            seen.append((job["params"]["chat_id"], type(error)))
+
+        self.outbox.on_dead_letter("reminder", handler)
+        await self.handle(message_job(7, "hi", tag="reminder"), TelegramForbiddenError(METHOD, "blocked"))
+        await self.handle(message_job(8, "hi", tag="other"), TelegramForbiddenError(METHOD, "blocked"))
+        self.assertEqual(seen, [(7, TelegramForbiddenError)])
+
+    async def test_failing_dead_letter_handler_is_contained(self):
+        async def handler(job, error):
+            raise RuntimeError("boom")
+
+        self.outbox.on_dead_letter("reminder", handler)
+        await self.handle(message_job(7, "hi", tag="reminder"), TelegramForbiddenError(METHOD, "blocked"))
+        self.assertEqual(len(self.dead()), 1)
+
+class BrokenBucket:
+    async def acquire(self):
+        raise ConnectionError("redis went away")
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis()
+        self.outbox = Outbox("test", self.redis, max_attempts=2)
+        self.outbox._bot = FakeBot()
+        self.outbox._chat_bucket = lambda chat_id: BrokenBucket()
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def work_off(self, job):
+        # One worker until the job has left the processing list
+        await self.outbox.enqueue(job)
+        task = asyncio.create_task(self.outbox._worker())
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if not await self.redis.llen(self.outbox._processing) and not await self.redis.llen(self.outbox._ready):
+                    break
+        finally:
+            self.outbox._stopping = True
+            await task
+
+    async def test_non_telegram_error_backs_off(self):
+        job = message_job(7, "hi")
+        await self.work_off(job)
+
+        self.assertEqual(self.redis.list(self.outbox._processing), [])
+        (raw, due), = self.redis.zset("outbox:test:delayed").items()
+        self.assertEqual(json.loads(raw)["id"], job["id"])
+        self.assertEqual(json.loads(raw)["attempts"], 1)
+        self.assertAlmostEqual(due, time.time() + 2, delta=1)
+        self.assertEqual(self.redis.hash("outbox:test:stats")["retried"], "1")
+
+    async def test_non_telegram_error_dies_at_max_attempts(self):
+        job = message_job(7, "hi")
+        job["attempts"] = 1
+        await self.work_off(job)
+
+        self.assertEqual(self.redis.list(self.outbox._processing), [])
+        self.assertEqual(self.redis.zset("outbox:test:delayed"), {})
+        dead, = [json.loads(raw) for raw in self.redis.list("outbox:test:dead")]
+        self.assertIn("redis went away", dead["error"])
+
+if __name__ == "__main__":
+    unittest.main()
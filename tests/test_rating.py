@@ -1,42 +1,129 @@
 import unittest
-import math
 from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
-# Mock class to simulate order structure
-class MockOrder:
-    def __init__(self, is_good, days_ago):
-        self.is_good = is_good
-        self.created_at = datetime.now(timezone.utc) - timedelta(days=days_ago)
-
-class TestRating(unittest.TestCase):
-    def test_rating_logic(self):
-        # Scenario:
-        # 1. Good, 10 days ago (Weight 1.0)
-        # 2. Good, 40 days ago (Weight 0.5)
-        # 3. Bad, 100 days ago (Weight 0.2)
-        
-        orders = [
-            MockOrder(True, 10),
-            MockOrder(True, 40),
-            MockOrder(False, 100)
-        ]
-        
-        weighted_good = (1.0 * 1.0) + (1.0 * 0.5) + (0.0 * 0.2) # 1.5
-        weighted_total = 1.0 + 0.5 + 0.2 # 1.7
-        
-        # Formula: (weighted_good + 1) / (weighted_total + 2)
-        expected_score = (1.5 + 1) / (1.7 + 2) # 2.5 / 3.7 = 0.6756
-        
-        calculated_score = (weighted_good + 1) / (weighted_total + 2)
-        
-        self.assertAlmostEqual(calculated_score, 0.6756, places=4)
-        
-        # Confidence
-        # 1 - exp(-3 / 7)
-        expected_conf = 1 - math.exp(-3/7) # 1 - 0.6514 = 0.3486
-        
-        calculated_conf = 1 - math.exp(-len(orders)/7.0)
-        self.assertAlmostEqual(calculated_conf, 0.3486, places=4)
+from sqlalchemy.dialects import postgresql
+
+from bot.common.config import settings
+from bot.common.database.models import User
+from bot.common.services import rating
+from bot.common.services.rating import (
+    PRIOR_SCORE, apply_order_rating, recompute_all_ratings, bayesian_score, confidence, current_score,
+    decay_factor, get_star_rating, sql_current_score, stars_to_score
+)
+from fakes import FakeSession, apply_update, evaluate
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+DAY = 86400
+HALF_LIFE_DAYS = 45.0
+
+def new_driver() -> dict:
+    # users row as stored before the first order
+    return {
+        "user_id": 1, "rating_good_acc": 0.0, "rating_total_acc": 0.0, "rating_count": 0,
+        "rating_updated_at": None, "rating_score": PRIOR_SCORE, "rating_confidence": 0.0,
+        "last_active_at": NOW - timedelta(days=365),
+    }
+
+class TestRating(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = patch.object(settings, "RATING_HALF_LIFE_DAYS", HALF_LIFE_DAYS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def rate(self, row: dict, is_good: bool, at: datetime):
+        """
+        Runs the real apply_order_rating and applies its UPDATE to `row` with now() = at.
+        """
+        session = FakeSession()
+        await apply_order_rating(session, row["user_id"], is_good)
+        (stmt, _), = session.executed
+        where = stmt.whereclause.compile(dialect=postgresql.dialect())
+        self.assertEqual(list(where.params.values()), [row["user_id"]])
+        apply_update(stmt, row, at)
+
+    async def rate_history(self, orders):
+        # orders: (is_good, days before NOW), oldest first
+        row = new_driver()
+        for is_good, days_ago in orders:
+            await self.rate(row, is_good, NOW - timedelta(days=days_ago))
+        return row
+
+    def test_decay_half_life(self):
+        self.assertAlmostEqual(decay_factor(0), 1.0)
+        self.assertAlmostEqual(decay_factor(HALF_LIFE_DAYS * DAY), 0.5)
+        self.assertAlmostEqual(decay_factor(2 * HALF_LIFE_DAYS * DAY), 0.25)
+        # Clock skew never inflates weights
+        self.assertEqual(decay_factor(-DAY), 1.0)
+
+    async def test_score_after_orders(self):
+        # Good 10 and 40 days ago, bad 100 days ago:
+        # (0.8572 + 0.5400 + 15) / (0.8572 + 0.5400 + 0.2143 + 20)
+        row = await self.rate_history([(False, 100), (True, 40), (True, 10)])
+        self.assertAlmostEqual(evaluate(sql_current_score(), row, NOW), 0.7587, places=4)
+        self.assertEqual(row["rating_count"], 3)
+        self.assertAlmostEqual(row["rating_confidence"], 0.3486, places=4)
+        self.assertEqual(row["last_active_at"], NOW - timedelta(days=365)) # not driver activity
+
+    async def test_incremental_matches_full_history(self):
+        orders = [(True, 100), (False, 40), (True, 10), (True, 0.5)]
+        row = await self.rate_history(orders)
+
+        good = sum(decay_factor(d * DAY) for ok, d in orders if ok)
+        total = sum(decay_factor(d * DAY) for _, d in orders)
+        expected = bayesian_score(good, total)
+        self.assertAlmostEqual(evaluate(sql_current_score(), row, NOW), expected, places=9)
+        # Stored score is as of the last order; confidence counts raw orders
+        last = NOW - timedelta(days=0.5)
+        self.assertAlmostEqual(row["rating_score"], evaluate(sql_current_score(), row, last), places=9)
+        self.assertAlmostEqual(row["rating_confidence"], confidence(4))
+
+    async def test_read_time_decay_towards_prior(self):
+        row = await self.rate_history([(False, 0)] * 10)
+        half_life = timedelta(days=HALF_LIFE_DAYS)
+        fresh = evaluate(sql_current_score(), row, NOW)
+        later = evaluate(sql_current_score(), row, NOW + half_life)
+        much_later = evaluate(sql_current_score(), row, NOW + 100 * half_life)
+
+        self.assertAlmostEqual(fresh, 0.5)
+        self.assertAlmostEqual(later, bayesian_score(0.0, 5.0))
+        self.assertAlmostEqual(much_later, PRIOR_SCORE, places=6)
+
+        # current_score() on the model agrees with the SQL expression
+        user = User(**row)
+        for at in (NOW, NOW + half_life, NOW + 100 * half_life):
+            self.assertAlmostEqual(current_score(user, now=at), evaluate(sql_current_score(), row, at), places=12)
+
+    async def test_unrated_uses_stored_score(self):
+        row = new_driver()
+        row["rating_score"] = 0.9
+        self.assertEqual(evaluate(sql_current_score(), row, NOW), 0.9)
+        self.assertEqual(current_score(User(**row)), 0.9)
+
+    def test_naive_updated_at(self):
+        user = User(**{**new_driver(), "rating_good_acc": 5.0, "rating_total_acc": 5.0,
+                       "rating_updated_at": NOW.replace(tzinfo=None)})
+        self.assertAlmostEqual(current_score(user, now=NOW), bayesian_score(5.0, 5.0))
+
+    async def test_recompute_compares_accumulators_not_scores(self):
+        session = FakeSession(lambda stmt, params: [(120, 3)])
+        with patch.object(rating, "async_session_factory", session), patch("builtins.print"):
+            result = await recompute_all_ratings(dry_run=True)
+
+        self.assertEqual((result["drivers"], result["changed"]), (120, 3))
+        (stmt, params), = session.executed
+        self.assertEqual(params["half_life_s"], HALF_LIFE_DAYS * DAY)
+        changed = str(stmt).split("FILTER (WHERE", 1)[1]
+        # The decayed score moves every day; a row is only rewritten when its history disagrees
+        self.assertNotIn("rating_score", changed)
+        self.assertIn("u.rating_good_acc", changed)
+        self.assertIn("u.rating_total_acc", changed)
+        self.assertEqual(session.commits, 0)
+
+    def test_stars(self):
+        self.assertEqual(stars_to_score(1), 0.0)
+        self.assertEqual(stars_to_score(5), 1.0)
+        self.assertEqual(get_star_rating(stars_to_score(4.5)), "4.5 ⭐️")
 
 if __name__ == '__main__':
     unittest.main()
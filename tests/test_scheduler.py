@@ -0,0 +1,174 @@
+import json
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+
+from bot.common.config import settings
+from bot.common.services import scheduler
+from bot.common.services.outbox import message_job
+from bot.common.services.scheduler import (
+    DUE_KEY, SENT_KEY, _on_reminder_dead_letter, process_due_reminders, retry_delay,
+    schedule_reminder, seed_reminders
+)
+from fakes import FakeRedis, FakeSession
+
+HOUR = 3600
+
+class FakeOutbox:
+    def __init__(self):
+        self.jobs = []
+        self.fail_for = set()
+
+    async def enqueue(self, job):
+        if job["params"]["chat_id"] in self.fail_for:
+            raise ConnectionError("redis down")
+        self.jobs.append(job)
+
+class TestRetryDelay(unittest.TestCase):
+    def test_doubles_up_to_the_cap(self):
+        base = settings.REMINDER_RETRY_HOURS * HOUR
+        self.assertEqual(retry_delay(1), base)
+        self.assertEqual(retry_delay(2), 2 * base)
+        self.assertEqual(retry_delay(3), 4 * base)
+        self.assertEqual(retry_delay(50), settings.REMINDER_RETRY_MAX_HOURS * HOUR)
+
+class TestReminderWheel(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.now = time.time()
+        self.redis = FakeRedis()
+        self.outbox = FakeOutbox()
+        self.users = {} # user_id -> (status, last_active_at)
+        self.db = FakeSession(self.rows)
+        for target, value in (("redis", self.redis), ("driver_outbox", self.outbox), ("async_session_factory", self.db)):
+            patcher = patch.object(scheduler, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def rows(self, stmt, params):
+        if len(stmt.selected_columns) == 2: # seed_reminders: user_id, last_active_at
+            return [(user_id, seen) for user_id, (status, seen) in self.users.items() if status == "active"]
+        return [(user_id, status, seen) for user_id, (status, seen) in self.users.items()]
+
+    def due(self):
+        return {int(member): score for member, score in self.redis.zset(DUE_KEY).items()}
+
+    def seen(self, hours_ago):
+        return datetime.fromtimestamp(self.now - hours_ago * HOUR, timezone.utc)
+
+    def sent(self, user_id):
+        raw = self.redis.hash(SENT_KEY).get(str(user_id))
+        return json.loads(raw)["count"] if raw else 0
+
+    async def test_schedule_resets_backoff(self):
+        await self.redis.hset(SENT_KEY, 1, json.dumps({"count": 3, "last": 0}))
+        await schedule_reminder(1, seen_at=self.now)
+        self.assertEqual(self.due(), {1: self.now + settings.REMINDER_AFTER_HOURS * HOUR})
+        self.assertEqual(self.sent(1), 0)
+
+    async def test_stale_driver_is_reminded_with_backoff(self):
+        self.users.update({1: ("active", self.seen(20))})
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60})
+
+        await process_due_reminders()
+        self.assertEqual([job["params"]["chat_id"] for job in self.outbox.jobs], [1])
+        self.assertEqual(self.outbox.jobs[0]["tag"], "reminder")
+        self.assertEqual(self.sent(1), 1)
+        self.assertAlmostEqual(self.due()[1], self.now + retry_delay(1), delta=5)
+
+        # Second reminder backs off further
+        await self.redis.zadd(DUE_KEY, {1: self.now - 1})
+        await process_due_reminders()
+        self.assertEqual(self.sent(1), 2)
+        self.assertAlmostEqual(self.due()[1], self.now + retry_delay(2), delta=5)
+
+    async def test_gives_up_after_max_sent(self):
+        self.users.update({1: ("active", self.seen(200))})
+        await self.redis.hset(SENT_KEY, 1, json.dumps({"count": settings.REMINDER_MAX_SENT - 1, "last": 0}))
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60})
+
+        await process_due_reminders()
+        self.assertEqual(len(self.outbox.jobs), 1)
+        self.assertNotIn(1, self.due())
+
+    async def test_recently_active_is_rescheduled(self):
+        self.users.update({1: ("active", self.seen(1))})
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60})
+
+        await process_due_reminders()
+        self.assertEqual(self.outbox.jobs, [])
+        expected = self.seen(1).timestamp() + settings.REMINDER_AFTER_HOURS * HOUR
+        self.assertAlmostEqual(self.due()[1], expected)
+
+    async def test_inactive_or_missing_leave_the_wheel(self):
+        self.users.update({1: ("banned", self.seen(20))})
+        await self.redis.hset(SENT_KEY, 1, json.dumps({"count": 2, "last": 0}))
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60, 2: self.now - 60})
+
+        await process_due_reminders()
+        self.assertEqual(self.outbox.jobs, [])
+        self.assertEqual(self.due(), {})
+        self.assertEqual(self.sent(1), 0)
+
+    async def test_not_due_yet(self):
+        await self.redis.zadd(DUE_KEY, {1: self.now + HOUR})
+        await process_due_reminders()
+        self.assertEqual(self.due(), {1: self.now + HOUR})
+
+    async def test_enqueue_failure_retries_later(self):
+        self.users.update({1: ("active", self.seen(20))})
+        self.outbox.fail_for = {1}
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60})
+
+        await process_due_reminders()
+        self.assertEqual(self.sent(1), 0)
+        self.assertAlmostEqual(self.due()[1], self.now + retry_delay(1), delta=5)
+
+    async def test_failed_batch_goes_back_on_the_wheel(self):
+        self.db.fail = ConnectionError("db down")
+        await self.redis.zadd(DUE_KEY, {1: self.now - 60, 2: self.now - 30})
+        # A location update that raced in keeps its later due time
+        real_zrem = self.redis.zrem
+
+        async def zrem_then_reschedule(key, member):
+            removed = await real_zrem(key, member)
+            if member == b"2":
+                await self.redis.zadd(DUE_KEY, {2: self.now + HOUR})
+            return removed
+
+        self.redis.zrem = zrem_then_reschedule
+        with self.assertRaises(ConnectionError):
+            await process_due_reminders()
+        due = self.due()
+        self.assertEqual(set(due), {1, 2})
+        self.assertLessEqual(due[1], time.time())
+        self.assertEqual(due[2], self.now + HOUR)
+
+    async def test_blocked_driver_leaves_the_wheel(self):
+        self.users.update({1: ("active", self.seen(20))})
+        await self.redis.zadd(DUE_KEY, {1: self.now + HOUR, 2: self.now + HOUR})
+        method = SendMessage(chat_id=1, text="x")
+
+        # Network failures keep the back-off going
+        await _on_reminder_dead_letter(message_job(2, "x", tag="reminder"), TelegramNetworkError(method, "down"))
+        self.assertIn(2, self.due())
+
+        await _on_reminder_dead_letter(message_job(1, "x", tag="reminder"), TelegramForbiddenError(method, "blocked"))
+        self.assertNotIn(1, self.due())
+        self.assertTrue(json.loads(self.redis.hash(SENT_KEY)["1"])["blocked"])
+
+        # Not re-seeded on restart; a new location puts them back
+        await seed_reminders()
+        self.assertNotIn(1, self.due())
+        await schedule_reminder(1)
+        self.assertIn(1, self.due())
+        self.assertEqual(self.sent(1), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import asyncio
+import csv
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from bot.common.services.sync_sinks import CsvSink, SqliteSink, make_sink
+
+HEADER = ["User ID", "Name", "Rating"]
+
+class TestSyncSinks(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def _apply(self, sink):
+        await sink.upsert("drivers", HEADER, [[1, "Ann", 0.75], [2, "Bob", None]])
+        await sink.upsert("drivers", HEADER, [[2, "Bob B.", 0.8], [3, "Cid", 0.7]])
+        await sink.delete("drivers", [1, 99])
+        await sink.delete("orders", [1]) # Stream never synced: no-op
+        await sink.close()
+
+    def test_csv_sink(self):
+        asyncio.run(self._apply(CsvSink(self.tmp.name)))
+        with open(os.path.join(self.tmp.name, "drivers.csv"), newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [HEADER, ["2", "Bob B.", "0.8"], ["3", "Cid", "0.7"]])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "orders.csv")))
+
+    def test_sqlite_sink(self):
+        path = os.path.join(self.tmp.name, "mirror.db")
+        asyncio.run(self._apply(SqliteSink(path)))
+        with sqlite3.connect(path) as conn:
+            rows = conn.execute('SELECT * FROM drivers ORDER BY "User ID"').fetchall()
+        self.assertEqual(rows, [(2, "Bob B.", 0.8), (3, "Cid", 0.7)])
+
+    def test_make_sink(self):
+        self.assertIsInstance(make_sink(f"csv:{self.tmp.name}"), CsvSink)
+        with self.assertRaises(ValueError):
+            make_sink("ftp:somewhere")
+        with self.assertRaises(ValueError):
+            make_sink("csv")
+
+if __name__ == '__main__':
+    unittest.main()